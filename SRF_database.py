@@ -2,15 +2,12 @@
 # Streamlit UI to browse the SRF database, add new data, and display the README
 
 import streamlit as st
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
-import os
+from contextlib import nullcontext
 
-# Import the main page modules for different app functionalities
-from utils.browser import browser_page                  # Page to browse and visualize the database
-from utils.new_experiment import new_experiment_page    # Page to create and upload new experiments
-from utils.utils import *                               # Utility functions used across pages
+from utils.profiling import recording                   # Optional timings of the current rerun
+
+# The page modules (pandas, matplotlib, the collector) are imported by the branch showing them:
+# the first paint of the app only pays for streamlit, see benchmarks/bench_startup.py
 
 def main():
     """
@@ -38,19 +35,30 @@ def main():
         default="Browse"
     )
 
+    # Optional profiling of this rerun: loaders, pivot, plot rendering, images (panel at the bottom of the sidebar)
+    profile = st.sidebar.toggle("Profile this rerun", key="profiling",
+                                help="Time spent in the loaders, the pivot, the plots and the images, SQL statements and bytes loaded")
+
     # Route to the corresponding page based on user selection
-    if selection == "Browse":
-        browser_page()
+    with recording() if profile else nullcontext() as recorder:
+        if selection == "Browse":
+            from utils.browser import browser_page                  # Page to browse and visualize the database
+            browser_page()
+
+        elif selection == "Create":
+            from utils.new_experiment import new_experiment_page    # Page to create and upload new experiments
+            new_experiment_page()
 
-    elif selection == "Create":
-        new_experiment_page()
+        elif selection == "README":
+            # Read and display the README markdown file with instructions/documentation
+            with open("utils/streamlit_README.md", "r", encoding="utf-8") as file:
+                readme_content = file.read()
 
-    elif selection == "README":
-        # Read and display the README markdown file with instructions/documentation
-        with open("utils/streamlit_README.md", "r", encoding="utf-8") as file:
-            readme_content = file.read()
+            st.markdown(readme_content, unsafe_allow_html=True)
 
-        st.markdown(readme_content, unsafe_allow_html=True)
+    if profile:
+        from utils.utils import profiling_panel
+        profiling_panel(recorder)
 
 # Standard Python entry point guard
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+# bench_archive.py
+# onboarding of one new experiment ZIP into a database holding many experiments:
+# unzip into the data folder and run the collector against importing the archive directly
+# run from the repository root: python -m benchmarks.bench_archive
+
+import os
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+from collect_database import collect_database, ingest_archives
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+# ZIP with the layout of the Create page (files at the root) of an experiment folder
+def zip_folder(folder, archive_path):
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(os.listdir(folder)):
+            zf.write(os.path.join(folder, name), name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Experiment ZIP ingest benchmark")
+    parser.add_argument("--experiments", type=int, default=200, help="experiments already in the database")
+    parser.add_argument("--rows", type=int, default=20000, help="rows per experiment")
+    parser.add_argument("--new-rows", type=int, default=200000, help="rows of the new experiment")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_folder = os.path.join(tmp, "data")
+        write_synthetic_dataset(data_folder, args.experiments, args.rows)
+        write_synthetic_dataset(os.path.join(tmp, "new"), 1, args.new_rows, seed=1, prefix="NEW")
+        archive_path = os.path.join(tmp, "NEW_00000.zip")
+        zip_folder(os.path.join(tmp, "new", "NEW_00000"), archive_path)
+        for name in ("extract.db", "archive.db"):
+            collect_database(data_folder, os.path.join(tmp, name))
+
+        # Unzip by hand into data/, then an incremental collection (scan of every folder)
+        start = time.perf_counter()
+        with zipfile.ZipFile(archive_path) as zf:
+            zf.extractall(os.path.join(data_folder, "NEW_00000"))
+        collect_database(data_folder, os.path.join(tmp, "extract.db"))
+        extract_s = time.perf_counter() - start
+        shutil.rmtree(os.path.join(data_folder, "NEW_00000"))
+
+        # Direct import of the archive, one transaction
+        start = time.perf_counter()
+        summary = ingest_archives([archive_path], os.path.join(tmp, "archive.db"))
+        archive_s = time.perf_counter() - start
+        assert summary["rows"] == args.new_rows
+
+    print(f"{args.experiments} experiments in the database, new ZIP of {args.new_rows:,} rows")
+    print(f"{'unzip + collect':>16} {extract_s:>7.2f} s")
+    print(f"{'archive ingest':>16} {archive_s:>7.2f} s")
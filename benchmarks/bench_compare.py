@@ -0,0 +1,80 @@
+# bench_compare.py
+# comparison of a fleet of cavities (utils/compare.py): one batched read and resampling onto a common grid,
+# against the former overlay loading every experiment on its own and downsampling each trace
+# plus the band statistics and the differences to a reference, and the rendering of the overlay
+# run from the repository root: python -m benchmarks.bench_compare
+
+import io
+import os
+import time
+import argparse
+import tempfile
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from collect_database import collect_database
+from utils.db import read_connection
+from utils.query import read_experiment_data
+from utils.downsample import downsample, DEFAULT_POINTS
+from utils.compare import compare_experiments, band_statistics, reference_difference, DEFAULT_GRID_POINTS
+from benchmarks.synthetic import write_synthetic_dataset
+
+X_COLUMN, Y_COLUMN = "Temp_Diode", "QualityFactor"
+
+
+# Former overlay: every experiment loaded whole, then downsampled
+def overlay_per_experiment(conn, experiment_ids):
+    return [downsample(read_experiment_data(conn, experiment_id), X_COLUMN, Y_COLUMN, "lttb", DEFAULT_POINTS)
+            for experiment_id in experiment_ids]
+
+
+def timed_call(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def render(comparison):
+    fig, ax = plt.subplots()
+    for row in comparison["values"]:
+        ax.plot(comparison["grid"], row, linewidth=1)
+    band = band_statistics(comparison["values"])
+    ax.fill_between(comparison["grid"], band["q5"], band["q95"], alpha=0.15)
+    ax.plot(comparison["grid"], band["q50"], color="black")
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet comparison benchmark")
+    parser.add_argument("--experiments", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--rows", type=int, default=20000, help="rows per experiment")
+    parser.add_argument("--points", type=int, default=DEFAULT_GRID_POINTS, help="points of the common grid")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'cavities':>8} {'per experiment s':>17} {'interp s':>9} {'mean s':>7} {'band s':>7} {'diff s':>7} "
+          f"{'render s':>9}")
+    for n_experiments in args.experiments:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_path = os.path.join(tmp, "srf.db")
+            write_synthetic_dataset(os.path.join(tmp, "data"), n_experiments, args.rows)
+            collect_database(os.path.join(tmp, "data"), database_path)
+            with read_connection(database_path) as conn:
+                experiment_ids = [row[0] for row in conn.execute("SELECT experiment_id FROM experiments")]
+                former, _ = timed_call(lambda: overlay_per_experiment(conn, experiment_ids), args.repeat)
+                interp, comparison = timed_call(lambda: compare_experiments(
+                    conn, experiment_ids, X_COLUMN, Y_COLUMN, args.points, "interp"), args.repeat)
+                mean, _ = timed_call(lambda: compare_experiments(
+                    conn, experiment_ids, X_COLUMN, Y_COLUMN, args.points, "mean"), args.repeat)
+            band, _ = timed_call(lambda: band_statistics(comparison["values"]), args.repeat)
+            difference, _ = timed_call(lambda: reference_difference(comparison, experiment_ids[0], "relative"),
+                                       args.repeat)
+            rendering, _ = timed_call(lambda: render(comparison), 1)
+        print(f"{n_experiments:>8} {former:>17.3f} {interp:>9.3f} {mean:>7.3f} {band:>7.4f} {difference:>7.4f} "
+              f"{rendering:>9.3f}")
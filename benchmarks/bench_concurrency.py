@@ -0,0 +1,95 @@
+# bench_concurrency.py
+# N reader threads (browser sessions) load experiments while collect_database.py ingests in another process
+# compares the WAL journal with the legacy rollback journal
+# run from the repository root: python -m benchmarks.bench_concurrency
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import numpy as np
+
+import utils.db as db
+from collect_database import collect_database
+from utils.storage import read_columns
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+def ingest(data_folder, database_path, journal_mode, result):
+    db.PRAGMAS["journal_mode"] = journal_mode
+    result["rows_per_second"] = collect_database(data_folder, database_path)["rows_per_second"]
+
+
+# Keep loading random experiments until the writer is done, recording each latency
+def reader(database_path, experiment_ids, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with db.read_connection(database_path) as conn:
+                read_columns(conn, random.choice(experiment_ids))
+        except Exception as exc:  # e.g. "database is locked" with the rollback journal
+            errors.append(repr(exc))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run(journal_mode, n_readers, n_experiments, n_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, "bench.db")
+        initial, incoming = os.path.join(tmp, "initial"), os.path.join(tmp, "incoming")
+        write_synthetic_dataset(initial, n_experiments, n_rows, seed=1)
+        write_synthetic_dataset(incoming, n_experiments, n_rows, seed=2, prefix="NEW")
+
+        db.PRAGMAS["journal_mode"] = journal_mode
+        collect_database(initial, database_path)
+        with db.read_connection(database_path) as conn:
+            experiment_ids = [row[0] for row in conn.execute("SELECT experiment_id FROM experiments")]
+
+        manager = multiprocessing.Manager()
+        result = manager.dict()
+        writer = multiprocessing.Process(target=ingest, args=(incoming, database_path, journal_mode, result))
+        stop = threading.Event()
+        latencies, errors = [], []
+        threads = [threading.Thread(target=reader, args=(database_path, experiment_ids, stop, latencies, errors))
+                   for _ in range(n_readers)]
+
+        start = time.perf_counter()
+        writer.start()
+        for thread in threads:
+            thread.start()
+        writer.join()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        db.get_pool(database_path).close()
+
+        latencies = np.array(latencies) * 1000
+        return {
+            "reads_per_second": len(latencies) / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else float("nan"),
+            "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else float("nan"),
+            "max_ms": float(latencies.max()) if len(latencies) else float("nan"),
+            "errors": len(errors),
+            "writer_rows_per_second": result.get("rows_per_second", float("nan")),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent readers during an ingest")
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--experiments", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'journal':>8} {'readers':>8} {'reads/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>9} "
+          f"{'errors':>7} {'ingest rows/s':>14}")
+    for journal_mode in ("WAL", "DELETE"):
+        for n_readers in args.readers:
+            r = run(journal_mode, n_readers, args.experiments, args.rows)
+            print(f"{journal_mode:>8} {n_readers:>8} {r['reads_per_second']:>9.1f} {r['p50_ms']:>8.2f} "
+                  f"{r['p95_ms']:>8.2f} {r['max_ms']:>9.2f} {r['errors']:>7} {r['writer_rows_per_second']:>14,.0f}")
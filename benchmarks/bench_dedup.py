@@ -0,0 +1,64 @@
+# bench_dedup.py
+# ingest of experiment folders holding copies of the same data files (re-tests, re-analyses):
+# database size and ingest time against the number of copies, and the re-import of folders whose
+# metadata changed but not their data file
+# run from the repository root: python -m benchmarks.bench_dedup
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+# Copy every experiment folder `copies - 1` times under a new experiment name (same data file)
+def copy_folders(data_folder, copies):
+    for name in sorted(os.listdir(data_folder)):
+        for copy in range(1, copies):
+            target = os.path.join(data_folder, f"{name}.{copy}")
+            shutil.copytree(os.path.join(data_folder, name), target)
+            rename_experiment(target, f"{name}.{copy}")
+
+
+def rename_experiment(folder, experiment_name):
+    metadata_path = os.path.join(folder, "metadata.json")
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    metadata["experiment_name"] = experiment_name
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicated storage benchmark")
+    parser.add_argument("--experiments", type=int, default=20, help="distinct data files")
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--rows", type=int, default=50000, help="rows per data file")
+    args = parser.parse_args()
+
+    print(f"{'folders':>8} {'unique':>7} {'linked':>7} {'db MB':>7} {'ingest s':>9} {'re-import s':>12}")
+    for copies in args.copies:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            database_path = os.path.join(tmp, "srf.db")
+            write_synthetic_dataset(data_folder, args.experiments, args.rows)
+            copy_folders(data_folder, copies)
+
+            summary = collect_database(data_folder, database_path)
+            size_mb = os.path.getsize(database_path) / 2**20
+
+            # Metadata edited in every folder, data files untouched
+            for name in os.listdir(data_folder):
+                rename_experiment(os.path.join(data_folder, name), f"{name}-edited")
+            start = time.perf_counter()
+            reimport = collect_database(data_folder, database_path)
+            reimport_s = time.perf_counter() - start
+            assert reimport["deduplicated"] == reimport["experiments"]
+
+            unique = summary["experiments"] - summary["deduplicated"]
+            print(f"{summary['experiments']:>8} {unique:>7} {summary['deduplicated']:>7} {size_mb:>7.1f} "
+                  f"{summary['seconds']:>9.2f} {reimport_s:>12.2f}")
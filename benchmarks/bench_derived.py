@@ -0,0 +1,52 @@
+# bench_derived.py
+# derived quantities (utils/derived.py) of synthetic cool-downs: cost of computing them at ingest, first request
+# (read the channels, compute, store) and later requests read back from the derived tables
+# run from the repository root: python -m benchmarks.bench_derived
+
+import os
+import time
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from utils.db import connect
+from utils.query import read_experiment_data
+from utils.derived import DERIVED_QUANTITIES, compute_quantity, derived_quantity
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Derived quantities benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="rows per experiment")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'quantity':>20} {'compute ms':>11} {'first request ms':>17} {'stored read ms':>15}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_path = os.path.join(tmp, "srf.db")
+            write_synthetic_dataset(os.path.join(tmp, "data"), 1, n_rows)
+            collect_database(os.path.join(tmp, "data"), database_path)
+            conn = connect(database_path)
+            df = read_experiment_data(conn, 1)
+            for name in DERIVED_QUANTITIES:
+                compute = best_time(lambda: compute_quantity(name, df), args.repeat)
+
+                # First request: nothing stored yet (as for a streamed file or an older database)
+                def first_request():
+                    conn.execute("DELETE FROM derived_columns")
+                    conn.execute("DELETE FROM derived")
+                    derived_quantity(conn, 1, name)
+                first = best_time(first_request, args.repeat)
+                stored = best_time(lambda: derived_quantity(conn, 1, name), args.repeat)
+                print(f"{n_rows:>9} {name:>20} {compute * 1000:>11.2f} {first * 1000:>17.2f} {stored * 1000:>15.2f}")
+            conn.close()
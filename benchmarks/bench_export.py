@@ -0,0 +1,67 @@
+# bench_export.py
+# bulk export of a fleet of experiments (utils/query.py) against loading every experiment and concatenating
+# them into one DataFrame before writing it: time and peak traced memory, Parquet / Feather / CSV, 1 and N threads
+# run from the repository root: python -m benchmarks.bench_export
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+from collect_database import collect_database
+from utils.db import read_connection
+from utils.query import select_experiments, read_experiment_data, export_experiments
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+# Former approach: one DataFrame holding the whole fleet, written at once
+def export_concatenated(database_path, experiment_ids, output_path):
+    frames = []
+    with read_connection(database_path) as conn:
+        for experiment_id in experiment_ids:
+            df = read_experiment_data(conn, experiment_id)
+            frames.append(df.assign(experiment_id=experiment_id))
+    pd.concat(frames, ignore_index=True).to_parquet(output_path)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk export benchmark")
+    parser.add_argument("--experiments", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=20000, help="rows per experiment")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, "srf.db")
+        write_synthetic_dataset(os.path.join(tmp, "data"), args.experiments, args.rows)
+        collect_database(os.path.join(tmp, "data"), database_path)
+        with read_connection(database_path) as conn:
+            experiment_ids = select_experiments(conn)
+
+        cases = {"concat + to_parquet": lambda: export_concatenated(database_path, experiment_ids,
+                                                                    os.path.join(tmp, "concat.parquet"))}
+        for extension in ("parquet", "feather", "csv"):
+            for threads in (1, args.threads):
+                output_path = os.path.join(tmp, f"export_{threads}.{extension}")
+                cases[f"export {extension}, {threads} thr"] = (
+                    lambda output_path=output_path, threads=threads:
+                    export_experiments(database_path, experiment_ids, output_path, threads=threads))
+
+        print(f"{len(experiment_ids)} experiments x {args.rows:,} rows")
+        print(f"{'method':>26} {'time s':>8} {'peak MB':>9}")
+        for name, func in cases.items():
+            seconds, peak = measure(func)
+            print(f"{name:>26} {seconds:>8.2f} {peak:>9.1f}")
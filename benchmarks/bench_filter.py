@@ -0,0 +1,58 @@
+# bench_filter.py
+# range filter on one channel: load the whole experiment and mask it in pandas,
+# against the push-down of utils/storage.py that only reads the matching rows
+# run from the repository root: python -m benchmarks.bench_filter
+
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from utils.storage import read_columns, read_eav, read_rows_in_range
+from benchmarks.synthetic import write_synthetic_dataset
+
+READERS = {"columnar": read_columns, "eav": read_eav}
+
+# Narrow temperature window at the end of the synthetic cool-down (~0.1% of the rows at 10^6 rows)
+COLUMN = "Temp_Diode"
+WINDOW = (2.70, 2.72)
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Range filter benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--storage", nargs="+", default=["columnar", "eav"], choices=list(READERS))
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions (best time is reported)")
+    args = parser.parse_args()
+
+    low, high = WINDOW
+    print(f"{'rows':>9} {'storage':>9} {'matches':>9} {'pandas s':>9} {'push-down s':>12}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            write_synthetic_dataset(data_folder, 1, n_rows)
+            for storage in args.storage:
+                database_path = os.path.join(tmp, f"{storage}.db")
+                collect_database(data_folder, database_path, storage=storage)
+                conn = sqlite3.connect(database_path)
+
+                def in_pandas():
+                    df = READERS[storage](conn, 1)
+                    return df[(df[COLUMN] >= low) & (df[COLUMN] <= high)]
+
+                pandas_s, expected = best_time(in_pandas, args.repeat)
+                pushdown_s, result = best_time(lambda: read_rows_in_range(conn, 1, COLUMN, low, high), args.repeat)
+                conn.close()
+                assert len(result) == len(expected)
+                print(f"{n_rows:>9} {storage:>9} {len(result):>9} {pandas_s:>9.4f} {pushdown_s:>12.4f}")
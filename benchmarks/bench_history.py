@@ -0,0 +1,48 @@
+# bench_history.py
+# processing-history search over many cavities: encoding of the histories, pattern queries and
+# similarity ranking (edit distance to a reference history)
+# run from the repository root: python -m benchmarks.bench_history
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.db import connect
+from utils.history import load_history_index, match_pattern, rank_by_similarity
+from collect_database import create_database
+from benchmarks.synthetic import insert_synthetic_histories
+
+PATTERNS = ["BCP -> coldEP", "warmEP -> baking(T>=100) -> *", "baking(lowT, T=800..1000, h>=3) -> BCP -> EP(coldEP)"]
+
+
+def best_ms(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processing history search benchmark")
+    parser.add_argument("--experiments", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    for n_experiments in args.experiments:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = connect(os.path.join(tmp, "srf.db"))
+            create_database(conn)
+            insert_synthetic_histories(conn, n_experiments, np.random.default_rng(0))
+            encode_ms, index = best_ms(lambda: load_history_index(conn), repeat=3)
+            conn.close()
+
+        print(f"{n_experiments} experiments, {len(index['process'])} steps: encoded in {encode_ms:.1f} ms")
+        for pattern in PATTERNS:
+            query_ms, (experiment_ids, _) = best_ms(lambda: match_pattern(index, pattern))
+            print(f"  {query_ms:8.2f} ms {len(experiment_ids):>6} matches  {pattern}")
+        rank_ms, _ = best_ms(lambda: rank_by_similarity(index, index["experiment_ids"][0], 10))
+        print(f"  {rank_ms:8.2f} ms similarity ranking of all the experiments")
@@ -0,0 +1,28 @@
+# bench_ingest.py
+# measure the ingest throughput (rows/s) of collect_database.py on synthetic data
+# run from the repository root: python -m benchmarks.bench_ingest
+
+import os
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from benchmarks.synthetic import write_synthetic_dataset, CHANNELS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest throughput benchmark")
+    parser.add_argument("--experiments", type=int, default=5)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--jobs", type=int, default=1, help="parallel reader processes of the collector")
+    args = parser.parse_args()
+
+    print(f"{'rows/file':>10} {'experiments':>12} {'seconds':>9} {'rows/s':>12} {'values/s':>12}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            write_synthetic_dataset(data_folder, args.experiments, n_rows)
+            summary = collect_database(data_folder, os.path.join(tmp, "bench.db"), jobs=args.jobs)
+            values_per_second = summary["rows_per_second"] * len(CHANNELS)
+            print(f"{n_rows:>10} {summary['experiments']:>12} {summary['seconds']:>9.3f} "
+                  f"{summary['rows_per_second']:>12,.0f} {values_per_second:>12,.0f}")
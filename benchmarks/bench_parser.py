@@ -0,0 +1,62 @@
+# bench_parser.py
+# time and peak memory of the measurement file readers on large synthetic files:
+# the legacy regex separator (python engine) against utils/parser.py (C engine, pyarrow if installed)
+# run from the repository root: python -m benchmarks.bench_parser
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.parser import read_measurement_file
+from benchmarks.synthetic import synthetic_measurement, CHANNELS
+
+READERS = {
+    "python regex": lambda path: pd.read_csv(path, sep=r'\s+|,', engine='python'),
+    "c sniffed": lambda path: read_measurement_file(path, engine="c"),
+}
+try:
+    import pyarrow  # noqa: F401
+    READERS["pyarrow sniffed"] = lambda path: read_measurement_file(path, engine="pyarrow")
+except ImportError:
+    pass
+
+
+# Time and peak memory come from two separate reads: tracemalloc slows the python engine down a lot
+def measure(reader, path):
+    start = time.perf_counter()
+    df = reader(path)
+    elapsed = time.perf_counter() - start
+    del df
+
+    tracemalloc.start()
+    df = reader(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, elapsed, peak / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measurement file parser benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--python-max-rows", type=int, default=200000,
+                        help="skip the (slow) python engine above this size")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'file MB':>8} {'reader':>16} {'seconds':>9} {'rows/s':>12} {'peak MB':>8}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.txt")
+            synthetic_measurement(n_rows, np.random.default_rng(0)).to_csv(
+                path, sep="\t", index=False, header=CHANNELS, float_format="%.3f")
+            size_mb = os.path.getsize(path) / 2**20
+            for name, reader in READERS.items():
+                if name.startswith("python") and n_rows > args.python_max_rows:
+                    continue
+                df, elapsed, peak = measure(reader, path)
+                assert len(df) == n_rows
+                print(f"{n_rows:>9} {size_mb:>8.1f} {name:>16} {elapsed:>9.3f} {n_rows / elapsed:>12,.0f} {peak:>8.1f}")
@@ -0,0 +1,43 @@
+# bench_plot.py
+# time to draw a trace with every point and after downsampling (LTTB, min/max per bucket)
+# run from the repository root: python -m benchmarks.bench_plot
+
+import io
+import time
+import argparse
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from utils.downsample import downsample, DOWNSAMPLE_METHODS, DEFAULT_POINTS
+from benchmarks.synthetic import synthetic_measurement
+
+
+# Downsample, scatter and render to PNG as the browser does
+def render(df, x_column, y_column, method, n_points):
+    start = time.perf_counter()
+    plot_df = downsample(df, x_column, y_column, method, n_points)
+    reduced = time.perf_counter()
+    fig, ax = plt.subplots()
+    ax.scatter(plot_df[x_column], plot_df[y_column])
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+    return len(plot_df), reduced - start, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot downsampling benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>9} {'method':>7} {'points':>9} {'reduce s':>9} {'total s':>9}")
+    for n_rows in args.rows:
+        df = synthetic_measurement(n_rows, rng)
+        x_column, y_column = df.columns[0], df.columns[1]
+        for method in DOWNSAMPLE_METHODS:
+            n_points, reduce_s, total_s = render(df, x_column, y_column, method, args.points)
+            print(f"{n_rows:>9} {method:>7} {n_points:>9} {reduce_s:>9.3f} {total_s:>9.3f}")
@@ -0,0 +1,85 @@
+# bench_slicing.py
+# range slicing of a long log: load the whole experiment and mask it in pandas, against the push-down of
+# utils/storage.py reading every block (database without zone maps) and reading only the blocks whose
+# zone maps (block_ranges) overlap the requested ranges
+# run from the repository root: python -m benchmarks.bench_slicing
+
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import shutil
+
+from collect_database import collect_database
+from utils.storage import read_columns, read_rows_in_ranges, candidate_blocks
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+# Windows of the synthetic cool-down: the transition, 1% of the run (fractions of the time span) and both
+TEMPERATURE_WINDOW = ("Temp_Diode", 8.0, 10.0)
+TIME_WINDOW = (0.60, 0.61)
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def windows(conn):
+    first, last = conn.execute(
+        "SELECT min_value, max_value FROM column_stats WHERE experiment_id = 1 AND column_name = 'Time'").fetchone()
+    time_window = ("Time", first + TIME_WINDOW[0] * (last - first), first + TIME_WINDOW[1] * (last - first))
+    return {
+        "temperature": [TEMPERATURE_WINDOW],
+        "time": [time_window],
+        "both": [TEMPERATURE_WINDOW, time_window],
+    }
+
+
+def in_pandas(conn, window):
+    df = read_columns(conn, 1)
+    mask = True
+    for column, low, high in window:
+        mask = mask & (df[column] >= low) & (df[column] <= high)
+    return df[mask]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Range slicing benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 5000000])
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions (best time is reported)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'window':>12} {'matches':>9} {'blocks':>9} {'pandas s':>9} {'no zone maps s':>15} "
+          f"{'zone maps s':>12}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            write_synthetic_dataset(data_folder, 1, n_rows)
+            database_path = os.path.join(tmp, "srf.db")
+            collect_database(data_folder, database_path)
+            # Same database without the zone maps (as before they existed)
+            unindexed_path = os.path.join(tmp, "unindexed.db")
+            shutil.copy(database_path, unindexed_path)
+            with sqlite3.connect(unindexed_path) as unindexed:
+                unindexed.execute("DROP TABLE block_ranges")
+
+            conn = sqlite3.connect(database_path)
+            unindexed = sqlite3.connect(unindexed_path)
+            n_blocks = len(candidate_blocks(unindexed, 1, {}))
+            for name, window in windows(conn).items():
+                ranges = {column: (low, high) for column, low, high in window}
+                pandas_s, expected = best_time(lambda: in_pandas(conn, window), args.repeat)
+                scan_s, _ = best_time(lambda: read_rows_in_ranges(unindexed, 1, ranges), args.repeat)
+                zone_s, result = best_time(lambda: read_rows_in_ranges(conn, 1, ranges), args.repeat)
+                assert len(result) == len(expected)
+                blocks = f"{len(candidate_blocks(conn, 1, ranges))}/{n_blocks}"
+                print(f"{n_rows:>9} {name:>12} {len(result):>9} {blocks:>9} {pandas_s:>9.4f} {scan_s:>15.4f} "
+                      f"{zone_s:>12.4f}")
+            conn.close()
+            unindexed.close()
@@ -0,0 +1,63 @@
+# bench_startup.py
+# import time of the entry points (the Streamlit app and its pages, the collector, the query CLI) in a fresh
+# interpreter, from python -X importtime: cumulative time of the entry point and of the heavy packages it pulls in
+# (a package missing from the table is not imported at startup)
+# run from the repository root: python -m benchmarks.bench_startup --output startup.json
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ENTRY_POINTS = ["SRF_database", "utils.browser", "utils.new_experiment", "collect_database", "query_database"]
+HEAVY_PACKAGES = ["streamlit", "pandas", "numpy", "matplotlib", "matplotlib.pyplot", "PIL.Image", "pyarrow"]
+
+
+# One fresh interpreter importing module: wall time and {imported module: cumulative microseconds}
+def import_times(module):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    cumulative = {}
+    # stderr lines: "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        cumulative.setdefault(name.strip(), int(cumulative_us))
+    return wall, cumulative
+
+
+# Best of repeat runs: {"wall": s, "import": s, package: s}
+def startup_times(module, repeat):
+    best = {}
+    for _ in range(repeat):
+        wall, cumulative = import_times(module)
+        times = {"wall": wall, "import": cumulative.get(module, 0) / 1e6}
+        times.update({package: cumulative[package] / 1e6 for package in HEAVY_PACKAGES if package in cumulative})
+        for key, seconds in times.items():
+            best[key] = min(best.get(key, seconds), seconds)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup (import) time of the entry points")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions (best time is reported)")
+    parser.add_argument("--output", help="JSON file of the results")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'module':>22} {'wall ms':>8} {'import ms':>10}  heavy packages (ms)")
+    for module in args.modules:
+        times = startup_times(module, args.repeat)
+        results[module] = times
+        heavy = ", ".join(f"{p} {times[p] * 1000:.0f}" for p in HEAVY_PACKAGES if p in times)
+        print(f"{module:>22} {times['wall'] * 1000:>8.0f} {times['import'] * 1000:>10.0f}  {heavy or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,54 @@
+# bench_stats.py
+# fleet-wide search "max QualityFactor > threshold and min Temp_Diode < 3 K" over many experiments:
+# from the column_stats table against reading the two channels of every experiment
+# run from the repository root: python -m benchmarks.bench_stats
+
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from utils.storage import read_columns
+from utils.stats import search_experiments_by_stats
+from benchmarks.synthetic import write_synthetic_dataset
+
+CONDITIONS = [("QualityFactor", "max_value", ">", 1.35e8), ("Temp_Diode", "min_value", "<", 2.72)]
+
+
+# Same search computed from the raw data
+def search_raw_data(conn):
+    matched = []
+    for (experiment_id,) in conn.execute("SELECT experiment_id FROM experiments").fetchall():
+        df = read_columns(conn, experiment_id, ["QualityFactor", "Temp_Diode"])
+        if not df.empty and df["QualityFactor"].max() > 1.35e8 and df["Temp_Diode"].min() < 2.72:
+            matched.append(experiment_id)
+    return matched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet-wide statistics search benchmark")
+    parser.add_argument("--experiments", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--rows", type=int, default=5000, help="rows per experiment")
+    args = parser.parse_args()
+
+    print(f"{'experiments':>11} {'matches':>8} {'stats ms':>9} {'raw data ms':>12}")
+    for n_experiments in args.experiments:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            database_path = os.path.join(tmp, "srf.db")
+            write_synthetic_dataset(data_folder, n_experiments, args.rows)
+            collect_database(data_folder, database_path)
+            conn = sqlite3.connect(database_path)
+
+            start = time.perf_counter()
+            matched = search_experiments_by_stats(conn, CONDITIONS)
+            stats_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            expected = search_raw_data(conn)
+            raw_ms = (time.perf_counter() - start) * 1000
+            conn.close()
+            assert matched == expected
+
+            print(f"{n_experiments:>11} {len(matched):>8} {stats_ms:>9.2f} {raw_ms:>12.1f}")
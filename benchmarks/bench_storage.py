@@ -0,0 +1,44 @@
+# bench_storage.py
+# compare the "eav" and "columnar" storage layouts: database size, ingest time and load time
+# run from the repository root: python -m benchmarks.bench_storage
+
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+
+from collect_database import collect_database
+from utils.storage import STORAGE_MODES, read_columns, read_eav
+from benchmarks.synthetic import write_synthetic_dataset
+
+READERS = {"columnar": read_columns, "eav": read_eav}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage layout benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3, help="load repetitions (best time is reported)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'storage':>9} {'db MB':>9} {'ingest s':>9} {'load s':>9}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            write_synthetic_dataset(data_folder, 1, n_rows)
+            for storage in STORAGE_MODES:
+                database_path = os.path.join(tmp, f"{storage}.db")
+                summary = collect_database(data_folder, database_path, storage=storage)
+                size_mb = os.path.getsize(database_path) / 2**20
+
+                conn = sqlite3.connect(database_path)
+                experiment_id = conn.execute("SELECT experiment_id FROM experiments").fetchone()[0]
+                load_times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    df = READERS[storage](conn, experiment_id)
+                    load_times.append(time.perf_counter() - start)
+                conn.close()
+                assert len(df) == n_rows
+
+                print(f"{n_rows:>9} {storage:>9} {size_mb:>9.2f} {summary['seconds']:>9.3f} {min(load_times):>9.4f}")
@@ -0,0 +1,63 @@
+# bench_streaming.py
+# peak memory of the streamed ingest for growing file sizes: it should stay flat
+# each size runs in a fresh process so that its peak RSS is measured alone
+# run from the repository root: python -m benchmarks.bench_streaming
+
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+def ingest(data_folder, database_path, stream):
+    import utils.db
+    from collect_database import collect_database
+    # Pages of the memory-mapped database file would show up in the RSS, only count the heap
+    utils.db.PRAGMAS["mmap_size"] = 0
+    summary = collect_database(data_folder, database_path, stream_above=0 if stream else float("inf"))
+    print(json.dumps({"rows_per_second": summary["rows_per_second"], "peak_mb": peak_rss_mb()}))
+
+
+# Peak resident memory of this process: VmHWM on Linux
+# (ru_maxrss survives exec, it would report the peak of the parent that generated the data)
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streamed ingest memory benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000, 4000000])
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        data_folder, database_path, stream = args.child
+        ingest(data_folder, database_path, stream == "stream")
+        sys.exit()
+
+    print(f"{'rows':>9} {'file MB':>8} {'mode':>8} {'rows/s':>12} {'peak RSS MB':>12}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, "data")
+            write_synthetic_dataset(data_folder, 1, n_rows)
+            size_mb = sum(os.path.getsize(os.path.join(root, f))
+                          for root, _, files in os.walk(data_folder) for f in files) / 2**20
+            for mode in ("stream", "whole"):
+                database_path = os.path.join(tmp, f"{mode}.db")
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_streaming", "--child", data_folder, database_path, mode],
+                    check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{n_rows:>9} {size_mb:>8.1f} {mode:>8} {result['rows_per_second']:>12,.0f} {result['peak_mb']:>12.1f}")
@@ -0,0 +1,57 @@
+# bench_tags.py
+# recipe queries over many processing steps: the former "tags LIKE '%tag%'" query per tag merged in python,
+# against the single statements of utils/tags.py on the normalized tags/step_tags tables
+# run from the repository root: python -m benchmarks.bench_tags
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.db import connect
+from utils.tags import search_experiments_by_tags
+from collect_database import create_database
+from benchmarks.synthetic import insert_synthetic_histories
+
+# "EP" only exists as part of coldEP/warmEP: LIKE '%EP%' matches them by mistake
+RECIPES = [(("EP",), "any"), (("coldEP", "midT"), "any"), (("lowT", "warmEP"), "all"),
+           (("warmEP", "midT", "lowT"), "sequence")]
+
+
+# The former approach: substring match per tag, ids merged in python (no ordering support)
+def search_like(conn, tags, mode):
+    matched = [{row[0] for row in conn.execute(
+        "SELECT DISTINCT experiment_id FROM processing_steps WHERE tags LIKE ?", (f"%{tag}%",))} for tag in tags]
+    return set.union(*matched) if mode == "any" else set.intersection(*matched)
+
+
+def best_ms(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recipe query benchmark")
+    parser.add_argument("--experiments", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'experiments':>11} {'steps':>7} {'recipe':>26} {'LIKE matches':>12} {'LIKE ms':>8} {'matches':>8} {'tags ms':>8}")
+    for n_experiments in args.experiments:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = connect(os.path.join(tmp, "srf.db"))
+            create_database(conn)
+            insert_synthetic_histories(conn, n_experiments, np.random.default_rng(0))
+            n_steps = conn.execute("SELECT COUNT(*) FROM processing_steps").fetchone()[0]
+            for tags, mode in RECIPES:
+                like_ms, like_ids = best_ms(lambda: search_like(conn, tags, mode))
+                tags_ms, ids = best_ms(lambda: search_experiments_by_tags(conn, tags, mode))
+                recipe = f"{mode}: {'/'.join(tags)}"
+                like = f"{len(like_ids):>12} {like_ms:>8.2f}" if mode != "sequence" else f"{'-':>12} {'-':>8}"
+                print(f"{n_experiments:>11} {n_steps:>7} {recipe:>26} {like} {len(ids):>8} {tags_ms:>8.2f}")
+            conn.close()
@@ -0,0 +1,79 @@
+# bench_thumbnails.py
+# image gallery of an experiment with many plots: bytes sent and time per rerun with the full resolution files
+# against the thumbnails stored in the database, and the cost of making the thumbnails
+# (after the data commit, as with collect_database.py --thumbnails)
+# run from the repository root: python -m benchmarks.bench_thumbnails
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from collect_database import create_database, insert_experiment_metadata, insert_plot
+from utils.db import connect
+from utils.thumbnails import GRID_SIZE, experiment_thumbnails, build_missing_thumbnails
+from benchmarks.synthetic import synthetic_measurement
+
+
+# Write n_plots PNG plots of synthetic cool-downs (dpi 200, about the size of the plots of ./data)
+def write_plots(folder, n_plots, rng):
+    paths = []
+    for i in range(n_plots):
+        df = synthetic_measurement(5000, rng)
+        fig, ax = plt.subplots(figsize=(8, 6), dpi=200)
+        ax.scatter(df["Temp_Diode"], df["QualityFactor"], s=2)
+        ax.set_yscale("log")
+        path = os.path.join(folder, f"plot_{i:03d}.png")
+        fig.savefig(path)
+        plt.close(fig)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thumbnail gallery benchmark")
+    parser.add_argument("--plots", type=int, default=40, help="plots attached to the experiment")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_plots(tmp, args.plots, np.random.default_rng(0))
+        conn = connect(os.path.join(tmp, "srf.db"))
+        create_database(conn)
+        experiment_id = insert_experiment_metadata(conn, "GALLERY", "LASA", "many plots", "2025-01-01")
+        for path in paths:
+            insert_plot(conn, experiment_id, path)
+        conn.commit()
+
+        start = time.perf_counter()
+        build_missing_thumbnails(conn)
+        ingest_s = time.perf_counter() - start
+
+        # Full resolution: every file read from disk at every rerun
+        start = time.perf_counter()
+        for _ in range(args.reruns):
+            full_bytes = 0
+            for path in paths:
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        full_bytes += len(f.read())
+        full_ms = (time.perf_counter() - start) * 1000 / args.reruns
+
+        # Thumbnails: one query (the browser caches its result until the database changes)
+        start = time.perf_counter()
+        for _ in range(args.reruns):
+            rows = experiment_thumbnails(conn, experiment_id, GRID_SIZE)
+            conn.commit()
+            thumbnail_bytes = sum(len(payload) for _, _, _, payload in rows)
+        thumbnail_ms = (time.perf_counter() - start) * 1000 / args.reruns
+        conn.close()
+
+    print(f"{args.plots} plots, thumbnails made in {ingest_s:.2f} s ({ingest_s / args.plots * 1000:.0f} ms per plot)")
+    print(f"{'gallery':>12} {'KB per rerun':>13} {'ms per rerun':>13}")
+    print(f"{'full files':>12} {full_bytes / 1024:>13,.0f} {full_ms:>13.2f}")
+    print(f"{'thumbnails':>12} {thumbnail_bytes / 1024:>13,.0f} {thumbnail_ms:>13.2f}")
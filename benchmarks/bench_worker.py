@@ -0,0 +1,109 @@
+# bench_worker.py
+# background imports (ingest_worker.py): how long the caller waits when it imports new experiments itself
+# (as the Create page did) against dropping them in the watched folder, then the time the worker takes to import
+# them and the latency of a browser session loading experiments and the status panel meanwhile
+# run from the repository root: python -m benchmarks.bench_worker
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+import utils.db as db
+from collect_database import collect_database
+from utils.storage import read_columns
+from utils.jobs import WORKER_SCRIPT, ingest_status, enqueue_item
+from benchmarks.synthetic import write_synthetic_dataset
+
+
+# Load random experiments and the status of the queue until stop is set, recording each latency
+def reader(database_path, experiment_ids, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        with db.read_connection(database_path) as conn:
+            read_columns(conn, random.choice(experiment_ids))
+            ingest_status(conn)
+        latencies.append(time.perf_counter() - start)
+
+
+def run(n_experiments, n_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_folder = os.path.join(tmp, "data")
+        drop_folder = os.path.join(data_folder, "incoming")
+        staging = os.path.join(tmp, "staging")
+        write_synthetic_dataset(data_folder, n_experiments, n_rows, seed=1)
+        write_synthetic_dataset(staging, n_experiments, n_rows, seed=2, prefix="NEW")
+        os.makedirs(drop_folder)
+
+        # Caller importing the new folders itself
+        sync_path = os.path.join(tmp, "sync.db")
+        collect_database(data_folder, sync_path)
+        sync_data = os.path.join(tmp, "sync_data")
+        write_synthetic_dataset(sync_data, n_experiments, n_rows, seed=2, prefix="NEW")
+        start = time.perf_counter()
+        collect_database(sync_data, sync_path)
+        sync_wait = time.perf_counter() - start
+
+        database_path = os.path.join(tmp, "srf.db")
+        collect_database(data_folder, database_path)
+        with db.read_connection(database_path) as conn:
+            experiment_ids = [row[0] for row in conn.execute("SELECT experiment_id FROM experiments")]
+
+        # Dropping them: moved into the watched folder and queued
+        start = time.perf_counter()
+        conn = sqlite3.connect(database_path)
+        for entry in sorted(os.listdir(staging)):
+            os.replace(os.path.join(staging, entry), os.path.join(drop_folder, entry))
+            enqueue_item(conn, os.path.join(drop_folder, entry))
+        queue_wait = time.perf_counter() - start
+
+        stop = threading.Event()
+        latencies = []
+        thread = threading.Thread(target=reader, args=(database_path, experiment_ids, stop, latencies))
+        start = time.perf_counter()
+        worker = subprocess.Popen([sys.executable, WORKER_SCRIPT, "--database", database_path, "--drop", drop_folder,
+                                   "--uploads", os.path.join(tmp, "uploads"), "--once", "--settle", "0"],
+                                  stdout=subprocess.DEVNULL)
+        thread.start()
+        worker.wait()
+        stop.set()
+        thread.join()
+        elapsed = time.perf_counter() - start
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM ingest_jobs GROUP BY status"))
+        rows = conn.execute("SELECT SUM(rows) FROM ingest_jobs WHERE status = 'done'").fetchone()[0] or 0
+        conn.close()
+        db.get_pool(database_path).close()
+
+        latencies = np.array(latencies) * 1000
+        return {
+            "sync_wait_s": sync_wait,
+            "queue_wait_s": queue_wait,
+            "worker_s": elapsed,
+            "rows_per_second": rows / elapsed,
+            "done": counts.get("done", 0),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else float("nan"),
+            "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else float("nan"),
+            "max_ms": float(latencies.max()) if len(latencies) else float("nan"),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background ingest worker benchmark")
+    parser.add_argument("--experiments", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--rows", type=int, default=100000, help="rows per experiment")
+    args = parser.parse_args()
+
+    print(f"{'experiments':>11} {'import wait s':>14} {'queue wait s':>13} {'worker s':>9} {'rows/s':>11} "
+          f"{'done':>5} {'read p50 ms':>12} {'read p95 ms':>12} {'read max ms':>12}")
+    for n_experiments in args.experiments:
+        r = run(n_experiments, args.rows)
+        print(f"{n_experiments:>11} {r['sync_wait_s']:>14.3f} {r['queue_wait_s']:>13.4f} {r['worker_s']:>9.3f} "
+              f"{r['rows_per_second']:>11,.0f} {r['done']:>5} {r['p50_ms']:>12.2f} {r['p95_ms']:>12.2f} "
+              f"{r['max_ms']:>12.2f}")
@@ -0,0 +1,159 @@
+# suite.py
+# benchmark suite over synthetic datasets of growing size (benchmarks/synthetic.py): ingest of collect_database.py,
+# every loader of the browser (utils/utils.py), the pivot of the long table, the filters and the tag/history queries
+# The results go to a JSON file (one record per scale and benchmark): pass the file of an earlier run as --baseline
+# to print the ratios and spot regressions
+# run from the repository root: python -m benchmarks.suite --scales 10x1000 100x10000 --output results.json
+
+import os
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+import utils.db
+import utils.utils as loaders
+from collect_database import collect_database
+from utils.storage import read_eav
+from benchmarks.synthetic import write_synthetic_dataset
+
+# Loaders called once per sampled experiment: name -> arguments after the experiment_id
+EXPERIMENT_LOADERS = {
+    "load_data_for_experiment": (),
+    "load_plots_for_experiment": (),
+    "load_plot_thumbnails": (),
+    "load_processing_steps_for_experiment": (),
+    "load_column_stats": (),
+    "load_data_in_range": ("Temp_Diode", 2.0, 10.0),
+}
+
+# Database-wide loaders and queries: name -> (loader, arguments)
+FLEET_QUERIES = {
+    "load_experiments": ("load_experiments", ()),
+    "filter_metadata_value": ("get_filtered_experiment_ids", ("lab_name", "FNAL")),
+    "filter_metadata_range": ("get_filtered_experiment_ids", ("date", None, ("2025-03-01", "2025-06-30"))),
+    "filter_stats": ("get_experiments_by_stats", ((("QualityFactor", "max_value", ">", 1e8),
+                                                   ("Temp_Diode", "min_value", "<", 2.1)),)),
+    "all_tags": ("get_all_processing_tags", ()),
+    "tags_any": ("get_experiments_by_processing_tags", (("lowT", "coldEP"), "any")),
+    "tags_all": ("get_experiments_by_processing_tags", (("lowT", "coldEP"), "all")),
+    "tags_sequence": ("get_experiments_by_processing_tags", (("BCP", "coldEP", "lowT"), "sequence")),
+    "history_index": ("get_history_index", ()),
+    "history_pattern": ("get_experiments_by_history", ("baking(T=100..1000) -> EP -> *",)),
+    "history_similarity": ("get_experiments_by_history_similarity", (1,)),
+}
+
+
+# "100x10000" -> (100 experiments, 10000 rows per data file)
+def parse_scale(text):
+    experiments, rows = text.lower().split("x")
+    return int(experiments), int(rows)
+
+
+# Best time over repeat runs of func (seconds)
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Run every benchmark on one synthetic dataset, returns {benchmark: seconds}
+def run_scale(n_experiments, n_rows, args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_folder = os.path.join(tmp, "data")
+        database_path = os.path.join(tmp, "srf.db")
+        write_synthetic_dataset(data_folder, n_experiments, n_rows, n_channels=args.channels,
+                                n_images=args.images, extra_steps=args.extra_steps)
+
+        start = time.perf_counter()
+        summary = collect_database(data_folder, database_path)
+        results["ingest"] = time.perf_counter() - start
+        results["ingest_unchanged"] = best_time(lambda: collect_database(data_folder, database_path), 1)
+
+        # The loaders of the browser read the database of utils.db.DATABASE_PATH
+        utils.db.DATABASE_PATH = loaders.DATABASE_PATH = database_path
+        loaders.clear_loader_cache()
+        with utils.db.read_connection() as conn:
+            experiment_ids = [row[0] for row in conn.execute(
+                "SELECT experiment_id FROM experiments ORDER BY experiment_id LIMIT ?", (args.sample,))]
+
+        # Uncached: the cost of a first request, mean per experiment
+        for name, extra in EXPERIMENT_LOADERS.items():
+            loader = getattr(loaders, name).uncached
+            total = best_time(lambda: [loader(experiment_id, *extra) for experiment_id in experiment_ids], args.repeat)
+            results[name] = total / len(experiment_ids)
+        for name, (loader_name, params) in FLEET_QUERIES.items():
+            loader = getattr(loaders, loader_name).uncached
+            results[name] = best_time(lambda: loader(*params), args.repeat)
+        loaders.clear_loader_cache()
+
+        # Long table: the pivot of one experiment back to wide format
+        eav_folder = os.path.join(tmp, "eav")
+        eav_path = os.path.join(tmp, "eav.db")
+        write_synthetic_dataset(eav_folder, 1, n_rows, n_channels=args.channels)
+        collect_database(eav_folder, eav_path, storage="eav")
+        with utils.db.read_connection(eav_path) as conn:
+            results["pivot_eav"] = best_time(lambda: read_eav(conn, 1), args.repeat)
+        utils.db.get_pool(eav_path).close()
+        utils.db.get_pool(database_path).close()
+    return results, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic SRF datasets")
+    parser.add_argument("--scales", nargs="+", default=["10x1000", "100x10000", "500x20000"],
+                        help="dataset sizes as EXPERIMENTSxROWS")
+    parser.add_argument("--channels", type=int, default=10, help="channels per data file")
+    parser.add_argument("--images", type=int, default=2, help="PNG plots per experiment")
+    parser.add_argument("--extra-steps", type=int, default=3,
+                        help="single steps of processes.json added to the preset chains (at most)")
+    parser.add_argument("--sample", type=int, default=10, help="experiments the per-experiment loaders run on")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions (best time is reported)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file of the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="ratio to the baseline flagged as slower")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r["scale"], r["benchmark"]): r["seconds"] for r in json.load(f)["results"]}
+
+    records = []
+    print(f"{'scale':>11} {'benchmark':>38} {'ms':>10} {'baseline':>10} {'ratio':>7}")
+    for scale in args.scales:
+        n_experiments, n_rows = parse_scale(scale)
+        results, summary = run_scale(n_experiments, n_rows, args)
+        for name, seconds in results.items():
+            records.append({"scale": scale, "experiments": n_experiments, "rows": n_rows, "channels": args.channels,
+                            "images": args.images, "benchmark": name, "seconds": seconds})
+            line = f"{scale:>11} {name:>38} {seconds * 1000:>10.2f}"
+            if (scale, name) in baseline:
+                ratio = seconds / baseline[(scale, name)]
+                line += f" {baseline[(scale, name)] * 1000:>10.2f} {ratio:>7.2f}"
+                line += "  slower" if ratio > args.tolerance else ""
+            print(line)
+        records.append({"scale": scale, "experiments": n_experiments, "rows": n_rows, "channels": args.channels,
+                        "images": args.images, "benchmark": "ingest_rows_per_second",
+                        "seconds": None, "value": summary["rows_per_second"]})
+
+    with open(args.output, "w") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+                   "python": platform.python_version(), "platform": platform.platform(),
+                   "results": records}, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,137 @@
+# synthetic.py
+# generator of synthetic experiment folders with the layout of ./data, used by the benchmarks
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from utils.catalogs import load_processes, load_presets
+
+# Same channel layout as the cold-test files (note the duplicated LowerEdge)
+CHANNELS = ["Time", "Temp_Diode", "MKS1000", "LowerEdge", "Bandwidth",
+            "Center_Stimulus", "QualityFactor", "LowerEdge", "Loss", "Max_Freq"]
+
+
+# Ranges of the random parameters of the single steps taken from processes.json
+STEP_TEMPERATURES = (20.0, 1000.0)
+STEP_DURATIONS = (0.5, 48.0)
+
+IMAGE_SIZE = (800, 600)
+
+
+# Build a cool-down log: temperature decays from room temperature to ~2 K,
+# frequency and quality factor change across Tc like in the real measurements
+def synthetic_measurement(n_rows, rng):
+    time = 3820892610.0 + np.cumsum(rng.uniform(0.5, 3.0, n_rows))
+    progress = np.linspace(0.0, 1.0, n_rows)
+    temp = 2.0 + 291.6 * np.exp(-6.0 * progress) + rng.normal(0.0, 0.01, n_rows)
+    superconducting = temp < 9.2
+    center = 648861348.41 + 3.0e5 * (1.0 - np.exp(-3.0 * progress)) + rng.normal(0.0, 50.0, n_rows)
+    bandwidth = np.where(superconducting, 5.0, 55326.0) * rng.uniform(0.9, 1.1, n_rows)
+    quality = center / bandwidth
+    return pd.DataFrame({
+        "Time": time,
+        "Temp_Diode": temp,
+        "MKS1000": 986.69 - 900.0 * progress + rng.normal(0.0, 0.5, n_rows),
+        "LowerEdge": center - bandwidth / 2,
+        "Bandwidth": bandwidth,
+        "Center_Stimulus": center,
+        "QualityFactor": quality,
+        "UpperEdge": center + bandwidth / 2,
+        "Loss": 76.549 + rng.normal(0.0, 0.1, n_rows),
+        "Max_Freq": center,
+    })
+
+
+# Turn a chain of presets.json into processing steps as read by collect_database.py,
+# followed by up to extra_steps single steps of processes.json with random tags and parameters
+def synthetic_processing_steps(rng, extra_steps=0):
+    presets = load_presets()
+    steps = []
+    for _ in range(rng.integers(1, 4)):
+        chain = presets[rng.choice(list(presets))]
+        for preset in chain:
+            step = {"process_type": preset["process_type"], "description": preset["description"], "tags": preset["tag"]}
+            if "T [C]" in preset:
+                step["temperature C"] = preset["T [C]"]
+            if "Time [h]" in preset:
+                step["duration h"] = preset["Time [h]"]
+            steps.append(step)
+    if extra_steps:
+        processes = load_processes()
+        for _ in range(rng.integers(0, extra_steps + 1)):
+            steps.insert(rng.integers(0, len(steps) + 1), synthetic_process_step(rng, processes))
+    return steps
+
+
+# A step of a random process type of processes.json with a random subset of its tags
+def synthetic_process_step(rng, processes):
+    process_type = str(rng.choice(list(processes)))
+    process = processes[process_type]
+    tags = rng.choice(process["tags"], size=rng.integers(1, len(process["tags"]) + 1), replace=False)
+    step = {"process_type": process_type, "description": f"synthetic {process_type} step", "tags": ", ".join(tags)}
+    if "T [C]" in process["parameters"]:
+        step["temperature C"] = round(float(rng.uniform(*STEP_TEMPERATURES)), 1)
+    if "Time [h]" in process["parameters"]:
+        step["duration h"] = round(float(rng.uniform(*STEP_DURATIONS)), 1)
+    return step
+
+
+# Channels of a measurement: the first n_channels of the cold-test layout, then noise channels Aux_1, Aux_2...
+def synthetic_channels(df, n_channels, rng):
+    if n_channels is None:
+        return df, CHANNELS
+    df = df.iloc[:, :n_channels].copy()
+    for i in range(1, n_channels - len(CHANNELS) + 1):
+        df[f"Aux_{i}"] = rng.normal(0.0, 1.0, len(df))
+    return df, (CHANNELS + [f"Aux_{i}" for i in range(1, n_channels - len(CHANNELS) + 1)])[:n_channels]
+
+
+# PNG plot-like image of a measurement (Q0 against temperature drawn on a white canvas)
+def write_synthetic_image(path, df, size=IMAGE_SIZE):
+    from PIL import Image
+    width, height = size
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    x = df["Temp_Diode"].to_numpy()
+    y = np.log10(df["QualityFactor"].to_numpy())
+    columns = ((x - x.min()) / (np.ptp(x) or 1.0) * (width - 1)).astype(int)
+    rows = ((1.0 - (y - y.min()) / (np.ptp(y) or 1.0)) * (height - 1)).astype(int)
+    pixels[rows, columns] = (31, 119, 180)
+    Image.fromarray(pixels).save(path)
+
+
+# Insert n_experiments experiments with synthetic processing steps only (no folder, no data)
+def insert_synthetic_histories(conn, n_experiments, rng, prefix="SYN"):
+    from collect_database import insert_experiment
+    for i in range(n_experiments):
+        metadata = {"experiment_name": f"{prefix}_{i:05d}", "date": "2025-01-01",
+                    "processing_steps": synthetic_processing_steps(rng)}
+        insert_experiment(conn, {"folder_path": f"data/{prefix}_{i:05d}", "metadata": metadata, "images": []})
+    conn.commit()
+
+
+# Write n_experiments folders (metadata.json + tab separated data file + n_images PNG plots) into base_folder
+def write_synthetic_dataset(base_folder, n_experiments, n_rows, seed=0, prefix="SYN", n_channels=None,
+                            n_images=0, extra_steps=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(base_folder, exist_ok=True)
+    for i in range(n_experiments):
+        name = f"{prefix}_{i:05d}"
+        folder = os.path.join(base_folder, name)
+        os.makedirs(folder, exist_ok=True)
+        metadata = {
+            "experiment_name": name,
+            "lab_name": str(rng.choice(["LASA", "FNAL", "DESY", "JLab"])),
+            "description": "synthetic cold test",
+            "date": f"2025-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}",
+            "processing_steps": synthetic_processing_steps(rng, extra_steps),
+        }
+        with open(os.path.join(folder, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        df = synthetic_measurement(n_rows, rng)
+        for j in range(n_images):
+            write_synthetic_image(os.path.join(folder, f"{name}_plot_{j}.png"), df.iloc[j::n_images])
+        df, header = synthetic_channels(df, n_channels, rng)
+        df.to_csv(os.path.join(folder, f"{name}_data.txt"), sep="\t", index=False,
+                  header=header, float_format="%.3f")
@@ -1,15 +1,47 @@
 # collect_database.py
 # Python/SQL script to collect the files from ./data in a database
- 
-import sqlite3
-import pandas as pd
+
+import io
 import os
 import json
+import time
+import argparse
+import hashlib
+import sqlite3
+import zipfile
+import posixpath
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from utils.db import DATABASE_PATH, connect, remove_database
+from utils.archive import ARCHIVE_EXTENSION, archive_member_path, list_archives
+from utils.jobs import DROP_FOLDER
+from utils.parser import read_measurement_file
+from utils.storage import (STORAGE_MODES, BLOCK_ROWS, CREATE_DATA_BLOCKS_VIEW, write_columns, encode_blocks, insert_blocks,
+                           drop_partial_blocks, link_data_file, find_data_file, prune_file_blocks, block_ranges)
+from utils.stats import STAT_FIELDS, compute_column_stats, stored_column_stats, write_column_stats, column_stats_rows
+from utils.tags import step_tags_text, index_step_tags
+from utils.thumbnails import build_missing_thumbnails, evict_thumbnails
+from utils.derived import available_quantities, derived_quantity, derive_dataframe, write_derived, prune_derived
+from utils.profiling import recording, span, timed, event
+
+# Tables holding rows of an experiment, cleared when its folder changes or disappears
+# (the blocks of a data file are only dropped when no experiment refers to them, see prune_file_blocks)
+EXPERIMENT_TABLES = ["data", "experiment_files", "column_stats", "plots", "step_tags", "processing_steps", "ingest_progress"]
+
+# Layout used for the measurement data (see utils/storage.py), "eav" keeps the legacy long table
+STORAGE = "columnar"
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
-DATABASE_PATH = os.path.join("data", "srf_database.db")
+# Data files larger than this are not parsed at once but streamed in chunks of CHUNK_ROWS rows,
+# committing each chunk: memory stays bounded and an interrupted import resumes from the last chunk
+STREAM_THRESHOLD_BYTES = 64 * 2**20
+CHUNK_ROWS = BLOCK_ROWS
 
-def create_database():
-    conn = sqlite3.connect(DATABASE_PATH)
+def create_database(conn):
     cursor = conn.cursor()
 
     # Create experiments table
@@ -36,17 +68,116 @@ def create_database():
         );
     ''')
 
-    # Create plots table
+    # Create columnar measurement data tables: packed float64 blocks per channel of every distinct data file
+    # (keyed by the sha256 of the file) and the data file of each experiment, joined by the view data_blocks
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_blocks (
+            content_hash TEXT NOT NULL,
+            block_index INTEGER NOT NULL,
+            column_index INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            row_start INTEGER NOT NULL,
+            n_rows INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (content_hash, block_index, column_index)
+        );
+    ''')
+    # Zone maps of the blocks: min/max of every channel in every block (NULL for a block of NaN only),
+    # the range queries of utils/storage.py skip the blocks whose range does not overlap the requested one
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS block_ranges (
+            content_hash TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            block_index INTEGER NOT NULL,
+            min_value REAL,
+            max_value REAL,
+            PRIMARY KEY (content_hash, column_name, block_index)
+        ) WITHOUT ROWID;
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS experiment_files (
+            experiment_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
+        );
+    ''')
+    # Databases older than the content-addressed blocks keep their data_blocks table until migrated
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_blocks'").fetchone():
+        cursor.execute(CREATE_DATA_BLOCKS_VIEW)
+
+    # Create column statistics table: summary of every channel computed at ingest (see utils/stats.py)
+    # (bounds of the browser filters and fleet-wide searches without reading the data)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS column_stats (
+            experiment_id INTEGER NOT NULL,
+            column_index INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            n_values INTEGER NOT NULL,
+            nan_count INTEGER,
+            min_value REAL,
+            max_value REAL,
+            mean_value REAL,
+            std_value REAL,
+            q05 REAL,
+            q25 REAL,
+            q50 REAL,
+            q75 REAL,
+            q95 REAL,
+            PRIMARY KEY (experiment_id, column_name),
+            FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
+        );
+    ''')
+
+    # Create plots table (content_hash: sha256 of the image file, key of its thumbnails)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS plots (
             plot_id INTEGER PRIMARY KEY AUTOINCREMENT,
             experiment_id INTEGER,
             file_path TEXT,
             caption TEXT,
+            content_hash TEXT,
             FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
         );
     ''')
 
+    # Create thumbnails table: reduced images of the plots at the sizes of utils/thumbnails.py,
+    # keyed by the content of the source file (identical images share their thumbnails)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            content_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (content_hash, size)
+        );
+    ''')
+
+    # Create derived quantities tables (utils/derived.py): results and fit parameters keyed by the hash of their
+    # inputs (data file content, formula version and settings), one float64 blob per output column
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS derived (
+            input_hash TEXT PRIMARY KEY,
+            source_hash TEXT NOT NULL,
+            name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            n_rows INTEGER NOT NULL,
+            created REAL NOT NULL
+        );
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS derived_columns (
+            input_hash TEXT NOT NULL,
+            column_index INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (input_hash, column_index)
+        );
+    ''')
+
     # Create processing steps table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS processing_steps (
@@ -62,156 +193,1042 @@ def create_database():
         );
     ''')
 
-    conn.commit()
-    conn.close()
+    # Create tag tables: one row per tag (case-insensitive unique name) and one per (step, tag),
+    # experiment_id and step_index are repeated in step_tags so that the recipe queries never read processing_steps
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            tag_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL COLLATE NOCASE UNIQUE
+        );
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS step_tags (
+            step_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            experiment_id INTEGER NOT NULL,
+            step_index INTEGER NOT NULL,
+            PRIMARY KEY (step_id, tag_id),
+            FOREIGN KEY (step_id) REFERENCES processing_steps(step_id),
+            FOREIGN KEY (tag_id) REFERENCES tags(tag_id),
+            FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
+        );
+    ''')
 
+    # Create manifest table: one row per tracked file of each imported folder
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS manifest (
+            folder_path TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            experiment_id INTEGER,
+            mtime REAL,
+            size INTEGER,
+            content_hash TEXT,
+            PRIMARY KEY (folder_path, file_name),
+            FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
+        );
+    ''')
 
-def insert_experiment_metadata(experiment_name, lab_name, description, date, article_url=None):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    # Create ingest progress table: last committed chunk of the streamed imports still running
+    # (manifest_hash: the other files of the folder when the import started, see manifest_signature)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            folder_path TEXT PRIMARY KEY,
+            experiment_id INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            rows_done INTEGER NOT NULL,
+            blocks_done INTEGER NOT NULL,
+            manifest_hash TEXT,
+            FOREIGN KEY (experiment_id) REFERENCES experiments(experiment_id)
+        );
+    ''')
 
-    # Check if metadata already exists
+    # Create background import tables (utils/jobs.py, ingest_worker.py): one row per item of the drop folder
+    # with its status, rows and error, and the heartbeat of the worker
     cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_path TEXT NOT NULL,
+            target_path TEXT,
+            kind TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            status TEXT NOT NULL,
+            bytes INTEGER,
+            rows INTEGER,
+            error TEXT,
+            queued_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        );
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status, job_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_source ON ingest_jobs(source_path, signature)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_worker (
+            worker_id INTEGER PRIMARY KEY CHECK (worker_id = 1),
+            pid INTEGER NOT NULL,
+            started_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL
+        );
+    ''')
+
+    # Create generation counter: bumped at every change so that the browser can drop its cached loads
+    # (starts from the creation time, a rebuilt database never reuses the generations of the old one)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS db_generation (
+            generation INTEGER NOT NULL
+        );
+    ''')
+    cursor.execute('''
+        INSERT INTO db_generation (generation)
+        SELECT ? WHERE NOT EXISTS (SELECT 1 FROM db_generation)
+    ''', (time.time_ns() // 1000,))
+
+    conn.commit()
+    migrate_database(conn)
+
+
+def bump_generation(conn):
+    conn.execute("UPDATE db_generation SET generation = generation + 1")
+
+
+# ======================
+# Schema migrations
+# ======================
+
+# Secondary indexes: every lookup by experiment is a b-tree search instead of a full table scan
+def add_indexes(conn):
+    # The unique key needs distinct (experiment_name, date): drop duplicates left by older versions
+    for (experiment_id,) in conn.execute('''
         SELECT experiment_id FROM experiments
-        WHERE experiment_name = ? AND date = ?
-    ''', (experiment_name, date))
-    existing = cursor.fetchone()
+        WHERE experiment_id NOT IN (SELECT MIN(experiment_id) FROM experiments GROUP BY experiment_name, date)
+    ''').fetchall():
+        delete_experiment(conn, experiment_id)
+
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_experiments_name_date ON experiments(experiment_name, date)")
+    # Covering index: SELECT * FROM data WHERE experiment_id = ? is answered from the index alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_experiment ON data(experiment_id, row_index, column_name, value)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plots_experiment ON plots(experiment_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_processing_steps_experiment ON processing_steps(experiment_id, step_index)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_experiment ON manifest(experiment_id)")
+
+
+# Range filters on the long table, and statistics of the experiments imported before column_stats existed
+def add_column_stats(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_column_value ON data(experiment_id, column_name, value, row_index)")
+    for (experiment_id,) in conn.execute('''
+        SELECT experiment_id FROM experiments
+        WHERE experiment_id NOT IN (SELECT experiment_id FROM column_stats)
+    ''').fetchall():
+        write_column_stats(conn, experiment_id, stored_column_stats(conn, experiment_id))
+
+
+# Mean, std, NaN count and quantiles in column_stats, recomputed for the experiments that only have count/min/max;
+# index for the fleet-wide searches by channel
+def extend_column_stats(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(column_stats)")}
+    for field in STAT_FIELDS:
+        if field not in existing:
+            conn.execute(f"ALTER TABLE column_stats ADD COLUMN {field} {'INTEGER' if field == 'nan_count' else 'REAL'}")
+    for (experiment_id,) in conn.execute("SELECT DISTINCT experiment_id FROM column_stats WHERE nan_count IS NULL").fetchall():
+        write_column_stats(conn, experiment_id, stored_column_stats(conn, experiment_id))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_column_stats_name ON column_stats(column_name)")
+
 
-    if not existing:
-        cursor.execute('''
-            INSERT INTO experiments (experiment_name, lab_name, description, date, article_url)
+# Normalized tags of the steps imported before tags/step_tags existed, and the indexes of the recipe queries
+def add_tag_index(conn):
+    for (experiment_id,) in conn.execute("SELECT DISTINCT experiment_id FROM processing_steps").fetchall():
+        index_step_tags(conn, experiment_id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_step_tags_tag ON step_tags(tag_id, experiment_id, step_index)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_step_tags_experiment ON step_tags(experiment_id)")
+
+
+# Content hash of the images imported before the thumbnails existed (their thumbnails are made on first request)
+def add_plot_hashes(conn):
+    if "content_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(plots)")}:
+        conn.execute("ALTER TABLE plots ADD COLUMN content_hash TEXT")
+    conn.executemany("UPDATE plots SET content_hash = ? WHERE plot_id = ?", [
+        (hash_file(file_path), plot_id) for plot_id, file_path in
+        conn.execute("SELECT plot_id, file_path FROM plots WHERE content_hash IS NULL").fetchall()
+        if os.path.exists(file_path)
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plots_content_hash ON plots(content_hash)")
+
+
+# Content-addressed blocks: the data_blocks table of older databases is split into file_blocks (each distinct
+# data file once, keyed by the content hash of the manifest) and experiment_files, data_blocks becomes a view
+def deduplicate_data_blocks(conn):
+    if conn.execute("SELECT type FROM sqlite_master WHERE name = 'data_blocks'").fetchone() == ("table",):
+        for (experiment_id,) in conn.execute("SELECT DISTINCT experiment_id FROM data_blocks").fetchall():
+            # A streamed import still running is only linked to its data file when complete
+            in_progress = conn.execute(
+                "SELECT content_hash FROM ingest_progress WHERE experiment_id = ?", (experiment_id,)).fetchone()
+            manifest = conn.execute(
+                "SELECT content_hash FROM manifest WHERE experiment_id = ? AND file_name GLOB '*.txt' ORDER BY file_name LIMIT 1",
+                (experiment_id,)).fetchone()
+            if in_progress or manifest:
+                content_hash = (in_progress or manifest)[0]
+            else:  # no data file known (database built before the manifest): hash of the stored blocks
+                digest = hashlib.sha256()
+                for (payload,) in conn.execute(
+                        "SELECT payload FROM data_blocks WHERE experiment_id = ? ORDER BY block_index, column_index",
+                        (experiment_id,)):
+                    digest.update(payload)
+                content_hash = digest.hexdigest()
+            conn.execute('''
+                INSERT OR IGNORE INTO file_blocks (content_hash, block_index, column_index, column_name, row_start, n_rows, payload)
+                SELECT ?, block_index, column_index, column_name, row_start, n_rows, payload FROM data_blocks
+                WHERE experiment_id = ?
+            ''', (content_hash, experiment_id))
+            if not in_progress:
+                link_data_file(conn, experiment_id, content_hash)
+        conn.execute("DROP TABLE data_blocks")
+        conn.execute(CREATE_DATA_BLOCKS_VIEW)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_experiment_files_hash ON experiment_files(content_hash)")
+
+
+# Derived quantities of the experiments imported before they existed (the new ones get them at ingest)
+def add_derived_quantities(conn):
+    for (experiment_id,) in conn.execute("SELECT experiment_id FROM experiments").fetchall():
+        channels = [row[0] for row in conn.execute(
+            "SELECT column_name FROM column_stats WHERE experiment_id = ?", (experiment_id,))]
+        for name in available_quantities(channels):
+            derived_quantity(conn, experiment_id, name)
+
+
+# Zone maps of the blocks stored before them (the new ones get them in insert_blocks)
+def add_block_ranges(conn):
+    for (content_hash,) in conn.execute("SELECT DISTINCT content_hash FROM file_blocks").fetchall():
+        blocks = conn.execute('''
+            SELECT block_index, column_index, column_name, row_start, n_rows, payload FROM file_blocks
+            WHERE content_hash = ?
+        ''', (content_hash,)).fetchall()
+        conn.executemany('''
+            INSERT OR IGNORE INTO block_ranges (content_hash, column_name, block_index, min_value, max_value)
             VALUES (?, ?, ?, ?, ?)
-        ''', (experiment_name, lab_name, description, date, article_url))
+        ''', [(content_hash, *row) for row in block_ranges(blocks)])
 
-    conn.commit()
-    conn.close()
+
+# Signature of the other files of the streamed imports still running (a progress row without it is not resumed)
+def add_progress_manifest(conn):
+    if "manifest_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(ingest_progress)")}:
+        conn.execute("ALTER TABLE ingest_progress ADD COLUMN manifest_hash TEXT")
+
+
+# Applied in order to databases whose PRAGMA user_version is lower than their position (1-based)
+SCHEMA_MIGRATIONS = [add_indexes, add_column_stats, extend_column_stats, add_tag_index, add_plot_hashes,
+                     deduplicate_data_blocks, add_derived_quantities, add_block_ranges, add_progress_manifest]
 
 
-def insert_csv_to_db(csv_file, experiment_id):
-    df = pd.read_csv(csv_file, sep=r'\s+|,', engine='python')  # supports both space and comma
-    df.reset_index(drop=True, inplace=True)
+def migrate_database(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+
+
+QUERY_FIND_EXPERIMENT = '''
+    SELECT experiment_id FROM experiments
+    WHERE experiment_name = ? AND date = ?
+'''
+
+QUERY_FOLDER_MANIFEST = "SELECT file_name, mtime, size, content_hash FROM manifest WHERE folder_path = ?"
+
+
+# Return the experiment_id of an experiment already in the database (None if missing)
+def find_experiment(conn, experiment_name, date):
+    row = conn.execute(QUERY_FIND_EXPERIMENT, (experiment_name, date)).fetchone()
+    return row[0] if row else None
+
+
+# Remove an experiment and all its rows
+def delete_experiment(conn, experiment_id):
+    for table in EXPERIMENT_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE experiment_id = ?", (experiment_id,))
+    conn.execute("DELETE FROM experiments WHERE experiment_id = ?", (experiment_id,))
+
+
+# Insert the experiment metadata (if new) and return its experiment_id
+def insert_experiment_metadata(conn, experiment_name, lab_name, description, date, article_url=None):
+    # Check if metadata already exists
+    existing = find_experiment(conn, experiment_name, date)
+    if existing is not None:
+        return existing
 
-    conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO experiments (experiment_name, lab_name, description, date, article_url)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (experiment_name, lab_name, description, date, article_url))
+    return cursor.lastrowid
 
-    for row_index, row in df.iterrows():
-        for col_name, value in row.items():
-            cursor.execute('''
-                INSERT INTO data (experiment_id, row_index, column_name, value)
-                VALUES (?, ?, ?, ?)
-            ''', (experiment_id, row_index, col_name, value))
 
-    conn.commit()
-    conn.close()
+# Insert a parsed measurement file (or a chunk of it starting at row_start) in the legacy long table
+def insert_rows(conn, experiment_id, df, row_start=0):
+    # One executemany per column instead of one execute per cell:
+    # the values go to sqlite as plain python lists, in the caller's transaction
+    cursor = conn.cursor()
+    row_indices = range(row_start, row_start + len(df))
+    for col_name in df.columns:
+        cursor.executemany('''
+            INSERT INTO data (experiment_id, row_index, column_name, value)
+            VALUES (?, ?, ?, ?)
+        ''', zip(repeat(experiment_id), row_indices, repeat(col_name), df[col_name].tolist()))
+
+
+# Insert the measurement file and return the number of data rows
+# (columnar: a file whose content is already stored is only linked, without parsing it)
+def insert_csv_to_db(conn, csv_file, experiment_id, storage=STORAGE):
+    if storage == "columnar":
+        content_hash = hash_file(csv_file)
+        if find_data_file(conn, content_hash) is not None:
+            return link_stored_data_file(conn, experiment_id, content_hash)
+    df = read_measurement_file(csv_file)
+    if storage == "columnar":
+        write_columns(conn, content_hash, df)
+        link_data_file(conn, experiment_id, content_hash)
+    else:
+        insert_rows(conn, experiment_id, df)
+    write_column_stats(conn, experiment_id, compute_column_stats(df))
+    return len(df)
+
 
+# Link an experiment to a data file content already stored, with the statistics of that data
+# (given, copied from an experiment having the same data file, or computed from the blocks)
+# Returns the number of data rows
+def link_stored_data_file(conn, experiment_id, content_hash, stats=None):
+    if not stats:
+        source_id = find_data_file(conn, content_hash)
+        stats = column_stats_rows(conn, source_id) if source_id is not None else None
+    link_data_file(conn, experiment_id, content_hash)
+    write_column_stats(conn, experiment_id, stats or stored_column_stats(conn, experiment_id))
+    return conn.execute(
+        "SELECT COALESCE(SUM(n_rows), 0) FROM data_blocks WHERE experiment_id = ? AND column_index = 0", (experiment_id,)
+    ).fetchone()[0]
 
-def insert_plot(experiment_id, file_path, caption=None):
-    conn = sqlite3.connect(DATABASE_PATH)
+
+def insert_plot(conn, experiment_id, file_path, caption=None, content_hash=None):
+    if content_hash is None and os.path.exists(file_path):
+        content_hash = hash_file(file_path)
     cursor = conn.cursor()
 
     cursor.execute('''
-        INSERT INTO plots (experiment_id, file_path, caption)
-        VALUES (?, ?, ?)
-    ''', (experiment_id, file_path, caption))
-
-    conn.commit()
-    conn.close()
+        INSERT INTO plots (experiment_id, file_path, caption, content_hash)
+        VALUES (?, ?, ?, ?)
+    ''', (experiment_id, file_path, caption, content_hash))
 
 
-def import_experiment_from_folder(folder_path):
+# Read and prepare an experiment folder without touching the database (None if it has no metadata.json)
+# Runs in the worker processes of a parallel import: parses the metadata and the data file,
+# packs the data for the chosen storage and hashes the files for the manifest
+# A data file above stream_above bytes is left to the writer, which streams it (see stream_measurement_file)
+# A data file whose content is already stored in database_path (columnar) is not parsed at all, nor one
+# whose content hash is in written_hashes (written earlier in this run, maybe not committed yet)
+@timed()
+def read_experiment_folder(folder_path, storage=STORAGE, stream_above=STREAM_THRESHOLD_BYTES, database_path=None,
+                           written_hashes=()):
     metadata_path = os.path.join(folder_path, 'metadata.json')
     if not os.path.exists(metadata_path):
         print(f"No metadata.json in {folder_path}, skipping.")
-        return
+        return None
 
+    start = time.perf_counter()
     with open(metadata_path, 'r') as f:
         metadata = json.load(f)
+    missing = [key for key in ('experiment_name', 'date') if key not in metadata]
+    if missing:
+        raise ValueError(f"{metadata_path} is missing {', '.join(missing)}")
+
+    manifest = manifest_entries(folder_path)
+    data_files = [(file_name, content_hash) for file_name, _, _, content_hash in manifest if file_name.endswith('.txt')]
+    data_path = os.path.join(folder_path, data_files[0][0]) if data_files else None
+    data_hash = data_files[0][1] if data_files else None
+    stored_stats = None
+    if storage == "columnar" and data_hash:
+        # [] for a data file of this run: the writer copies the statistics of the experiment it was linked to
+        stored_stats = [] if data_hash in written_hashes else stored_data_file_stats(database_path, data_hash)
+    stream = data_path is not None and stored_stats is None and os.path.getsize(data_path) > stream_above
+    with span("parse"):
+        df = read_measurement_file(data_path) if data_path and not stream and stored_stats is None else None
+    parsed = time.perf_counter()
+
+    images = [(os.path.join(folder_path, file_name), content_hash) for file_name, _, _, content_hash in manifest
+              if file_name.lower().endswith(IMAGE_EXTENSIONS)]
+    bundle = experiment_bundle(folder_path, metadata, manifest, images, data_hash, stored_stats, df, storage)
+    if stream:
+        bundle["stream_file"] = data_path
+    bundle["timings"] = {"parse": parsed - start, "transform": time.perf_counter() - parsed}
+    return bundle
+
+
+# Bundle of an experiment read from a folder or an archive: metadata, manifest entries, images
+# [(file_path, content_hash)] (their thumbnails are made on first view), and the data file (parsed df packed
+# for the storage, or only its content hash when stored_stats says that it is already stored)
+def experiment_bundle(folder_path, metadata, manifest, images, data_hash, stored_stats, df, storage=STORAGE):
+    bundle = {
+        "folder_path": os.path.normpath(folder_path),
+        "metadata": metadata,
+        "n_rows": 0 if df is None else len(df),
+        "images": images,
+        "manifest": manifest,
+    }
+    if data_hash is not None:
+        bundle["data_hash"] = data_hash
+    if stored_stats is not None:
+        bundle["stored"] = True
+        bundle["stored_stats"] = stored_stats
+    elif df is not None:
+        if storage == "columnar":
+            with span("encode_blocks"):
+                bundle["blocks"] = encode_blocks(df)
+        else:
+            bundle["data"] = df
+        with span("column_stats"):
+            bundle["stats"] = compute_column_stats(df)
+        if data_hash is not None:
+            with span("derived"):
+                bundle["derived"] = derive_dataframe(df, data_hash)
+    return bundle
+
 
+# Statistics rows of a data file content already stored in the database, None if it is not stored
+# Checked by the reading processes on their own read-only connection: the statistics travel with the bundle,
+# the experiment that held the data file may be replaced before the writer links the new one
+def stored_data_file_stats(database_path, content_hash):
+    if database_path is None or not os.path.exists(database_path):
+        return None
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        return data_file_stats(conn, content_hash)
+    except sqlite3.OperationalError:  # database not created yet
+        return None
+    finally:
+        conn.close()
+
+
+def data_file_stats(conn, content_hash):
+    source_id = find_data_file(conn, content_hash)
+    return None if source_id is None else column_stats_rows(conn, source_id)
+
+
+# Insert the metadata, processing steps and plots of a prepared folder, returns the new experiment_id
+# (None if the experiment was already imported from another folder)
+def insert_experiment(conn, bundle):
+    metadata = bundle["metadata"]
+    folder_path = bundle["folder_path"]
     experiment_name = metadata['experiment_name']
     lab_name = metadata.get('lab_name', '')
     description = metadata.get('description', '')
     date = metadata['date']
     article_url = metadata.get('article_url', None)
 
-    # Always insert experiment metadata first
-    insert_experiment_metadata(experiment_name, lab_name, description, date, article_url)
+    # The same experiment coming from another folder would mix two data sets:
+    # keep the first one, replace it only if no folder owns it (database built before the manifest)
+    existing = find_experiment(conn, experiment_name, date)
+    if existing is not None:
+        owner = conn.execute("SELECT folder_path FROM manifest WHERE experiment_id = ? LIMIT 1", (existing,)).fetchone()
+        if owner and owner[0] != folder_path:
+            print(f"Experiment {experiment_name} ({date}) already imported from {owner[0]}, skipping {folder_path}.")
+            return None
+        delete_experiment(conn, existing)
 
-    # Get experiment_id
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT experiment_id FROM experiments
-        WHERE experiment_name = ? AND date = ?
-        ORDER BY experiment_id DESC LIMIT 1
-    ''', (experiment_name, date))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
+    # Always insert experiment metadata first
+    experiment_id = insert_experiment_metadata(conn, experiment_name, lab_name, description, date, article_url)
+    if experiment_id is None:
         raise ValueError("Failed to insert or retrieve experiment metadata.")
-    experiment_id = row[0]
 
     # Insert processing steps if present
+    # (the Create page writes "T [C]"/"Time [h]" and "tag" instead of "temperature C"/"duration h" and "tags")
     processing_steps = metadata.get('processing_steps', [])
-    for index, step in enumerate(processing_steps):
-        cursor.execute('''
-            INSERT INTO processing_steps (experiment_id, step_index, process_type, description, temperature_c, duration_h, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            experiment_id,
-            index,
-            step.get('process_type'),
-            step.get('description'),
-            step.get('temperature C'),
-            step.get('duration h'),
-            step.get('tags')
-        ))
+    conn.executemany('''
+        INSERT INTO processing_steps (experiment_id, step_index, process_type, description, temperature_c, duration_h, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(
+        experiment_id,
+        index,
+        step.get('process_type'),
+        step.get('description'),
+        step.get('temperature C', step.get('T [C]')),
+        step.get('duration h', step.get('Time [h]')),
+        step_tags_text(step)
+    ) for index, step in enumerate(processing_steps)])
+    index_step_tags(conn, experiment_id)
 
-    conn.commit()
-    conn.close()
+    # Insert plots if any, with the content hashes of the manifest
+    for file_path, content_hash in bundle["images"]:
+        insert_plot(conn, experiment_id, file_path, content_hash=content_hash)
 
-    # Insert CSV data if available
-    csv_file = None
-    for file in os.listdir(folder_path):
-        if file.endswith('.txt'):
-            csv_file = os.path.join(folder_path, file)
-            break
-    if csv_file:
-        insert_csv_to_db(csv_file, experiment_id)
+    return experiment_id
 
-    # Insert plots if any
-    for file in os.listdir(folder_path):
-        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            file_path = os.path.join(folder_path, file)
-            insert_plot(experiment_id, file_path)
+
+# Content hash of the streamed data file, from the manifest entries of the bundle
+def stream_file_hash(bundle):
+    file_name = os.path.basename(bundle["stream_file"])
+    return next(content_hash for name, _, _, content_hash in bundle["manifest"] if name == file_name)
+
+
+# Hash of the (file_name, content_hash) manifest entries of a folder other than its streamed data file:
+# the metadata, processing steps and images written when the streamed import started
+def manifest_signature(bundle):
+    file_name = os.path.basename(bundle["stream_file"])
+    entries = sorted((name, content_hash) for name, _, _, content_hash in bundle["manifest"] if name != file_name)
+    return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+
+# (experiment_id, rows_done, blocks_done) of an interrupted streamed import of the same folder, or None
+# A partial import is dropped (and started again) when the data file or any other file of the folder changed
+# in the meantime: the experiment row, steps and plots written at the start would be stale
+def find_resume_point(conn, bundle):
+    row = conn.execute('''
+        SELECT experiment_id, content_hash, rows_done, blocks_done, manifest_hash FROM ingest_progress
+        WHERE folder_path = ?
+    ''', (bundle["folder_path"],)).fetchone()
+    if row is None:
+        return None
+    experiment_id, content_hash, rows_done, blocks_done, manifest_hash = row
+    aligned = blocks_done == 0 or rows_done == blocks_done * BLOCK_ROWS  # blocks cut by an older chunking
+    if content_hash == stream_file_hash(bundle) and manifest_hash == manifest_signature(bundle) and aligned:
+        return experiment_id, rows_done, blocks_done
+    print(f"{bundle['folder_path']} changed since its import was interrupted, starting again")
+    delete_experiment(conn, experiment_id)
+    return None
+
+
+# Rows per streamed chunk: whole blocks with the columnar storage, so that the blocks of a data file are cut
+# at the same rows whatever --chunk-rows (and the same as when the file is read at once, see encode_blocks)
+def stream_chunk_rows(chunk_rows, storage=STORAGE):
+    if storage != "columnar":
+        return chunk_rows
+    return max(1, -(-chunk_rows // BLOCK_ROWS)) * BLOCK_ROWS
+
+
+# Insert a large data file chunk by chunk, committing after each chunk together with the progress row
+# Only one chunk is in memory at a time; returns the number of rows inserted by this run
+# (after a resume the rows committed before the interruption are not counted again)
+@timed()
+def stream_measurement_file(conn, experiment_id, bundle, storage=STORAGE, rows_done=0, blocks_done=0,
+                            chunk_rows=CHUNK_ROWS):
+    folder_path = bundle["folder_path"]
+    content_hash = stream_file_hash(bundle)
+    manifest_hash = manifest_signature(bundle)
+    if storage == "columnar" and rows_done == 0:
+        drop_partial_blocks(conn, content_hash)
+    rows_start = rows_done
+    start = time.perf_counter()
+    for chunk in read_measurement_file(bundle["stream_file"], chunksize=stream_chunk_rows(chunk_rows, storage),
+                                       start_row=rows_done):
+        if storage == "columnar":
+            blocks_done += write_columns(conn, content_hash, chunk, row_start=rows_done, block_start=blocks_done)
+        else:
+            insert_rows(conn, experiment_id, chunk, row_start=rows_done)
+        rows_done += len(chunk)
+        conn.execute('''
+            INSERT OR REPLACE INTO ingest_progress
+                (folder_path, experiment_id, content_hash, rows_done, blocks_done, manifest_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (folder_path, experiment_id, content_hash, rows_done, blocks_done, manifest_hash))
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f"  {folder_path}: {rows_done:,} rows committed in total, {rows_done - rows_start:,} by this run "
+              f"({(rows_done - rows_start) / elapsed:,.0f} rows/s)")
+
+    # The experiment only sees the blocks of its data file once they are all stored
+    if storage == "columnar":
+        link_data_file(conn, experiment_id, content_hash)
+    # Statistics from the stored data, one block at a time (also right after a resume)
+    write_column_stats(conn, experiment_id, stored_column_stats(conn, experiment_id))
+    conn.execute("DELETE FROM ingest_progress WHERE folder_path = ?", (folder_path,))
+    return rows_done - rows_start
+
+
+# Write a prepared experiment folder, returns the number of data rows inserted (None if skipped)
+# Nothing is committed here (the caller decides the transaction boundaries), except for streamed data files
+@timed()
+def write_experiment(conn, bundle, storage=STORAGE, chunk_rows=CHUNK_ROWS):
+    resume = find_resume_point(conn, bundle) if "stream_file" in bundle else None
+    if resume is not None:
+        experiment_id, rows_done, blocks_done = resume
+        print(f"Resuming {bundle['folder_path']} from row {rows_done:,}")
+    else:
+        experiment_id = insert_experiment(conn, bundle)
+        if experiment_id is None:
+            return None
+        rows_done = blocks_done = 0
+
+    # Same data file as an experiment written earlier in this transaction (--single-transaction, or read ahead
+    # by the --jobs processes before it was written): their read-only lookup could not see it, link it as well
+    if (storage == "columnar" and not bundle.get("stored") and "data_hash" in bundle
+            and find_data_file(conn, bundle["data_hash"]) is not None):
+        bundle["stored"] = True
+        bundle["stored_stats"] = bundle.pop("stats", None)
+        bundle.pop("derived", None)
+
+    # Insert CSV data if available (a data file already stored is only linked)
+    n_rows = bundle["n_rows"]
+    if bundle.get("stored"):
+        n_rows = link_stored_data_file(conn, experiment_id, bundle["data_hash"], bundle["stored_stats"])
+    elif "blocks" in bundle:
+        drop_partial_blocks(conn, bundle["data_hash"])
+        insert_blocks(conn, bundle["data_hash"], bundle["blocks"])
+        link_data_file(conn, experiment_id, bundle["data_hash"])
+    elif "data" in bundle:
+        insert_rows(conn, experiment_id, bundle["data"])
+    elif "stream_file" in bundle:
+        n_rows = stream_measurement_file(conn, experiment_id, bundle, storage, rows_done, blocks_done, chunk_rows)
+    elif "archive_member" in bundle:
+        n_rows = write_archive_data(conn, experiment_id, bundle, storage, chunk_rows)
+    if "stats" in bundle:
+        write_column_stats(conn, experiment_id, bundle["stats"])
+    if bundle.get("derived"):
+        write_derived(conn, bundle["derived"])
+
+    write_manifest(conn, bundle["folder_path"], experiment_id, bundle["manifest"])
+    return n_rows
+
+
+# Import one experiment folder, returns the number of data rows inserted (None if skipped)
+def import_experiment_from_folder(conn, folder_path, storage=STORAGE):
+    bundle = read_experiment_folder(folder_path, storage)
+    if bundle is None:
+        return None
+    return write_experiment(conn, bundle, storage)
+
+
+# Yield (folder_path, bundle) in the order of folders
+# With jobs > 1 the folders are read by a pool of processes while the caller writes,
+# at most 2 * jobs prepared bundles wait for the writer (a data file repeated within them is parsed again,
+# write_experiment only links it)
+# written_hashes: data files written by the caller in this run, filled as it goes (read with jobs=1 only)
+def read_experiment_folders(folders, storage=STORAGE, jobs=1, stream_above=STREAM_THRESHOLD_BYTES, database_path=None,
+                            written_hashes=()):
+    if jobs <= 1:
+        for folder_path in folders:
+            yield folder_path, read_experiment_folder(folder_path, storage, stream_above, database_path, written_hashes)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for folder_path in folders:
+            pending.append((folder_path, pool.submit(read_experiment_folder, folder_path, storage, stream_above, database_path)))
+            if len(pending) >= 2 * jobs:
+                folder_path, future = pending.popleft()
+                yield folder_path, future.result()
+        while pending:
+            folder_path, future = pending.popleft()
+            yield folder_path, future.result()
+
+
+# ======================
+# Experiment ZIPs (as generated by the Create page), imported without extracting them
+# ======================
+
+# Members of an experiment ZIP: the tracked files next to its metadata.json (at the root or in a single folder)
+def archive_members(zf):
+    metadata = min((name for name in zf.namelist() if posixpath.basename(name) == 'metadata.json'),
+                   key=lambda name: name.count('/'), default=None)
+    if metadata is None:
+        return []
+    prefix = posixpath.dirname(metadata)
+    return sorted((
+        info for info in zf.infolist()
+        if not info.is_dir() and posixpath.dirname(info.filename) == prefix
+        and (info.filename.endswith(('metadata.json', '.txt')) or info.filename.lower().endswith(IMAGE_EXTENSIONS))
+    ), key=lambda info: info.filename)
+
+
+# (file_name, mtime, size, content_hash) of the members of an archive (mtime of the archive itself)
+# and {file_name: bytes} of the members up to keep_bytes, decompressed once for both the hash and the parser
+def archive_manifest_entries(archive_path, zf, members, keep_bytes=0):
+    mtime = os.stat(archive_path).st_mtime
+    entries = []
+    payloads = {}
+    for info in members:
+        if info.file_size <= keep_bytes:
+            payloads[info.filename] = zf.read(info)
+            content_hash = hashlib.sha256(payloads[info.filename]).hexdigest()
+        else:
+            with zf.open(info) as f:
+                content_hash = hash_stream(f)
+        entries.append((info.filename, mtime, info.file_size, content_hash))
+    return entries, payloads
+
+
+# Compare an archive with its manifest entry: returns "new", "changed" or "unchanged" (mtime and member sizes)
+def archive_status(conn, archive_path):
+    rows = conn.execute(QUERY_FOLDER_MANIFEST, (os.path.normpath(archive_path),)).fetchall()
+    if not rows:
+        return "new"
+    mtime = os.stat(archive_path).st_mtime
+    with zipfile.ZipFile(archive_path) as zf:
+        members = {info.filename: (mtime, info.file_size) for info in archive_members(zf)}
+    return "unchanged" if {name: (m, size) for name, m, size, _ in rows} == members else "changed"
+
+
+# Read and prepare an experiment ZIP like read_experiment_folder, streaming the members from the archive
+# (nothing is extracted to disk); a data file above stream_above bytes is parsed chunk by chunk by the writer
+@timed()
+def read_experiment_archive(conn, archive_path, storage=STORAGE, stream_above=STREAM_THRESHOLD_BYTES):
+    start = time.perf_counter()
+    with zipfile.ZipFile(archive_path) as zf:
+        members = archive_members(zf)
+        if not members:
+            print(f"No metadata.json in {archive_path}, skipping.")
+            return None
+        metadata_info = next(info for info in members if posixpath.basename(info.filename) == 'metadata.json')
+        with zf.open(metadata_info) as f:
+            metadata = json.load(f)
+        missing = [key for key in ('experiment_name', 'date') if key not in metadata]
+        if missing:
+            raise ValueError(f"{archive_member_path(archive_path, metadata_info.filename)} is missing {', '.join(missing)}")
+
+        manifest, payloads = archive_manifest_entries(archive_path, zf, members, keep_bytes=stream_above)
+        data_files = [(info, content_hash) for info, (_, _, _, content_hash) in zip(members, manifest)
+                      if info.filename.endswith('.txt')]
+        data_info, data_hash = data_files[0] if data_files else (None, None)
+        stored_stats = data_file_stats(conn, data_hash) if storage == "columnar" and data_hash else None
+        stream = data_info is not None and stored_stats is None and data_info.file_size > stream_above
+        df = None
+        if data_info is not None and stored_stats is None and not stream:
+            df = read_measurement_file(io.BytesIO(payloads[data_info.filename]))
+    parsed = time.perf_counter()
+
+    images = [(archive_member_path(archive_path, file_name), content_hash) for file_name, _, _, content_hash in manifest
+              if file_name.lower().endswith(IMAGE_EXTENSIONS)]
+    bundle = experiment_bundle(archive_path, metadata, manifest, images, data_hash, stored_stats, df, storage)
+    if stream:
+        bundle["archive_member"] = data_info.filename
+    bundle["timings"] = {"parse": parsed - start, "transform": time.perf_counter() - parsed}
+    return bundle
+
+
+# Insert a large data file of an archive chunk by chunk (one chunk in memory at a time)
+# Nothing is committed: an archive is imported at once or not at all
+def write_archive_data(conn, experiment_id, bundle, storage=STORAGE, chunk_rows=CHUNK_ROWS):
+    rows_done = blocks_done = 0
+    if storage == "columnar":
+        drop_partial_blocks(conn, bundle["data_hash"])
+    with zipfile.ZipFile(bundle["folder_path"]) as zf, zf.open(bundle["archive_member"]) as f:
+        for chunk in read_measurement_file(f, chunksize=stream_chunk_rows(chunk_rows, storage)):
+            if storage == "columnar":
+                blocks_done += write_columns(conn, bundle["data_hash"], chunk, row_start=rows_done, block_start=blocks_done)
+            else:
+                insert_rows(conn, experiment_id, chunk, row_start=rows_done)
+            rows_done += len(chunk)
+    if storage == "columnar":
+        link_data_file(conn, experiment_id, bundle["data_hash"])
+    write_column_stats(conn, experiment_id, stored_column_stats(conn, experiment_id))
+    return rows_done
+
+
+# Import one experiment ZIP in a single transaction, replacing a previous import of the same archive
+# Returns the number of data rows inserted (None if skipped: unchanged archive, no metadata.json,
+# or experiment already imported from elsewhere)
+def ingest_archive(conn, archive_path, storage=STORAGE, stream_above=STREAM_THRESHOLD_BYTES, chunk_rows=CHUNK_ROWS):
+    if archive_status(conn, archive_path) == "unchanged":
+        print(f"{archive_path} unchanged, skipping.")
+        return None
+    try:
+        bundle = read_experiment_archive(conn, archive_path, storage, stream_above)
+        remove_folder(conn, archive_path)
+        rows = None if bundle is None else write_experiment(conn, bundle, storage, chunk_rows)
+        prune_unreferenced(conn)
+        bump_generation(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return rows
+
+
+# Import the experiment ZIPs of paths (archives or directories of archives), one transaction per archive
+def ingest_archives(paths, database_path=DATABASE_PATH, storage=STORAGE, stream_above=STREAM_THRESHOLD_BYTES,
+                    chunk_rows=CHUNK_ROWS):
+    conn = connect(database_path)
+    create_database(conn)
+    summary = {"experiments": 0, "skipped": 0, "rows": 0}
+    start = time.perf_counter()
+    try:
+        for archive_path in (archive for path in paths for archive in list_archives(path)):
+            archive_start = time.perf_counter()
+            rows = ingest_archive(conn, archive_path, storage, stream_above, chunk_rows)
+            event("archive", path=archive_path, rows=rows, seconds=time.perf_counter() - archive_start)
+            if rows is None:
+                summary["skipped"] += 1
+            else:
+                summary["experiments"] += 1
+                summary["rows"] += rows
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+# ======================
+# Manifest of the imported folders
+# ======================
+
+# Files of an experiment folder that end up in the database (sorted, so the first .txt is stable)
+def list_experiment_files(folder_path):
+    return sorted(
+        file for file in os.listdir(folder_path)
+        if file == 'metadata.json' or file.endswith('.txt') or file.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def hash_file(file_path, block_size=1 << 20):
+    with open(file_path, 'rb') as f:
+        return hash_stream(f, block_size)
+
+
+# sha256 of a binary file object, read block by block
+def hash_stream(f, block_size=1 << 20):
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(block_size), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+# mtime and size of the tracked files, {file_name: (mtime, size)}
+def stat_experiment_files(folder_path):
+    stats = {}
+    for file in list_experiment_files(folder_path):
+        st = os.stat(os.path.join(folder_path, file))
+        stats[file] = (st.st_mtime, st.st_size)
+    return stats
+
+
+# Compare a folder with its manifest entry: returns "new", "changed" or "unchanged"
+# mtime/size are checked first, the content hash only for the files whose stat differs
+# (a touched but identical file only refreshes its manifest row)
+def folder_status(conn, folder_path):
+    folder_path = os.path.normpath(folder_path)
+    rows = conn.execute(QUERY_FOLDER_MANIFEST, (folder_path,)).fetchall()
+    if not rows:
+        return "new"
+
+    stats = stat_experiment_files(folder_path)
+    manifest = {file_name: (mtime, size, content_hash) for file_name, mtime, size, content_hash in rows}
+    if set(manifest) != set(stats):
+        return "changed"
+
+    touched = []
+    for file_name, (mtime, size) in stats.items():
+        old_mtime, old_size, old_hash = manifest[file_name]
+        if (mtime, size) == (old_mtime, old_size):
+            continue
+        if size != old_size or hash_file(os.path.join(folder_path, file_name)) != old_hash:
+            return "changed"
+        touched.append((mtime, folder_path, file_name))
+
+    conn.executemany("UPDATE manifest SET mtime = ? WHERE folder_path = ? AND file_name = ?", touched)
+    return "unchanged"
+
+
+# (file_name, mtime, size, content_hash) of the tracked files of a folder
+def manifest_entries(folder_path):
+    return [
+        (file_name, mtime, size, hash_file(os.path.join(folder_path, file_name)))
+        for file_name, (mtime, size) in stat_experiment_files(folder_path).items()
+    ]
+
+
+# Record the tracked files of an imported folder
+def write_manifest(conn, folder_path, experiment_id, entries=None):
+    folder_path = os.path.normpath(folder_path)
+    if entries is None:
+        entries = manifest_entries(folder_path)
+    conn.execute("DELETE FROM manifest WHERE folder_path = ?", (folder_path,))
+    conn.executemany('''
+        INSERT INTO manifest (folder_path, file_name, experiment_id, mtime, size, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(folder_path, file_name, experiment_id, mtime, size, content_hash)
+          for file_name, mtime, size, content_hash in entries])
+
+
+# Drop a folder from the database: its experiment and its manifest rows
+def remove_folder(conn, folder_path):
+    folder_path = os.path.normpath(folder_path)
+    for (experiment_id,) in conn.execute(
+            "SELECT DISTINCT experiment_id FROM manifest WHERE folder_path = ?", (folder_path,)).fetchall():
+        delete_experiment(conn, experiment_id)
+    conn.execute("DELETE FROM manifest WHERE folder_path = ?", (folder_path,))
+
+
+# Drop what no experiment refers to any more after experiments were removed or replaced: blocks of the
+# data files, their derived quantities and the thumbnails of the images (run at the end of every import)
+def prune_unreferenced(conn):
+    prune_file_blocks(conn)
+    prune_derived(conn)
+    evict_thumbnails(conn)
+
+
+# Bring the database in sync with the experiment folders of base_folder through a single connection:
+# only new or changed folders are (re-)imported, the experiments of removed folders are deleted
+# Commits after each experiment, or once at the end with single_transaction=True
+# jobs > 1 reads and prepares the folders in parallel processes, the writes stay in this process
+# Data files above stream_above bytes are streamed in chunks of chunk_rows rows (each chunk is committed)
+# thumbnails=True makes the missing thumbnails once the data is committed (a stage of its own, not part of
+# the rows/s), otherwise the gallery makes them on first view
+def collect_database(base_folder="data", database_path=DATABASE_PATH, single_transaction=False, rebuild=False,
+                     storage=STORAGE, jobs=1, stream_above=STREAM_THRESHOLD_BYTES, chunk_rows=CHUNK_ROWS,
+                     thumbnails=False):
+    if rebuild and os.path.exists(database_path):
+        remove_database(database_path)
+        print(f"Deleted existing database: {database_path}")
+
+    conn = connect(database_path)
+    create_database(conn)
+
+    summary = {"experiments": 0, "unchanged": 0, "removed": 0, "deduplicated": 0, "rows": 0}
+    timings = {"parse": 0.0, "transform": 0.0, "write": 0.0}
+    start = time.perf_counter()
+    import_seconds = 0.0
+    try:
+        # Scan: compare every folder with the manifest
+        folders = set()
+        to_import = []
+        for entry in sorted(os.listdir(base_folder)):
+            subfolder_path = os.path.join(base_folder, entry)
+            if not os.path.isdir(subfolder_path) or entry == os.path.basename(DROP_FOLDER):  # items waiting for the worker
+                continue
+            folders.add(os.path.normpath(subfolder_path))
+            if folder_status(conn, subfolder_path) == "unchanged":
+                summary["unchanged"] += 1
+            else:
+                to_import.append(subfolder_path)
+        conn.commit()
+
+        # Import: a changed folder replaces the rows of its previous import in the same transaction
+        # (the blocks of its data file stay until the end of the run, an unchanged data file is only linked again)
+        written_hashes = set()  # not visible to the read-only lookup of the readers before the commit
+        for folder_path, bundle in read_experiment_folders(to_import, storage, jobs, stream_above, database_path,
+                                                           written_hashes):
+            write_start = time.perf_counter()
+            remove_folder(conn, folder_path)
+            rows = None if bundle is None else write_experiment(conn, bundle, storage, chunk_rows)
+            if rows is not None:
+                written_hashes.add(bundle.get("data_hash"))
+                summary["experiments"] += 1
+                if bundle.get("stored"):
+                    summary["deduplicated"] += 1
+                else:
+                    summary["rows"] += rows
+                timings["parse"] += bundle["timings"]["parse"]
+                timings["transform"] += bundle["timings"]["transform"]
+            bump_generation(conn)
+            if not single_transaction:
+                conn.commit()
+            timings["write"] += time.perf_counter() - write_start
+            if rows is not None:
+                event("experiment", folder=folder_path, rows=rows, stored=bool(bundle.get("stored")),
+                      parse=bundle["timings"]["parse"], transform=bundle["timings"]["transform"],
+                      write=time.perf_counter() - write_start)
+
+        # Folders that disappeared from base_folder
+        base_prefix = os.path.join(os.path.normpath(base_folder), "")
+        for (folder_path,) in conn.execute("SELECT DISTINCT folder_path FROM manifest").fetchall():
+            if (folder_path.startswith(base_prefix) and folder_path not in folders
+                    and not folder_path.lower().endswith(ARCHIVE_EXTENSION)):  # archives are imported with --archive
+                remove_folder(conn, folder_path)
+                summary["removed"] += 1
+        # and the ones whose streamed import was interrupted (no manifest rows before the stream ends)
+        for folder_path, experiment_id in conn.execute(
+                "SELECT folder_path, experiment_id FROM ingest_progress").fetchall():
+            if folder_path.startswith(base_prefix) and folder_path not in folders:
+                delete_experiment(conn, experiment_id)
+                summary["removed"] += 1
+        if summary["removed"]:
+            bump_generation(conn)
+        # Blocks, derived quantities and thumbnails no experiment refers to any more
+        with span("prune"):
+            prune_unreferenced(conn)
+        conn.commit()
+        import_seconds = time.perf_counter() - start
+        if thumbnails:
+            thumbnails_start = time.perf_counter()
+            with span("thumbnails"):
+                summary["thumbnails"] = build_missing_thumbnails(conn)
+            timings["thumbnails"] = time.perf_counter() - thumbnails_start
+        # Refresh the planner statistics of the tables that changed a lot
+        conn.execute("PRAGMA optimize")
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    summary["seconds"] = import_seconds  # without the thumbnails (timings["thumbnails"])
+    summary["rows_per_second"] = summary["rows"] / import_seconds if import_seconds > 0 else float("inf")
+    summary["timings"] = timings
+    return summary
 
 
 # ======================
 # Example Usage
 # ======================
 
-# Step 1: Delete existing database (if any), then create a fresh one
-if os.path.exists(DATABASE_PATH):
-    os.remove(DATABASE_PATH)
-    print(f"Deleted existing database: {DATABASE_PATH}")
-
-create_database()
-
-# Step 2: Insert experiments from folders
-base_folder = "data"
-for entry in os.listdir(base_folder):
-        subfolder_path = os.path.join(base_folder, entry)
-        if os.path.isdir(subfolder_path):
-            import_experiment_from_folder(subfolder_path)
-# import_experiment_from_folder("data/FG004_throughTc")
-# import_experiment_from_folder("data/FNAL_103")
-
-# Step 3: Insert plot-only experiment
-insert_experiment_metadata('FG005_no_data', 'Lab B', 'Lore lipsium (plot)', '2025-04-28')
-conn = sqlite3.connect(DATABASE_PATH)
-cursor = conn.cursor()
-cursor.execute('SELECT experiment_id FROM experiments WHERE experiment_name = ? AND date = ?', ('FG005_no_data', '2025-04-28'))
-experiment_id = cursor.fetchone()[0]
-conn.close()
-
-insert_plot(experiment_id, 'data/plot_dlambda_fit.png', caption='Overview of result')
-insert_plot(experiment_id, 'data/plot_freq_q0_dual.png', caption='Zoomed region near Tc')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the experiment folders of ./data in the SRF database")
+    parser.add_argument("--data", default="data", help="folder containing one sub-folder per experiment")
+    parser.add_argument("--database", default=DATABASE_PATH, help="path of the SQLite database")
+    parser.add_argument("--single-transaction", action="store_true",
+                        help="commit once for the whole run instead of once per experiment")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="delete the database and import every folder again")
+    parser.add_argument("--storage", choices=STORAGE_MODES, default=STORAGE,
+                        help="layout of the measurement data (unchanged folders keep their layout, use --rebuild to convert)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="processes reading and parsing the folders in parallel (0 = one per core)")
+    parser.add_argument("--stream-above", type=float, default=STREAM_THRESHOLD_BYTES / 2**20,
+                        help="size in MB above which a data file is streamed in chunks, committing each one")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"rows per streamed chunk (whole blocks of {BLOCK_ROWS} rows with the columnar storage)")
+    parser.add_argument("--thumbnails", action="store_true",
+                        help="make the missing image thumbnails after the import (otherwise on first view)")
+    parser.add_argument("--archive", nargs="+", metavar="ZIP",
+                        help="only import these experiment ZIPs (or directories of ZIPs), without extracting them")
+    parser.add_argument("--profile-log", metavar="FILE",
+                        help="append the timings of the stages and one record per experiment to FILE (JSON lines)")
+    args = parser.parse_args()
+
+    # --profile-log: spans of the collector stages, SQL statements and one record per experiment, as JSON lines
+    with recording() if args.profile_log else nullcontext() as recorder:
+        # Experiment ZIPs only: one transaction per archive, the data folders are not scanned
+        if args.archive:
+            summary = ingest_archives(args.archive, args.database, storage=args.storage,
+                                      stream_above=args.stream_above * 2**20, chunk_rows=args.chunk_rows)
+            print(f"Imported {summary['experiments']} experiments from archives, {summary['rows']} rows "
+                  f"in {summary['seconds']:.3f} s; {summary['skipped']} skipped")
+
+        # Step 1: Import new/changed folders, drop the removed ones (--rebuild starts from an empty database)
+        else:
+            summary = collect_database(args.data, args.database, single_transaction=args.single_transaction,
+                                       rebuild=args.rebuild, storage=args.storage, jobs=args.jobs or os.cpu_count(),
+                                       stream_above=args.stream_above * 2**20, chunk_rows=args.chunk_rows,
+                                       thumbnails=args.thumbnails)
+            print(f"Imported {summary['experiments']} experiments, {summary['rows']} rows "
+                  f"in {summary['seconds']:.3f} s ({summary['rows_per_second']:,.0f} rows/s); "
+                  f"{summary['unchanged']} unchanged, {summary['removed']} removed, "
+                  f"{summary['deduplicated']} with a data file already stored")
+            timings = summary["timings"]
+            print(f"Stages: parse {timings['parse']:.3f} s, transform {timings['transform']:.3f} s "
+                  f"(summed over the workers), write {timings['write']:.3f} s")
+            if args.thumbnails:
+                print(f"Thumbnails of {summary['thumbnails']} images in {timings['thumbnails']:.3f} s")
+
+    if recorder is not None:
+        recorder.write_log(args.profile_log, command="archive" if args.archive else "collect", jobs=args.jobs, **summary)
+        print(f"Profile written to {args.profile_log}")
+    if args.archive:
+        raise SystemExit
+
+    # Step 2: Insert plot-only experiment
+    conn = connect(args.database)
+    if find_experiment(conn, 'FG005_no_data', '2025-04-28') is None:
+        experiment_id = insert_experiment_metadata(conn, 'FG005_no_data', 'Lab B', 'Lore lipsium (plot)', '2025-04-28')
+        insert_plot(conn, experiment_id, 'data/plot_dlambda_fit.png', caption='Overview of result')
+        insert_plot(conn, experiment_id, 'data/plot_freq_q0_dual.png', caption='Zoomed region near Tc')
+        bump_generation(conn)
+        conn.commit()
+    conn.close()
@@ -0,0 +1,152 @@
+# ingest_worker.py
+# Background import of the experiments dropped in data/incoming (experiment folders or ZIPs), see utils/jobs.py
+# Each item is queued in the ingest_jobs table, moved to its place (data/<folder>, uploads/<zip>) and imported
+# with the functions of collect_database.py, one experiment per transaction: the browser keeps reading meanwhile
+#
+#   python ingest_worker.py             # watch the drop folder until interrupted
+#   python ingest_worker.py --once      # import what is waiting, then exit
+#
+# The Create page and the status panel of the browser start it in the background when no worker is running
+
+import os
+import sys
+import time
+import signal
+import sqlite3
+import argparse
+import zipfile
+import threading
+import traceback
+
+from collect_database import (STORAGE, STREAM_THRESHOLD_BYTES, CHUNK_ROWS, create_database, read_experiment_folder,
+                              write_experiment, remove_folder, ingest_archive, prune_unreferenced, bump_generation)
+from utils.db import DATABASE_PATH, connect
+from utils.archive import UPLOAD_FOLDER
+from utils.jobs import (DROP_FOLDER, POLL_SECONDS, SETTLE_SECONDS, HEARTBEAT_SECONDS, scan_drop_folder,
+                        job_target, claim_job, set_job_target, finish_job, requeue_interrupted_jobs,
+                        claim_worker, worker_heartbeat, worker_stopped)
+
+
+# Move an item of the drop folder to target_path and import it, returns the rows inserted (None if skipped)
+# A job interrupted after the move finds its item at target_path and imports it from there
+def run_job(conn, source_path, kind, target_path, storage=STORAGE, stream_above=STREAM_THRESHOLD_BYTES,
+            chunk_rows=CHUNK_ROWS, database_path=DATABASE_PATH):
+    if os.path.exists(source_path):
+        if kind == "archive" and not zipfile.is_zipfile(source_path):  # left in the drop folder until replaced
+            raise zipfile.BadZipFile(f"{source_path} is not a ZIP file")
+        if kind == "folder" and os.path.exists(target_path):
+            raise FileExistsError(f"{target_path} already exists: update it in place and run collect_database.py, "
+                                  f"or drop the experiment under another name")
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        os.replace(source_path, target_path)  # an archive replaces a previous upload, as on the Create page
+    elif not os.path.exists(target_path):
+        raise FileNotFoundError(f"{source_path} is gone")
+
+    if kind == "archive":
+        return ingest_archive(conn, target_path, storage, stream_above, chunk_rows)
+
+    # Same steps as collect_database() for one changed folder (a stale experiment of the same path is replaced)
+    try:
+        bundle = read_experiment_folder(target_path, storage, stream_above, database_path)
+        remove_folder(conn, target_path)
+        rows = None if bundle is None else write_experiment(conn, bundle, storage, chunk_rows)
+        prune_unreferenced(conn)
+        bump_generation(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return rows
+
+
+# Heartbeat from a thread of its own: a long import does not make the worker look gone
+def heartbeat_loop(database_path, pid, stop):
+    conn = connect(database_path)
+    try:
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                worker_heartbeat(conn, pid)
+            except sqlite3.OperationalError:  # database locked by a long write, next beat
+                pass
+    finally:
+        conn.close()
+
+
+# Queue the stable items of the drop folder and run the jobs one at a time until stop is set
+# (or until the queue is empty with once=True); returns {"done", "skipped", "failed", "rows"}
+def run_worker(database_path=DATABASE_PATH, drop_folder=DROP_FOLDER, upload_folder=UPLOAD_FOLDER, once=False,
+               poll_seconds=POLL_SECONDS, settle_seconds=SETTLE_SECONDS, storage=STORAGE,
+               stream_above=STREAM_THRESHOLD_BYTES, chunk_rows=CHUNK_ROWS, stop=None):
+    stop = stop or threading.Event()
+    pid = os.getpid()
+    conn = connect(database_path)
+    create_database(conn)
+    # Lease taken atomically (already ours when started from the UI, see start_worker_process)
+    holder = claim_worker(conn, pid)
+    if holder != pid:
+        conn.close()
+        raise RuntimeError(f"An ingest worker (pid {holder}) is already running on {database_path}")
+    os.makedirs(drop_folder, exist_ok=True)
+    requeue_interrupted_jobs(conn)
+    heartbeat = threading.Thread(target=heartbeat_loop, args=(database_path, pid, stop), daemon=True)
+    heartbeat.start()
+
+    summary = {"done": 0, "skipped": 0, "failed": 0, "rows": 0}
+    try:
+        while not stop.is_set():
+            scan_drop_folder(conn, drop_folder, settle_seconds)
+            job = claim_job(conn)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_seconds)
+                continue
+
+            job_id, source_path, kind = job
+            target_path = job_target(source_path, kind, drop_folder, upload_folder)
+            set_job_target(conn, job_id, target_path)
+            start = time.perf_counter()
+            try:
+                rows = run_job(conn, source_path, kind, target_path, storage, stream_above, chunk_rows, database_path)
+            except Exception as e:
+                traceback.print_exc()
+                finish_job(conn, job_id, "failed", error=f"{type(e).__name__}: {e}")
+                summary["failed"] += 1
+                continue
+            status = "skipped" if rows is None else "done"
+            finish_job(conn, job_id, status, rows=rows)
+            summary[status] += 1
+            summary["rows"] += rows or 0
+            print(f"{target_path}: {status}, {rows or 0:,} rows in {time.perf_counter() - start:.3f} s", flush=True)
+    finally:
+        stop.set()
+        heartbeat.join()
+        worker_stopped(conn, pid)
+        conn.close()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the experiments dropped in the drop folder in the background")
+    parser.add_argument("--database", default=DATABASE_PATH, help="path of the SQLite database")
+    parser.add_argument("--drop", default=DROP_FOLDER,
+                        help="watched folder: experiment folders go next to it, ZIPs to --uploads")
+    parser.add_argument("--uploads", default=UPLOAD_FOLDER, help="where the imported ZIPs are kept")
+    parser.add_argument("--once", action="store_true", help="import what is waiting, then exit")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between two scans of the drop folder")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="seconds an item must stay unchanged before it is queued")
+    args = parser.parse_args()
+
+    # kill / service stop: leave through the finally of run_worker (the heartbeat row is removed)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Watching {args.drop} (pid {os.getpid()})", flush=True)
+    try:
+        summary = run_worker(args.database, args.drop, args.uploads, once=args.once, poll_seconds=args.poll,
+                             settle_seconds=args.settle)
+    except KeyboardInterrupt:
+        raise SystemExit
+    except RuntimeError as e:  # another worker is running
+        raise SystemExit(str(e))
+    print(f"Imported {summary['done']} experiments, {summary['rows']} rows; "
+          f"{summary['skipped']} skipped, {summary['failed']} failed")
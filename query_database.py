@@ -0,0 +1,72 @@
+# query_database.py
+# command line access to the SRF database without the streamlit interface (e.g. on the compute nodes):
+# select experiments by metadata, processing tags, channel statistics and processing history,
+# list them or export their data in bulk to Parquet / Feather (Arrow IPC) / CSV
+#
+# python query_database.py --where lab_name=FNAL --stat QualityFactor max_value ">" 1e10 --export fleet.parquet
+
+import argparse
+
+import pandas as pd
+
+from utils.db import DATABASE_PATH, read_connection
+from utils.query import select_experiments, read_experiments, export_experiments, EXPORT_FORMATS
+from utils.stats import STAT_FIELDS, SEARCH_OPERATORS
+from utils.tags import RECIPE_MODES
+
+
+# --stat arguments (channel, field, operator, value) to the conditions of utils/stats.py
+def stats_conditions(stats):
+    conditions = []
+    for column_name, field, operator, value in stats or []:
+        if field not in STAT_FIELDS:
+            raise SystemExit(f"Unknown statistic '{field}', expected one of {', '.join(STAT_FIELDS)}")
+        if operator not in SEARCH_OPERATORS:
+            raise SystemExit(f"Unknown operator '{operator}', expected one of {' '.join(SEARCH_OPERATORS)}")
+        conditions.append((column_name, field, operator, float(value)))
+    return conditions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select experiments of the SRF database and export their data")
+    parser.add_argument("--database", default=DATABASE_PATH, help="path of the SQLite database")
+    parser.add_argument("--where", action="append", default=[], metavar="COLUMN=VALUE",
+                        help="filter on the experiments table, column=value or column=low..high (repeatable)")
+    parser.add_argument("--tags", nargs="+", metavar="TAG", help="processing tags of the recipe")
+    parser.add_argument("--tag-mode", choices=RECIPE_MODES, default="any",
+                        help="any of the tags, all of them, or all of them in this order")
+    parser.add_argument("--stat", nargs=4, action="append", metavar=("CHANNEL", "FIELD", "OP", "VALUE"),
+                        help="condition on the channel statistics, e.g. QualityFactor max_value '>' 1e10 (repeatable)")
+    parser.add_argument("--history", metavar="PATTERN",
+                        help="processing history pattern, e.g. 'EP -> baking(lowT, T=100..140) -> HPR'")
+    parser.add_argument("--ids", type=int, nargs="+", metavar="ID", help="only these experiment IDs")
+    parser.add_argument("--export", metavar="FILE",
+                        help=f"write the data of the selected experiments ({', '.join(EXPORT_FORMATS)})")
+    parser.add_argument("--format", choices=sorted(set(EXPORT_FORMATS.values())),
+                        help="export format (default: from the file extension)")
+    parser.add_argument("--columns", nargs="+", metavar="CHANNEL", help="only export these channels")
+    parser.add_argument("--threads", type=int, default=1, help="threads reading the experiments of the export")
+    args = parser.parse_args()
+
+    with read_connection(args.database) as conn:
+        try:
+            experiment_ids = select_experiments(conn, where=args.where, tags=args.tags, tag_mode=args.tag_mode,
+                                                stats=stats_conditions(args.stat), history=args.history)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if args.ids:
+            experiment_ids = [i for i in experiment_ids if i in set(args.ids)]
+        experiments = read_experiments(conn, experiment_ids)
+
+    # Without --export: list the selected experiments
+    if not args.export:
+        if not experiments.empty:
+            with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 40):
+                print(experiments[["experiment_id", "experiment_name", "lab_name", "date"]].to_string(index=False))
+        print(f"{len(experiment_ids)} experiments selected")
+        raise SystemExit
+
+    summary = export_experiments(args.database, experiment_ids, args.export, fmt=args.format,
+                                 columns=args.columns, threads=args.threads)
+    print(f"Exported {summary['experiments']} experiments ({summary['rows']:,} rows, {summary['channels']} channels) "
+          f"to {args.export} [{summary['format']}, {summary['bytes'] / 2**20:.1f} MB] in {summary['seconds']:.2f} s")
@@ -0,0 +1,59 @@
+# test_downsample.py
+# trace reduction of utils/downsample.py: LTTB and min/max keep the end points and the extremes of a trace
+# run from the repository root: python -m pytest tests
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.downsample import lttb_indices, minmax_indices, downsample_positions, downsample
+
+
+@pytest.fixture
+def trace():
+    rng = np.random.default_rng(0)
+    x = np.linspace(0.0, 100.0, 20000)
+    y = np.sin(x / 5) + rng.normal(0, 0.05, len(x))
+    y[7321], y[15000] = 10.0, -10.0  # single point spikes
+    return pd.DataFrame({"Time": x, "Q0": y})
+
+
+def test_lttb_keeps_end_points(trace):
+    x, y = trace["Time"].to_numpy(), trace["Q0"].to_numpy()
+    picked = lttb_indices(x, y, 500)
+    assert len(picked) == 500
+    assert picked[0] == 0 and picked[-1] == len(x) - 1
+    assert np.all(np.diff(picked) > 0)
+    assert {7321, 15000} <= set(picked.tolist())  # a spike makes the largest triangle of its bucket
+
+
+def test_minmax_keeps_extremes(trace):
+    x, y = trace["Time"].to_numpy(), trace["Q0"].to_numpy()
+    picked = minmax_indices(x, y, 100)
+    assert len(picked) <= 200
+    assert {int(np.argmin(y)), int(np.argmax(y))} <= set(picked.tolist())
+    # Every bucket keeps its own lowest and highest value
+    buckets = np.minimum((x / 100 * 100).astype(int), 99)
+    for bucket in (0, 37, 99):
+        values = y[buckets == bucket]
+        kept = y[picked][buckets[picked] == bucket]
+        assert kept.min() == values.min() and kept.max() == values.max()
+
+
+# Unsorted x and NaN rows: positions of finite rows only, in row order
+def test_positions(trace):
+    shuffled = trace.sample(frac=1, random_state=1).reset_index(drop=True)
+    shuffled.loc[5, "Q0"] = np.nan
+    for method in ("lttb", "minmax"):
+        positions = downsample_positions(shuffled, "Time", "Q0", method, 400)
+        assert np.all(np.diff(positions) > 0)
+        assert 5 not in positions
+        assert shuffled["Q0"].iloc[positions].max() == 10.0
+    assert len(downsample_positions(shuffled, "Time", "Q0", "full")) == len(shuffled) - 1
+    with pytest.raises(ValueError):
+        downsample_positions(shuffled, "Time", "Q0", "median", 400)
+
+
+def test_short_trace_unchanged(trace):
+    short = trace.head(50)
+    assert downsample(short, "Time", "Q0", "lttb", 400).equals(short.reset_index(drop=True))
@@ -0,0 +1,65 @@
+# test_history.py
+# pattern search and similarity ranking of utils/history.py on hand-written processing histories
+# run from the repository root: python -m pytest tests
+
+import numpy as np
+import pytest
+
+from utils.history import (SAME_PROCESS_COST, build_history_index, parse_pattern, match_pattern, history_distances,
+                           rank_by_similarity)
+
+# experiment_id -> steps (process_type, temperature_c, duration_h, tags)
+HISTORIES = {
+    1: [("EP", None, None, "EP"), ("baking", 120, 48, "lowT"), ("HPR", None, None, None)],
+    2: [("EP", None, None, "EP"), ("BCP", None, None, None), ("baking", 120, 24, "lowT, N-doping"),
+        ("HPR", None, None, None)],
+    3: [("EP", None, None, "EP"), ("baking", 800, 3, "highT"), ("HPR", None, None, None)],
+    4: [("HPR", None, None, None), ("EP", None, None, "EP"), ("baking", 120, 12, "lowT")],
+    5: [("EP", None, None, "EP"), ("baking", 120, 48, "lowT")],
+}
+
+
+@pytest.fixture
+def index():
+    rows = [(experiment_id, step_index, *step) for experiment_id, steps in HISTORIES.items()
+            for step_index, step in enumerate(steps)]
+    return build_history_index(rows)
+
+
+def test_parse_pattern():
+    first, second = parse_pattern("EP -> baking(lowT, T=100..140, h>=24)")
+    assert first == {"name": "ep", "tags": [], "ranges": {}}
+    assert second["tags"] == ["lowt"]
+    assert second["ranges"] == {"temperature": (100.0, 140.0), "duration": (24.0, np.inf)}
+    with pytest.raises(ValueError):
+        parse_pattern("EP -> baking(x=1)")
+
+
+# Elements in order with gaps allowed, constraints on the parameters, process types and tags ignoring case
+def test_match_pattern(index):
+    experiment_ids, step_index = match_pattern(index, "EP -> baking(lowT, T=100..140, h>=24) -> HPR")
+    assert experiment_ids.tolist() == [1, 2]
+    assert step_index.tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert match_pattern(index, "ep -> LOWT")[0].tolist() == [1, 2, 4, 5]
+    assert match_pattern(index, "HPR -> EP")[0].tolist() == [4]
+    assert match_pattern(index, "* -> baking(highT)")[0].tolist() == [3]
+    assert match_pattern(index, "baking(h<24)")[0].tolist() == [3, 4]
+
+
+# Edit distance: a step removed costs 1, the same process with other tags SAME_PROCESS_COST, another process 1
+def test_history_distances(index):
+    experiment_ids, distances = history_distances(index, 1)
+    distances = dict(zip(experiment_ids.tolist(), distances.tolist()))
+    assert distances[1] == 0
+    assert distances[5] == 1  # HPR missing
+    assert distances[3] == SAME_PROCESS_COST  # baking with other tags
+    assert distances[2] == 1 + SAME_PROCESS_COST  # BCP added, baking with one more tag
+    assert distances[4] == 2  # HPR moved: one deletion, one insertion
+
+
+def test_rank_by_similarity(index):
+    experiment_ids, distances = rank_by_similarity(index, 1, limit=3)
+    assert experiment_ids.tolist() == [1, 3, 5]
+    assert distances.tolist() == [0, SAME_PROCESS_COST, 1]
+    with pytest.raises(ValueError):
+        rank_by_similarity(index, 99)
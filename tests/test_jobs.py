@@ -0,0 +1,68 @@
+# test_jobs.py
+# lease of the ingest worker (utils/jobs.py): one holder at a time, taken over from a stopped worker
+# run from the repository root: python -m pytest tests
+
+import os
+import time
+import threading
+
+import pytest
+
+from collect_database import create_database
+from utils.db import connect
+from utils.jobs import WORKER_TIMEOUT_SECONDS, claim_worker, running_worker, worker_stopped
+
+# Two processes alive during the test
+PID, OTHER_PID = os.getpid(), os.getppid()
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "srf.db")
+    conn = connect(path)
+    create_database(conn)
+    conn.close()
+    return path
+
+
+def test_single_holder(database):
+    conn = connect(database)
+    assert claim_worker(conn, PID) == PID
+    assert claim_worker(conn, OTHER_PID) == PID
+    assert claim_worker(conn, PID) == PID  # claimed again by its holder
+    worker_stopped(conn, PID)
+    assert claim_worker(conn, OTHER_PID) == OTHER_PID
+    conn.close()
+
+
+# A worker whose heartbeat is too old is replaced
+def test_stale_lease(database):
+    conn = connect(database)
+    claim_worker(conn, OTHER_PID)
+    conn.execute("UPDATE ingest_worker SET heartbeat_at = ?", (time.time() - 2 * WORKER_TIMEOUT_SECONDS,))
+    conn.commit()
+    assert running_worker(conn) is None
+    assert claim_worker(conn, PID) == PID
+    conn.close()
+
+
+# Claimers racing on their own connections: all of them see the same single holder
+def test_concurrent_claims(database):
+    start = threading.Barrier(8)
+    holders = []
+
+    def claim(pid):
+        conn = connect(database)
+        start.wait()
+        holders.append((pid, claim_worker(conn, pid)))
+        conn.close()
+
+    threads = [threading.Thread(target=claim, args=(pid,)) for pid in [PID, OTHER_PID] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({holder for _, holder in holders}) == 1
+    conn = connect(database)
+    assert running_worker(conn)[0] == holders[0][1]
+    conn.close()
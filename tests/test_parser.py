@@ -0,0 +1,33 @@
+# test_parser.py
+# the streamed reads of utils/parser.py (chunks, resume) return the same data as the whole-file read
+# run from the repository root: python -m pytest tests
+
+import pandas as pd
+
+from utils.parser import read_measurement_file
+
+
+def write_file(tmp_path, text):
+    path = tmp_path / "data.txt"
+    path.write_text(text)
+    return str(path)
+
+
+def read_chunks(path, **kwargs):
+    return pd.concat(list(read_measurement_file(path, chunksize=2, **kwargs)), ignore_index=True)
+
+
+# A non numeric cell is NaN in the chunks as in the whole file
+def test_streamed_bad_cell(tmp_path):
+    path = write_file(tmp_path, "Time\tA\n1\t1\n2\tERR\n3\t3\n4\t4\n5\t5\n")
+    full = read_measurement_file(path)
+    assert full["A"].isna().tolist() == [False, True, False, False, False]
+    pd.testing.assert_frame_equal(read_chunks(path), full)
+    pd.testing.assert_frame_equal(read_chunks(path, start_row=1), full.iloc[1:].reset_index(drop=True))
+
+
+# Blank lines are not rows: a resume after one starts on the right row
+def test_resume_after_blank_line(tmp_path):
+    path = write_file(tmp_path, "Time\tA\n1\t1\n\n2\t2\n3\t3\n4\t4\n")
+    assert read_measurement_file(path, start_row=2)["Time"].tolist() == [3.0, 4.0]
+    assert read_chunks(path, start_row=2)["Time"].tolist() == [3.0, 4.0]
@@ -0,0 +1,51 @@
+# test_stats.py
+# column statistics of utils/stats.py: the block by block path (radix selection) gives the same exact
+# quantiles as numpy.quantile on the whole channel
+# run from the repository root: python -m pytest tests
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.stats import QUANTILES, STAT_FIELDS, order_statistics, blocks_stats, compute_column_stats
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(0, 1e-3, 5000), rng.lognormal(20, 2, 5000), -rng.exponential(5, 3000),
+                             np.zeros(100), [-0.0, np.inf, -np.inf]])
+    values[rng.choice(len(values), 200, replace=False)] = np.nan
+    return rng.permutation(values)
+
+
+def blocks(values, size=1000):
+    return lambda: (values[start:start + size] for start in range(0, len(values), size))
+
+
+def test_order_statistics(values):
+    finite = np.sort(values[~np.isnan(values)])
+    ranks = [0, 1, 4999, 6543, len(finite) - 2, len(finite) - 1]
+    assert order_statistics(blocks(values), ranks) == {rank: finite[rank] for rank in ranks}
+
+
+def test_blocks_stats_as_whole_channel():
+    rng = np.random.default_rng(1)
+    values = rng.normal(1e10, 3e9, 12345)
+    values[::97] = np.nan
+    _, _, n_values, nan_count, low, high, mean, std, *quantiles = blocks_stats(0, "Q0", blocks(values))
+    finite = values[~np.isnan(values)]
+    assert (n_values, nan_count) == (len(finite), 128)
+    assert (low, high) == (finite.min(), finite.max())
+    assert quantiles == np.quantile(finite, QUANTILES).tolist()  # exact, not approximated
+    assert mean == pytest.approx(finite.mean(), rel=1e-12)
+    assert std == pytest.approx(finite.std(ddof=1), rel=1e-9)
+
+    whole = compute_column_stats(pd.DataFrame({"Q0": values}))[0]
+    assert whole[:6] == (0, "Q0", n_values, nan_count, low, high)
+    assert list(whole[-len(QUANTILES):]) == quantiles
+
+
+def test_empty_channel():
+    row = blocks_stats(2, "T", blocks(np.full(10, np.nan)))
+    assert row == (2, "T", 0, 10) + (None,) * (len(STAT_FIELDS) - 2)
@@ -0,0 +1,134 @@
+# test_streaming.py
+# streamed imports of collect_database.py: a stream interrupted after some committed chunks, then resumed,
+# started again or cleaned up
+# run from the repository root: python -m pytest tests
+
+import os
+import json
+import shutil
+import sqlite3
+
+import pytest
+
+import collect_database
+import utils.storage
+from collect_database import collect_database as collect
+from utils.storage import read_columns
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_folder(base_folder, name, n_rows, description="cold test", steps=2):
+    folder = os.path.join(base_folder, name)
+    os.makedirs(folder, exist_ok=True)
+    metadata = {"experiment_name": name, "date": "2025-01-01", "lab_name": "LASA", "description": description,
+                "processing_steps": [{"process_type": "Bake", "description": f"step {i}"} for i in range(steps)]}
+    with open(os.path.join(folder, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+    with open(os.path.join(folder, "data.txt"), "w") as f:
+        f.write("Time\tQ0\n" + "".join(f"{i}\t{i * 0.5}\n" for i in range(n_rows)))
+    return folder
+
+
+# Stream every data file in chunks of chunk_rows rows, the read raising after the first `after` chunks
+def interrupt_after(monkeypatch, after):
+    read = collect_database.read_measurement_file
+
+    def read_measurement_file(path, **kwargs):
+        for i, chunk in enumerate(read(path, **kwargs)):
+            if i == after:
+                raise Interrupted
+            yield chunk
+
+    monkeypatch.setattr(collect_database, "read_measurement_file", read_measurement_file)
+
+
+def run(data, database, **kwargs):
+    return collect(data, database, **{"stream_above": 0, "chunk_rows": 100, **kwargs})
+
+
+def table(database, query):
+    with sqlite3.connect(database) as conn:
+        return conn.execute(query).fetchall()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "data"), str(tmp_path / "srf.db")
+
+
+# Blocks of 100 rows: a few hundred rows make several blocks and chunks
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(utils.storage, "BLOCK_ROWS", 100)
+    monkeypatch.setattr(collect_database, "BLOCK_ROWS", 100)
+
+
+def interrupted_import(monkeypatch, data, database, after=2):
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, after)
+        with pytest.raises(Interrupted):
+            run(data, database)
+
+
+# The resumed stream continues from the committed rows and ends with the whole file
+def test_resume(monkeypatch, paths):
+    data, database = paths
+    write_folder(data, "EXP", 450)
+    interrupted_import(monkeypatch, data, database)
+    assert table(database, "SELECT rows_done FROM ingest_progress") == [(200,)]
+
+    summary = run(data, database)
+    assert summary["rows"] == 250  # rows of this run only
+    assert table(database, "SELECT COUNT(*) FROM ingest_progress") == [(0,)]
+    with sqlite3.connect(database) as conn:
+        df = read_columns(conn, 1)
+    assert df["Time"].tolist() == list(range(450))
+
+
+# A folder edited while its import was interrupted is imported again with the new metadata
+def test_resume_after_metadata_change(monkeypatch, paths):
+    data, database = paths
+    write_folder(data, "EXP", 450)
+    interrupted_import(monkeypatch, data, database)
+    write_folder(data, "EXP", 450, description="FIXED", steps=0)
+
+    run(data, database)
+    assert table(database, "SELECT description FROM experiments") == [("FIXED",)]
+    assert table(database, "SELECT COUNT(*) FROM processing_steps") == [(0,)]
+    assert table(database, "SELECT SUM(n_rows) FROM data_blocks WHERE column_index = 0") == [(450,)]
+    assert run(data, database)["unchanged"] == 1
+
+
+# The partial import of a folder deleted after the interruption is removed with its blocks
+def test_interrupted_folder_removed(monkeypatch, paths):
+    data, database = paths
+    folder = write_folder(data, "EXP", 450)
+    write_folder(data, "OTHER", 50)
+    interrupted_import(monkeypatch, data, database)
+    assert table(database, "SELECT COUNT(*) FROM file_blocks") != [(0,)]
+    shutil.rmtree(folder)
+
+    assert run(data, database)["removed"] == 1
+    assert table(database, "SELECT experiment_name FROM experiments") == [("OTHER",)]
+    assert table(database, "SELECT COUNT(*) FROM ingest_progress") == [(0,)]
+    assert table(database, "SELECT COUNT(DISTINCT content_hash) FROM file_blocks") == [(1,)]
+
+
+# Streamed blocks are cut every BLOCK_ROWS rows whatever the chunking, as when the file is read at once,
+# and the blocks of an unfinished import are not kept next to the ones of the next import
+def test_block_layout(monkeypatch, paths, tmp_path):
+    data, database = paths
+    write_folder(data, "EXP", 450)
+    query = "SELECT block_index, column_index, row_start, n_rows, payload FROM file_blocks ORDER BY 1, 2"
+    reference = str(tmp_path / "reference.db")
+    run(data, reference, stream_above=1 << 30)
+    run(data, str(tmp_path / "streamed.db"), chunk_rows=150)
+    assert table(str(tmp_path / "streamed.db"), query) == table(reference, query)
+
+    interrupted_import(monkeypatch, data, database)
+    write_folder(data, "EXP", 450, description="FIXED")
+    run(data, database, chunk_rows=250)
+    assert table(database, query) == table(reference, query)
@@ -0,0 +1,68 @@
+# test_tags.py
+# recipe queries of utils/tags.py (any of, all of, ordered sequence) on the step_tags of a small database
+# run from the repository root: python -m pytest tests
+
+import pytest
+
+from collect_database import create_database, insert_experiment
+from utils.db import connect
+from utils.tags import split_tags, search_experiments_by_tags
+
+# Tags of the processing steps of each experiment, in step order
+HISTORIES = {
+    "A": ["EP", "lowT", "HPR"],
+    "B": ["lowT", "EP"],
+    "C": ["ep, HPR"],
+    "D": ["EP", "BCP", "lowT", "EP"],
+}
+HISTORY_NAMES = {i: name for i, name in enumerate(HISTORIES, start=1)}  # experiment_id -> name
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / "srf.db"))
+    create_database(conn)
+    for name, steps in HISTORIES.items():
+        metadata = {"experiment_name": name, "date": "2025-01-01",
+                    "processing_steps": [{"process_type": "step", "tags": tags} for tags in steps]}
+        insert_experiment(conn, {"metadata": metadata, "folder_path": name, "images": []})
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def names(conn, tags, mode):
+    ids = search_experiments_by_tags(conn, tags, mode)
+    return [HISTORY_NAMES[i] for i in ids]
+
+
+def test_split_tags():
+    assert split_tags("EP, lowT,,ep ") == ["EP", "lowT"]
+    assert split_tags(["HPR", " hpr"]) == ["HPR"]
+    assert split_tags(None) == []
+
+
+def test_any(conn):
+    assert names(conn, ["HPR"], "any") == ["A", "C"]
+    assert names(conn, ["bcp", "HPR"], "any") == ["A", "C", "D"]
+
+
+# Tags compared ignoring case, each tag counted once
+def test_all(conn):
+    assert names(conn, ["EP", "lowT"], "all") == ["A", "B", "D"]
+    assert names(conn, ["ep", "EP", "HPR"], "all") == ["A", "C"]
+
+
+# Steps in this order, other steps allowed in between, a tag may come back
+def test_sequence(conn):
+    assert names(conn, ["EP", "lowT"], "sequence") == ["A", "D"]
+    assert names(conn, ["lowT", "EP"], "sequence") == ["B", "D"]
+    assert names(conn, ["EP", "EP"], "sequence") == ["D"]
+    assert names(conn, ["EP", "HPR"], "sequence") == ["A"]  # C has both on the same step
+
+
+def test_unknown_tag(conn):
+    assert names(conn, ["nothing"], "any") == []
+    assert names(conn, ["EP", "nothing"], "sequence") == []
+    with pytest.raises(ValueError):
+        search_experiments_by_tags(conn, [], "any")
@@ -0,0 +1,68 @@
+# archive.py
+# experiment ZIPs (as generated by the Create page) ingested without extracting them:
+# the files of such an experiment are referred to as "path/to/archive.zip/member"
+# and read back from the archive when they are needed (e.g. the full resolution images)
+
+import io
+import os
+import zipfile
+
+ARCHIVE_EXTENSION = ".zip"
+
+# Where the Create page keeps the ZIPs it adds to the database (outside ./data: they are not experiment folders)
+UPLOAD_FOLDER = "uploads"
+
+
+# Path of a member of an archive, e.g. uploads/FG006.zip/FG006_image_1.png
+def archive_member_path(archive_path, member):
+    return os.path.join(os.path.normpath(archive_path), member)
+
+
+# (archive_path, member) of a path inside an archive, (None, None) for a plain path
+def split_archive_path(path):
+    parts = os.path.normpath(path).split(os.sep)
+    for i in range(len(parts) - 1, 0, -1):
+        if parts[i - 1].lower().endswith(ARCHIVE_EXTENSION):
+            return os.sep.join(parts[:i]), "/".join(parts[i:])
+    return None, None
+
+
+# Whether a stored file (plain file or archive member) can be read
+def stored_file_exists(path):
+    if os.path.exists(path):
+        return True
+    archive_path, member = split_archive_path(path)
+    if archive_path is None or not os.path.isfile(archive_path):
+        return False
+    with zipfile.ZipFile(archive_path) as zf:
+        return member in zf.NameToInfo
+
+
+# Binary file object of a stored file (plain file or archive member), the caller closes it
+def open_stored_file(path):
+    if os.path.exists(path):
+        return open(path, "rb")
+    archive_path, member = split_archive_path(path)
+    if archive_path is None:
+        raise FileNotFoundError(path)
+    with zipfile.ZipFile(archive_path) as zf:
+        return io.BytesIO(zf.read(member))
+
+
+# Write an archive held in memory to UPLOAD_FOLDER, returns its path
+# (written under a temporary name first: a watched folder never sees a partial ZIP)
+def save_upload(buffer, file_name, upload_folder=UPLOAD_FOLDER):
+    os.makedirs(upload_folder, exist_ok=True)
+    path = os.path.join(upload_folder, file_name)
+    with open(path + ".part", "wb") as f:
+        f.write(buffer.getbuffer())
+    os.replace(path + ".part", path)
+    return path
+
+
+# Archives of a path: the archive itself or the archives directly inside a directory (sorted)
+def list_archives(path):
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(ARCHIVE_EXTENSION)]
+    return [path]
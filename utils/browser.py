@@ -2,12 +2,10 @@
 # streamlit interafe to query and plot the SRF database
 
 import streamlit as st
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
 
 from utils.utils import *
+from utils.profiling import span
 
 def browser_page():
     # Check login status; if not logged in, show login page
@@ -18,25 +16,46 @@ def browser_page():
     st.title("SRF: Query and Visualization")        
     st.write("Current working directory:", os.getcwd())
 
+    # Queue, progress and errors of the experiments imported in the background (ingest_worker.py)
+    if st.checkbox("Show background imports"):
+        ingest_panel()
+
     experiments_df = load_experiments()
 
-    # Filter experiments by processing tags ("recipes")
+    # Filter experiments by processing tags ("recipes"), a single query whatever the number of tags
     if st.checkbox("Filter by *recipes*"):
         all_tags = get_all_processing_tags()
-        selected_tags = st.pills("Processes applied in the history of the cavity", all_tags, selection_mode="multi")
+        mode = st.radio("Match", RECIPE_MODES, format_func=RECIPE_LABELS.get, horizontal=True)
+        if mode == "sequence":
+            # multiselect keeps the order in which the tags are picked
+            selected_tags = st.multiselect("Processes applied in this order in the history of the cavity", all_tags)
+        else:
+            selected_tags = st.pills("Processes applied in the history of the cavity", all_tags, selection_mode="multi")
         if selected_tags:
-            st.success(f"Selected tags: {', '.join(selected_tags)}")
-            matched_ids = set()
-            for tag in selected_tags:
-                ids = get_experiments_by_processing_tag(tag)
-                matched_ids.update(ids)
+            separator = " → " if mode == "sequence" else ", "
+            st.success(f"Selected tags: {separator.join(selected_tags)}")
+            matched_ids = get_experiments_by_processing_tags(tuple(selected_tags), mode)
             if matched_ids:
                 experiments_df = experiments_df[experiments_df['experiment_id'].isin(matched_ids)]
             else:
-                st.warning(f"No experiments found with selected tags: {', '.join(selected_tags)}")
+                st.warning(f"No experiments found with selected tags: {separator.join(selected_tags)}")
         else:
             st.info("No tags selected.")
 
+    # Filter or rank experiments by their processing history
+    if st.checkbox("Search by processing history"):
+        experiments_df = history_search(experiments_df)
+        if experiments_df.empty:
+            st.warning("No experiments match the processing history.")
+
+    # Filter experiments by the statistics of their channels (no raw data is read)
+    if st.checkbox("Search by channel statistics"):
+        conditions = stats_conditions()
+        matched_ids = get_experiments_by_stats(conditions)
+        experiments_df = experiments_df[experiments_df['experiment_id'].isin(matched_ids)]
+        if experiments_df.empty:
+            st.warning("No experiments match the conditions.")
+
     display_experiments(experiments_df)
 
     # Filter experiments by metadata columns
@@ -59,80 +78,83 @@ def browser_page():
         else:
             st.info("No processing steps available for this experiment.")
 
-        # Show raw data if available
-        experiment_data_df = load_data_for_experiment(experiment_id)
-        if not experiment_data_df.empty:
+        # Column statistics computed at ingest: the data itself is only loaded when it is shown, filtered or plotted
+        column_stats_df = load_column_stats(experiment_id)
+        if not column_stats_df.empty:
+            if st.checkbox("Show channel statistics"):
+                st.write("### Channel Statistics")
+                st.dataframe(column_stats_df)
+            if st.checkbox("Show derived quantities"):
+                st.write("### Derived Quantities")
+                derived_panel(experiment_id, column_stats_df.index)
             if st.checkbox("Show Raw Data"):
+                experiment_data_df = load_data_for_experiment(experiment_id)
                 st.write(f"### Data for Experiment: {experiment_name}")
                 selected_columns = st.multiselect("Select columns to display", experiment_data_df.columns.tolist(), default=experiment_data_df.columns.tolist(), key="raw")
                 st.dataframe(experiment_data_df[selected_columns])
         else:
             st.info("No raw data found for this experiment.")
 
-        filtered_data_df = experiment_data_df
+        filtered_data_df = None  # the whole experiment
 
-        # Optionally filter raw data
-        if not experiment_data_df.empty:
+        # Optionally filter raw data: only the matching rows are read from the database
+        if not column_stats_df.empty:
             if st.checkbox("Filter raw data"):
-                filtered_data_df = filter_data(experiment_data_df)
+                filtered_data_df = filter_data(experiment_id, column_stats_df)
         else:
             st.info("No data available to filter.")
 
 
     # ... after filtered_data_df is defined and ready ...
 
-    if not filtered_data_df.empty:
+    if not column_stats_df.empty:
         if st.checkbox("Plot data"):
-            x_col, y_col, log_scale, plot_df = plot_data(filtered_data_df)
-
-            # Initialize comparison state on first use
-            if "compare_plots" not in st.session_state:
-                st.session_state.compare_plots = []
-
-            # Buttons for compare and clear
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("Compare"):
-                    # Add current plot data to comparison list
-                    st.session_state.compare_plots.append({
-                        "experiment_name": experiment_name,   # add this line
-                        "x_col": x_col,
-                        "y_col": y_col,
-                        "log_scale": log_scale,
-                        "data": plot_df
-                    })
-                    st.success("Plot added to comparison.")
-
-            with col2:
-                if st.button("Close Compare"):
+            if filtered_data_df is None:
+                filtered_data_df = load_data_for_experiment(experiment_id)
+            if filtered_data_df.empty:
+                st.info("No rows match the filter.")
+            else:
+                x_col, y_col, log_scale, plot_df = plot_data(filtered_data_df)
+
+                # Initialize comparison state on first use
+                if "compare_plots" not in st.session_state:
                     st.session_state.compare_plots = []
-                    st.success("Comparison cleared.")
+
+                # Buttons for compare and clear: the comparison keeps the experiment and the channels,
+                # the data is read again for the whole fleet at once by the overlay
+                def compare_entry(experiment_id, experiment_name):
+                    return {"experiment_id": int(experiment_id), "experiment_name": experiment_name,
+                            "x_col": x_col, "y_col": y_col, "log_scale": log_scale}
+
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    if st.button("Compare"):
+                        st.session_state.compare_plots.append(compare_entry(experiment_id, experiment_name))
+                        st.success("Plot added to comparison.")
+
+                with col2:
+                    if st.button("Compare all listed", help="Add every experiment of the list above with these channels"):
+                        st.session_state.compare_plots += [
+                            compare_entry(row.experiment_id, row.experiment_name)
+                            for row in filtered_experiments_df.itertuples()]
+                        st.success(f"{len(filtered_experiments_df)} experiments added to comparison.")
+
+                with col3:
+                    if st.button("Close Compare"):
+                        st.session_state.compare_plots = []
+                        st.success("Comparison cleared.")
 
         # If there are comparison plots, show the overlay plot
         if "compare_plots" in st.session_state and st.session_state.compare_plots:
             st.write("### Comparison Overlay")
-            fig, ax = plt.subplots()
-
-            for i, plot_info in enumerate(st.session_state.compare_plots):
-                data = plot_info["data"]
-                ax.scatter(data[plot_info["x_col"]], data[plot_info["y_col"]],
-                        label=f"{plot_info['experiment_name']}: {plot_info['y_col']} vs {plot_info['x_col']}")
-            # If any plot uses log scale, set it
-            if any(p["log_scale"] for p in st.session_state.compare_plots):
-                ax.set_yscale('log')
-
-            ax.legend()
-            st.pyplot(fig)
+            with span("overlay"):
+                comparison_overlay(st.session_state.compare_plots)
 
         # Load and display associated png plots if available
         plots_df = load_plots_for_experiment(experiment_id)
         if not plots_df.empty:
             if st.checkbox("Load png plots"):
                 st.write("### Associated Plots")
-                for _, row in plots_df.iterrows():
-                    if os.path.exists(row['file_path']):
-                        st.image(row['file_path'], caption=row['caption'] if row['caption'] else "", use_container_width=True)
-                    else:
-                        st.warning(f"Image file not found: {row['file_path']}")
+                plot_gallery(experiment_id)
         else:
             st.info("No plots found for this experiment.")
\ No newline at end of file
@@ -0,0 +1,25 @@
+# catalogs.py
+# JSON catalogs of the processing steps, parsed on first use and then shared by every caller
+# (the Create page, the synthetic datasets of the benchmarks); the returned objects must not be modified
+# - processes.json: process types with their tags and parameters
+# - presets.json: predefined chains of steps
+
+import os
+import json
+import functools
+
+CATALOG_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def load_catalog(file_name):
+    with open(os.path.join(CATALOG_FOLDER, file_name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_processes():
+    return load_catalog("processes.json")
+
+
+def load_presets():
+    return load_catalog("presets.json")
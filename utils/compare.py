@@ -0,0 +1,181 @@
+# compare.py
+# comparison of a fleet of experiments on a common x grid (temperature, time since the start of the run, ...)
+# - the x and y channels of all the experiments are read with a single query
+# - every trace is resampled onto the same grid, the result is one contiguous 2-D array (experiments x grid points),
+#   NaN where an experiment has no data
+# - the overlay, the band statistics of the fleet and the differences to a reference experiment are computed
+#   from that array
+#
+#   comparison = compare_experiments(conn, ids, "Temp_Diode", "QualityFactor")
+#   band_statistics(comparison["values"])                        # median, quantiles, min/max per grid point
+#   reference_difference(comparison, ids[0], mode="ratio")       # every curve against the first experiment
+
+import numpy as np
+
+from utils.storage import FLOAT_DTYPE
+from utils.profiling import timed
+
+# "interp": linear interpolation of the trace sorted by x, "mean": mean of the points falling in each grid cell
+# (better for noisy x such as a temperature read during a cool-down, empty cells are NaN)
+RESAMPLE_METHODS = ("interp", "mean")
+RESAMPLE_LABELS = {"interp": "Linear interpolation", "mean": "Mean per grid cell"}
+
+# "common": range shared by all the experiments, "union": from the lowest to the highest x of the fleet
+GRID_SPANS = ("common", "union")
+
+# "none": x as stored, "start": x minus its first value (e.g. Time -> time since the start of the cool-down)
+X_ALIGNMENTS = ("none", "start")
+
+DIFFERENCE_MODES = ("difference", "ratio", "relative")
+
+DEFAULT_GRID_POINTS = 500
+
+# Quantiles of the band statistics (percent)
+BAND_QUANTILES = (5, 25, 50, 75, 95)
+
+# x and y channels of several columnar experiments, one query for the whole fleet
+QUERY_FLEET_CHANNEL_BLOCKS = '''
+    SELECT experiment_id, column_name, payload FROM data_blocks
+    WHERE experiment_id IN ({experiments}) AND column_name IN (?, ?)
+    ORDER BY experiment_id, block_index
+'''
+
+# Same for the experiments of the legacy long table
+QUERY_FLEET_CHANNEL_EAV = '''
+    SELECT experiment_id, column_name, value FROM data
+    WHERE experiment_id IN ({experiments}) AND column_name IN (?, ?)
+    ORDER BY experiment_id, row_index
+'''
+
+
+# {experiment_id: (x, y)} float64 arrays of the finite points, for the experiments holding both channels
+def read_channel_pairs(conn, experiment_ids, x_column, y_column):
+    experiment_ids = [int(experiment_id) for experiment_id in experiment_ids]
+    placeholders = ", ".join("?" * len(experiment_ids))
+    parts = {}
+    for experiment_id, column_name, payload in conn.execute(
+            QUERY_FLEET_CHANNEL_BLOCKS.format(experiments=placeholders), [*experiment_ids, x_column, y_column]):
+        parts.setdefault(experiment_id, {}).setdefault(column_name, []).append(np.frombuffer(payload, dtype=FLOAT_DTYPE))
+
+    missing = [experiment_id for experiment_id in experiment_ids if experiment_id not in parts]
+    if missing:
+        values = {}
+        for experiment_id, column_name, value in conn.execute(
+                QUERY_FLEET_CHANNEL_EAV.format(experiments=", ".join("?" * len(missing))), [*missing, x_column, y_column]):
+            values.setdefault(experiment_id, {}).setdefault(column_name, []).append(value)
+        for experiment_id, channels in values.items():
+            parts[experiment_id] = {name: [np.array(column, dtype=float)] for name, column in channels.items()}
+
+    pairs = {}
+    for experiment_id in experiment_ids:
+        channels = parts.get(experiment_id, {})
+        if x_column not in channels or y_column not in channels:
+            continue
+        x = np.concatenate(channels[x_column])
+        y = x if x_column == y_column else np.concatenate(channels[y_column])
+        finite = np.isfinite(x) & np.isfinite(y)
+        pairs[experiment_id] = (x[finite], y[finite])
+    return pairs
+
+
+# Grid of n_points x values over the common range or the union of the ranges of the traces
+# (None when the traces do not overlap or hold no point)
+def common_grid(traces, n_points=DEFAULT_GRID_POINTS, span="common", log=False):
+    if span not in GRID_SPANS:
+        raise ValueError(f"Unknown grid span '{span}', expected one of {GRID_SPANS}")
+    ranges = np.array([(x.min(), x.max()) for x, _ in traces if len(x)])
+    if log:
+        ranges = ranges[ranges[:, 0] > 0] if len(ranges) else ranges
+    if not len(ranges):
+        return None
+    low, high = (ranges[:, 0].max(), ranges[:, 1].min()) if span == "common" else (ranges[:, 0].min(), ranges[:, 1].max())
+    if low > high:
+        return None
+    return np.geomspace(low, high, n_points) if log else np.linspace(low, high, n_points)
+
+
+# Resample traces onto grid: one row per trace, NaN outside the x range of the trace (or in empty cells for "mean")
+def resample_traces(traces, grid, method="interp"):
+    values = np.full((len(traces), len(grid)), np.nan)
+    if method == "interp":
+        for row, (x, y) in enumerate(traces):
+            if not len(x):
+                continue
+            order = np.argsort(x, kind="stable")
+            x, y = x[order], y[order]
+            values[row] = np.interp(grid, x, y, left=np.nan, right=np.nan)
+    elif method == "mean":
+        # Cells centred on the grid points, all the traces in a single bincount
+        edges = np.concatenate(([grid[0]], (grid[1:] + grid[:-1]) / 2, [grid[-1]]))
+        n_cells = len(grid)
+        lengths = np.array([len(x) for x, _ in traces])
+        if not lengths.sum():
+            return values
+        x = np.concatenate([x for x, _ in traces])
+        y = np.concatenate([y for _, y in traces])
+        rows = np.repeat(np.arange(len(traces)), lengths)
+        cells = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_cells - 1)
+        inside = (x >= grid[0]) & (x <= grid[-1])
+        flat = rows[inside] * n_cells + cells[inside]
+        sums = np.bincount(flat, weights=y[inside], minlength=values.size)
+        counts = np.bincount(flat, minlength=values.size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = (sums / counts).reshape(values.shape)
+    else:
+        raise ValueError(f"Unknown resampling method '{method}', expected one of {RESAMPLE_METHODS}")
+    return values
+
+
+# x and y channels of experiment_ids resampled onto one grid:
+# {"experiment_ids": [...] (experiments holding both channels, in the given order), "grid": (n_points,),
+#  "values": (n_experiments, n_points), "x_column", "y_column"}
+# Experiments without the channels are left out, "grid" is None when the traces do not overlap
+@timed()
+def compare_experiments(conn, experiment_ids, x_column, y_column, n_points=DEFAULT_GRID_POINTS,
+                        method="interp", span="common", align="none", log_x=False):
+    if align not in X_ALIGNMENTS:
+        raise ValueError(f"Unknown x alignment '{align}', expected one of {X_ALIGNMENTS}")
+    pairs = read_channel_pairs(conn, experiment_ids, x_column, y_column)
+    ids = [experiment_id for experiment_id in (int(i) for i in experiment_ids) if experiment_id in pairs]
+    traces = [pairs[experiment_id] for experiment_id in ids]
+    if align == "start":
+        traces = [(x - x[0], y) if len(x) else (x, y) for x, y in traces]
+
+    grid = common_grid(traces, n_points, span, log_x)
+    values = resample_traces(traces, grid, method) if grid is not None else np.empty((len(ids), 0))
+    return {"experiment_ids": ids, "grid": grid, "values": values, "x_column": x_column, "y_column": y_column}
+
+
+# Statistics of the fleet at every grid point, {"count", "mean", "std", "min", "max", "q5", ..., "q95"}
+# (points where no experiment has data are NaN, count 0)
+def band_statistics(values, quantiles=BAND_QUANTILES):
+    count = np.isfinite(values).sum(axis=0)
+    band = {"count": count}
+    if not values.size:
+        return band
+    covered = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, func in (("mean", np.nanmean), ("std", np.nanstd), ("min", np.nanmin), ("max", np.nanmax)):
+            column = np.full(values.shape[1], np.nan)
+            column[covered] = func(values[:, covered], axis=0)
+            band[name] = column
+        points = np.full((len(quantiles), values.shape[1]), np.nan)
+        points[:, covered] = np.nanpercentile(values[:, covered], quantiles, axis=0)
+    for q, column in zip(quantiles, points):
+        band[f"q{q}"] = column
+    return band
+
+
+# Every curve against the one of the reference experiment (same shape as values):
+# "difference" y - y_ref, "ratio" y / y_ref, "relative" (y - y_ref) / |y_ref|
+def reference_difference(comparison, reference_id, mode="difference"):
+    if mode not in DIFFERENCE_MODES:
+        raise ValueError(f"Unknown difference mode '{mode}', expected one of {DIFFERENCE_MODES}")
+    values = comparison["values"]
+    reference = values[comparison["experiment_ids"].index(int(reference_id))]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if mode == "difference":
+            return values - reference
+        if mode == "ratio":
+            return values / reference
+        return (values - reference) / np.abs(reference)
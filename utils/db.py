@@ -0,0 +1,126 @@
+# db.py
+# connections to the SRF database, shared by the streamlit UI and collect_database.py
+# - connect(): a tuned connection (WAL, synchronous=NORMAL, mmap, page cache), used by the collector
+#   and by the writes of the UI (thumbnails, derived quantities, job retries)
+# - read_connection(): borrows a connection from a per-database pool, one connection per thread at a time,
+#   for reads only (a transaction left open is rolled back when the connection goes back to the pool)
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.profiling import active, trace_connection
+
+DATABASE_PATH = os.path.join("data", "srf_database.db")
+
+# Applied to every connection
+PRAGMAS = {
+    "journal_mode": "WAL",          # readers keep working while the collector writes
+    "synchronous": "NORMAL",        # with WAL: durable at checkpoints, no fsync per commit
+    "mmap_size": 256 * 2**20,       # read pages through the OS page cache
+    "cache_size": -64 * 1024,       # 64 MB page cache per connection (negative = KiB)
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,           # ms to wait on a lock instead of failing
+}
+
+# Idle read connections kept per database
+READ_POOL_SIZE = 8
+
+
+def connect(database_path=None):
+    conn = sqlite3.connect(database_path or DATABASE_PATH, check_same_thread=False)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    # Statements counted by the profiler active when the connection is opened (e.g. the collector run)
+    recorder = active()
+    if recorder is not None:
+        trace_connection(conn, recorder)
+    return conn
+
+
+# Idle connections of one database file
+# The pool is flushed when the file is replaced (e.g. collect_database.py --rebuild),
+# otherwise the pooled connections would keep reading the deleted file
+class ConnectionPool:
+    def __init__(self, database_path, size=READ_POOL_SIZE):
+        self.database_path = database_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._file_id = None
+        self._lock = threading.Lock()
+
+    def _current_file_id(self):
+        try:
+            st = os.stat(self.database_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _acquire(self):
+        file_id = self._current_file_id()
+        with self._lock:
+            if file_id != self._file_id:
+                self._close_idle()
+                self._file_id = file_id
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.database_path)
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._idle.qsize() < self.size:
+                self._idle.put_nowait(conn)
+                return
+        conn.close()
+
+    def _close_idle(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        recorder = active()
+        trace_connection(conn, recorder)  # statements of this borrow only
+        try:
+            yield conn
+        finally:
+            if recorder is not None:
+                trace_connection(conn, None)
+            self._release(conn)
+
+    def close(self):
+        with self._lock:
+            self._close_idle()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_path=None):
+    database_path = os.path.abspath(database_path or DATABASE_PATH)
+    with _pools_lock:
+        if database_path not in _pools:
+            _pools[database_path] = ConnectionPool(database_path)
+        return _pools[database_path]
+
+
+# with read_connection() as conn: ...  (the connection goes back to the pool at the end of the block)
+def read_connection(database_path=None):
+    return get_pool(database_path).connection()
+
+
+# Delete a database file together with its WAL side files
+def remove_database(database_path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
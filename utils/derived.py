@@ -0,0 +1,266 @@
+# derived.py
+# derived quantities computed from the stored channels of an experiment:
+# frequency shift, penetration depth shift Δλ, surface resistance, two-fluid fit of Δλ(T)
+# - vectorized over the channels of one experiment, computed at ingest (when the data file is parsed) or on first request
+# - stored in the derived / derived_columns tables, keyed by the hash of their inputs: content hash of the data file,
+#   name and version of the formula and its settings. A new data file, a new version or new settings give a new
+#   hash and the quantity is computed again, experiments sharing a data file share their derived quantities
+#
+#   result = derived_quantity(conn, experiment_id, "delta_lambda_fit")    # {"data": DataFrame, "params": {...}}
+#   result["params"]["Tc_K"]
+
+import json
+import time
+import sqlite3
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import FLOAT_DTYPE, column_to_float
+from utils.query import read_experiment_data
+from utils.profiling import timed
+
+MU0 = 4e-7 * np.pi          # H/m
+ANGSTROM = 1e-10            # m
+
+# Geometry factor G of the cavity (Rs = G / Q0): ~270 Ohm for the TESLA/elliptical cells, set per cavity in the settings
+GEOMETRY_FACTOR_OHM = 270.0
+
+# Superconducting range used as reference and fitted (K), upper bound of the fitted Tc
+T_MAX_K = 8.6
+TC_MAX_K = 9.5
+
+# Points of the Tc scan of the two-fluid fit (coarse, then around the best coarse value)
+FIT_TC_POINTS = 16
+# Elements of the (Tc candidates x points) arrays evaluated at once by the fit
+FIT_CHUNK_ELEMENTS = 2**22
+
+TEMPERATURE = "Temp_Diode"
+FREQUENCY = "Center_Stimulus"
+QUALITY_FACTOR = "QualityFactor"
+
+
+# Frequency shift from the highest frequency below t_max_K (smallest penetration depth, all the points if none)
+def frequency_shift(channels, settings):
+    t, f = channels[TEMPERATURE], channels[FREQUENCY]
+    below = t <= settings["t_max_K"]
+    f0 = np.nanmax(f[below]) if below.any() else np.nanmax(f)
+    return {TEMPERATURE: t, "delta_f_Hz": f - f0}, {"f0_Hz": float(f0)}
+
+
+# Penetration depth shift: Δλ = -G / (π μ0 f0²) Δf, in Ångström
+def delta_lambda(channels, settings):
+    columns, params = frequency_shift(channels, settings)
+    scale = -settings["geometry_factor_ohm"] / (np.pi * MU0 * params["f0_Hz"] ** 2) / ANGSTROM
+    return {TEMPERATURE: columns[TEMPERATURE], "delta_lambda_A": columns["delta_f_Hz"] * scale}, params
+
+
+# Surface resistance Rs = G / Q0, in nOhm
+def surface_resistance(channels, settings):
+    return {TEMPERATURE: channels[TEMPERATURE],
+            "Rs_nOhm": settings["geometry_factor_ohm"] / channels[QUALITY_FACTOR] * 1e9}, {}
+
+
+# Least squares of y = A / sqrt(1 - (t/Tc)^4) - l0 for every Tc candidate (linear in A and l0 for a fixed Tc)
+# Returns chi2, A, l0 arrays over tc_values
+def two_fluid_scan(t, y, tc_values):
+    n = len(t)
+    chi2, a, l0 = (np.empty(len(tc_values)) for _ in range(3))
+    step = max(1, FIT_CHUNK_ELEMENTS // n)
+    t4 = t ** 4
+    sy, syy = y.sum(), y @ y
+    for start in range(0, len(tc_values), step):
+        # u = 1 / sqrt(1 - t^4 / Tc^4), computed in place for a chunk of candidates
+        u = np.multiply.outer(-1.0 / tc_values[start:start + step] ** 4, t4)
+        u += 1.0
+        np.sqrt(u, out=u)
+        np.reciprocal(u, out=u)
+        su, suu, suy = u.sum(axis=1), np.einsum("ij,ij->i", u, u), u @ y
+        slope = (n * suy - su * sy) / (n * suu - su * su)
+        intercept = (sy - slope * su) / n
+        chi2[start:start + step] = syy - slope * suy - intercept * sy
+        a[start:start + step] = slope
+        l0[start:start + step] = -intercept
+    return chi2, a, l0
+
+
+# Fit of Δλ(T) below Tc with the two-fluid model Δλ = A / sqrt(1 - (T/Tc)^4) - l0
+# (points between t_min_K and t_max_K, Tc scanned up to tc_max_K, profile errors on Tc)
+def delta_lambda_fit(channels, settings):
+    columns, params = delta_lambda(channels, settings)
+    t, y = columns[TEMPERATURE], columns["delta_lambda_A"]
+    window = np.isfinite(t) & np.isfinite(y) & (t >= settings["t_min_K"]) & (t <= settings["t_max_K"]) & (t > 0)
+    fit = np.full(len(t), np.nan)
+    params["n_points"] = int(window.sum())
+    tw, yw = t[window], y[window]
+    if len(tw) < 4 or tw.max() >= settings["tc_max_K"]:
+        return {**columns, "delta_lambda_fit_A": fit}, params
+
+    low, high = tw.max() * (1 + 1e-6), settings["tc_max_K"]
+    tc_values = np.linspace(low, high, FIT_TC_POINTS)
+    chi2, _, _ = two_fluid_scan(tw, yw, tc_values)
+    best = int(np.nanargmin(chi2))
+    tc_values = np.linspace(tc_values[max(best - 1, 0)], tc_values[min(best + 1, len(tc_values) - 1)], FIT_TC_POINTS)
+    chi2, a, l0 = two_fluid_scan(tw, yw, tc_values)
+    best = int(np.nanargmin(chi2))
+    tc = tc_values[best]
+
+    # Errors: residual variance, covariance of (A, l0) at the best Tc, curvature of the profiled chi2 for Tc
+    dof = len(tw) - 3
+    variance = chi2[best] / dof if dof > 0 else np.nan
+    u = 1.0 / np.sqrt(1.0 - (tw / tc) ** 4)
+    normal = np.array([[u @ u, u.sum()], [u.sum(), len(u)]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        errors = np.sqrt(np.abs(np.diag(np.linalg.pinv(normal))) * variance)
+        tc_error = np.nan
+        if 0 < best < len(tc_values) - 1:
+            h = tc_values[1] - tc_values[0]
+            curvature = (chi2[best - 1] - 2 * chi2[best] + chi2[best + 1]) / h ** 2
+            tc_error = np.sqrt(2 * variance / curvature) if curvature > 0 else np.nan
+
+    inside = window & (t < tc)
+    fit[inside] = a[best] / np.sqrt(1.0 - (t[inside] / tc) ** 4) - l0[best]
+    params.update(Tc_K=float(tc), Tc_err_K=float(tc_error), A_A=float(a[best]), A_err_A=float(errors[0]),
+                  l0_A=float(l0[best]), l0_err_A=float(errors[1]), chi2=float(chi2[best]))
+    return {**columns, "delta_lambda_fit_A": fit}, params
+
+
+# name -> formula: version (bump it when the formula changes), input channels, settings and function
+# function(channels {name: float64 array}, settings) -> ({output column: array}, {parameter: value})
+DERIVED_QUANTITIES = {
+    "frequency_shift": {"version": 1, "inputs": (TEMPERATURE, FREQUENCY), "settings": {"t_max_K": T_MAX_K},
+                        "function": frequency_shift},
+    "delta_lambda": {"version": 1, "inputs": (TEMPERATURE, FREQUENCY),
+                     "settings": {"geometry_factor_ohm": GEOMETRY_FACTOR_OHM, "t_max_K": T_MAX_K},
+                     "function": delta_lambda},
+    "surface_resistance": {"version": 1, "inputs": (TEMPERATURE, QUALITY_FACTOR),
+                           "settings": {"geometry_factor_ohm": GEOMETRY_FACTOR_OHM}, "function": surface_resistance},
+    "delta_lambda_fit": {"version": 1, "inputs": (TEMPERATURE, FREQUENCY),
+                         "settings": {"geometry_factor_ohm": GEOMETRY_FACTOR_OHM,
+                                      "t_min_K": 0.0, "t_max_K": T_MAX_K, "tc_max_K": TC_MAX_K},
+                         "function": delta_lambda_fit},
+}
+
+DERIVED_LABELS = {
+    "frequency_shift": "Frequency shift Δf(T)",
+    "delta_lambda": "Penetration depth shift Δλ(T)",
+    "surface_resistance": "Surface resistance Rs(T)",
+    "delta_lambda_fit": "Δλ(T) two-fluid fit",
+}
+
+# Content hash of the data file of an experiment (the manifest entry for the long table)
+QUERY_SOURCE_HASH = '''
+    SELECT content_hash FROM experiment_files WHERE experiment_id = ?
+    UNION ALL
+    SELECT * FROM (
+        SELECT content_hash FROM manifest WHERE experiment_id = ? AND file_name GLOB '*.txt' ORDER BY file_name LIMIT 1
+    )
+    LIMIT 1
+'''
+
+QUERY_DERIVED = "SELECT params FROM derived WHERE input_hash = ?"
+QUERY_DERIVED_COLUMNS = "SELECT column_name, payload FROM derived_columns WHERE input_hash = ? ORDER BY column_index"
+
+
+# Quantities whose input channels are all in channels
+def available_quantities(channels):
+    channels = set(channels)
+    return [name for name, formula in DERIVED_QUANTITIES.items() if channels.issuperset(formula["inputs"])]
+
+
+# Hash of everything a derived quantity depends on
+def derived_input_hash(name, source_hash):
+    formula = DERIVED_QUANTITIES[name]
+    key = json.dumps([name, formula["version"], formula["settings"], source_hash], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+# Compute a quantity from the channels of a DataFrame: ({column: array}, params)
+@timed()
+def compute_quantity(name, df):
+    formula = DERIVED_QUANTITIES[name]
+    channels = {channel: column_to_float(df[channel]) for channel in formula["inputs"]}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return formula["function"](channels, formula["settings"])
+
+
+# Row of the derived tables: (input_hash, source_hash, name, version, params JSON, n_rows, [(column_name, payload)])
+def derived_row(name, source_hash, columns, params):
+    return (derived_input_hash(name, source_hash), source_hash, name, DERIVED_QUANTITIES[name]["version"],
+            json.dumps(params), len(next(iter(columns.values()))),
+            [(column_name, np.ascontiguousarray(values, dtype=FLOAT_DTYPE).tobytes()) for column_name, values in columns.items()])
+
+
+# Rows of every quantity available from a parsed data file (at ingest, in the reading processes)
+def derive_dataframe(df, source_hash):
+    return [derived_row(name, source_hash, *compute_quantity(name, df)) for name in available_quantities(df.columns)]
+
+
+# Store derived rows, replacing the older versions of the same quantity of the same data file. The caller commits.
+def write_derived(conn, rows):
+    now = time.time()
+    for input_hash, source_hash, name, version, params, n_rows, columns in rows:
+        stale = [row[0] for row in conn.execute(
+            "SELECT input_hash FROM derived WHERE source_hash = ? AND name = ? AND input_hash <> ?",
+            (source_hash, name, input_hash))]
+        conn.executemany("DELETE FROM derived_columns WHERE input_hash = ?", [(h,) for h in stale])
+        conn.executemany("DELETE FROM derived WHERE input_hash = ?", [(h,) for h in stale])
+        conn.execute('''
+            INSERT OR REPLACE INTO derived (input_hash, source_hash, name, version, params, n_rows, created)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (input_hash, source_hash, name, version, params, n_rows, now))
+        conn.executemany('''
+            INSERT OR REPLACE INTO derived_columns (input_hash, column_index, column_name, payload) VALUES (?, ?, ?, ?)
+        ''', [(input_hash, column_index, column_name, payload)
+              for column_index, (column_name, payload) in enumerate(columns)])
+
+
+# Stored quantity: (DataFrame, params), None if not stored
+def read_derived(conn, input_hash):
+    row = conn.execute(QUERY_DERIVED, (input_hash,)).fetchone()
+    if row is None:
+        return None
+    data = {column_name: np.frombuffer(payload, dtype=FLOAT_DTYPE)
+            for column_name, payload in conn.execute(QUERY_DERIVED_COLUMNS, (input_hash,))}
+    return pd.DataFrame(data, copy=False), json.loads(row[0])
+
+
+# Drop the derived quantities of data files no experiment refers to any more, and of formulas that were removed
+# Returns the number of quantities removed
+def prune_derived(conn):
+    names = list(DERIVED_QUANTITIES)
+    removed = conn.execute(f'''
+        DELETE FROM derived WHERE name NOT IN ({", ".join("?" * len(names))}) OR source_hash NOT IN (
+            SELECT content_hash FROM experiment_files UNION SELECT content_hash FROM manifest WHERE content_hash IS NOT NULL
+        )
+    ''', names).rowcount
+    conn.execute("DELETE FROM derived_columns WHERE input_hash NOT IN (SELECT input_hash FROM derived)")
+    return removed
+
+
+# A derived quantity of an experiment, {"name", "data": DataFrame, "params": dict, "stored": bool}
+# Read from the derived tables when its inputs did not change, otherwise computed from the stored channels
+# and stored (not stored for an experiment without a known data file, or a database without the tables).
+# None if the experiment lacks an input channel. The caller commits.
+@timed()
+def derived_quantity(conn, experiment_id, name):
+    experiment_id = int(experiment_id)
+    row = conn.execute(QUERY_SOURCE_HASH, (experiment_id, experiment_id)).fetchone()
+    source_hash = row[0] if row else None
+    input_hash = derived_input_hash(name, source_hash) if source_hash else None
+    if input_hash is not None:
+        try:
+            stored = read_derived(conn, input_hash)
+        except sqlite3.OperationalError:  # database built before the derived tables
+            input_hash = stored = None
+        if stored is not None:
+            return {"name": name, "data": stored[0], "params": stored[1], "stored": True}
+
+    df = read_experiment_data(conn, experiment_id, list(DERIVED_QUANTITIES[name]["inputs"]))
+    if not set(DERIVED_QUANTITIES[name]["inputs"]).issubset(df.columns) or df.empty:
+        return None
+    columns, params = compute_quantity(name, df)
+    if input_hash is not None:
+        write_derived(conn, [derived_row(name, source_hash, columns, params)])
+    return {"name": name, "data": pd.DataFrame(columns, copy=False), "params": params, "stored": input_hash is not None}
@@ -0,0 +1,93 @@
+# downsample.py
+# reduce a (x, y) trace to about the pixel width of the plot before drawing it
+# - "lttb": Largest-Triangle-Three-Buckets, keeps the visual shape of the trace
+# - "minmax": lowest and highest point of every x bucket, keeps all the peaks
+# - "full": no reduction
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "full")
+DOWNSAMPLE_LABELS = {"lttb": "LTTB", "minmax": "Min/Max per bucket", "full": "Full resolution"}
+
+# Default number of points of a trace: about twice the width in pixels of a default figure
+DEFAULT_POINTS = 1500
+
+
+# Positions of the rows where both x and y are finite
+def finite_positions(x, y):
+    return np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+
+
+# Bucket index of every point, n_buckets equal slices of the x range
+def x_buckets(x, n_buckets):
+    x_min, x_max = x.min(), x.max()
+    if x_max == x_min:
+        return np.zeros(len(x), dtype=np.int64)
+    buckets = ((x - x_min) / (x_max - x_min) * n_buckets).astype(np.int64)
+    return np.minimum(buckets, n_buckets - 1)
+
+
+# Min/Max: for every x bucket keep the points with the lowest and the highest y
+# (at most 2 * n_buckets points, x does not need to be sorted)
+def minmax_indices(x, y, n_buckets):
+    buckets = x_buckets(x, n_buckets)
+    low = np.full(n_buckets, np.inf)
+    high = np.full(n_buckets, -np.inf)
+    np.minimum.at(low, buckets, y)
+    np.maximum.at(high, buckets, y)
+    picked = []
+    for extreme in (low, high):
+        candidates = np.flatnonzero(y == extreme[buckets])
+        # On ties keep the first point of the bucket
+        _, first = np.unique(buckets[candidates], return_index=True)
+        picked.append(candidates[first])
+    return np.union1d(*picked)
+
+
+# LTTB on a trace sorted by x: first and last point plus one point per bucket,
+# the one forming the largest triangle with the previous pick and the mean of the next bucket
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean point of every bucket, the last "bucket" being the final point
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx, by = x[start:stop], y[start:stop]
+        # Twice the triangle area (a, candidate, mean of the next bucket)
+        area = np.abs((x[a] - mean_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (mean_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+# Row positions of df to draw for the trace y_column vs x_column
+def downsample_positions(df, x_column, y_column, method="lttb", n_points=DEFAULT_POINTS):
+    x = df[x_column].to_numpy(dtype=float, na_value=np.nan)
+    y = df[y_column].to_numpy(dtype=float, na_value=np.nan)
+    valid = finite_positions(x, y)
+    if method == "full" or len(valid) <= n_points:
+        return valid
+    x, y = x[valid], y[valid]
+
+    if method == "minmax":
+        return valid[minmax_indices(x, y, max(n_points // 2, 1))]
+    if method == "lttb":
+        order = np.argsort(x, kind="stable")
+        return np.sort(valid[order[lttb_indices(x[order], y[order], n_points)]])
+    raise ValueError(f"Unknown downsampling method '{method}', expected one of {DOWNSAMPLE_METHODS}")
+
+
+# Copy of the two plotted columns reduced to about n_points rows
+def downsample(df, x_column, y_column, method="lttb", n_points=DEFAULT_POINTS):
+    positions = downsample_positions(df, x_column, y_column, method, n_points)
+    columns = [x_column] if x_column == y_column else [x_column, y_column]
+    return df[columns].iloc[positions].reset_index(drop=True)
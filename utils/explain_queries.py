@@ -0,0 +1,69 @@
+# explain_queries.py
+# print the EXPLAIN QUERY PLAN of every query issued by the browser (and the collector lookups)
+# and flag the ones that fall back to a full table scan
+# run from the repository root: python -m utils.explain_queries [--database path]
+
+import sys
+import sqlite3
+import argparse
+
+from collect_database import DATABASE_PATH, QUERY_FIND_EXPERIMENT, QUERY_FOLDER_MANIFEST
+from utils.utils import UI_QUERIES
+
+COLLECTOR_QUERIES = {
+    "find_experiment": (QUERY_FIND_EXPERIMENT, ("FNAL_103", "2025-01-28"), False),
+    "folder_manifest": (QUERY_FOLDER_MANIFEST, ("data/FNAL_103",), False),
+}
+
+
+# Plan lines of a query, e.g. "SEARCH plots USING INDEX idx_plots_experiment (experiment_id=?)"
+def query_plan(conn, query, params):
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+
+# In-memory copy of the database without the ANALYZE statistics: PRAGMA optimize (end of collect_database)
+# fills sqlite_stat1 from the few rows of the sample data, on which a scan looks cheaper than an index;
+# without them the plans show which index a query can use, the same whatever the size of the tables
+def plan_connection(database_path):
+    source = sqlite3.connect(database_path)
+    conn = sqlite3.connect(":memory:")
+    source.backup(conn)
+    source.close()
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'sqlite_stat%'").fetchall():
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.execute("ANALYZE sqlite_schema")  # reload the (now empty) statistics
+    return conn
+
+
+# A plain "SCAN table" walks the whole table, a scan of a covering index is still O(table size)
+# (the scan of a CTE or subquery result computed earlier in the plan only reads that result)
+def is_full_scan(plan):
+    subqueries = {line.split()[1] for line in plan if line.startswith(("CO-ROUTINE", "MATERIALIZE"))}
+    return any(line.startswith("SCAN") and line.split()[1] not in subqueries for line in plan)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the query plans of the UI queries")
+    parser.add_argument("--database", default=DATABASE_PATH)
+    args = parser.parse_args()
+
+    conn = plan_connection(args.database)
+    unexpected = []
+    for name, (query, params, full_scan_ok) in {**UI_QUERIES, **COLLECTOR_QUERIES}.items():
+        plan = query_plan(conn, query, params)
+        if not is_full_scan(plan):
+            verdict = "index"
+        elif full_scan_ok:
+            verdict = "scan (expected)"
+        else:
+            verdict = "SCAN"
+            unexpected.append(name)
+        print(f"[{verdict}] {name}: {' '.join(query.split())}")
+        for line in plan:
+            print(f"    {line}")
+    conn.close()
+
+    if unexpected:
+        print(f"Full table scans in: {', '.join(unexpected)}")
+        sys.exit(1)
@@ -0,0 +1,200 @@
+# history.py
+# search engine over the processing history of the cavities (ordered processing_steps of every experiment)
+# - pattern queries: "EP -> baking(lowT, T=100..140, h>=24) -> HPR", later steps may come in between
+# - similarity ranking: weighted edit distance between the step sequences and the one of a reference experiment
+# The histories are encoded once into flat numpy arrays (one entry per step, experiments contiguous),
+# every query is vectorized over all the experiments
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.tags import split_tags
+
+PATTERN_EXAMPLE = "EP -> baking(lowT, T=100..140, h>=24) -> HPR"
+
+# Arrows separating the elements of a pattern
+PATTERN_ARROW = re.compile(r"\s*(?:->|→)\s*")
+PATTERN_ELEMENT = re.compile(r"^\s*([^()]+?)\s*(?:\((.*)\))?\s*$")
+PATTERN_CONSTRAINT = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=)\s*([^\s]+)\s*$")
+
+# Names of the numeric step parameters usable in a constraint
+PATTERN_PARAMETERS = {
+    "T": "temperature", "temp": "temperature", "temperature": "temperature",
+    "h": "duration", "time": "duration", "duration": "duration",
+}
+
+# Substitution cost between two steps of the same process type with different tags (different process: 1)
+SAME_PROCESS_COST = 0.5
+
+QUERY_HISTORY = '''
+    SELECT experiment_id, step_index, process_type, temperature_c, duration_h, tags FROM processing_steps
+    ORDER BY experiment_id, step_index
+'''
+
+
+# Integer codes of the labels, with the vocabulary (labels compared ignoring case)
+def encode_labels(labels):
+    codes, vocabulary = pd.factorize(pd.Series(labels, dtype=object).fillna("").astype(str).str.casefold())
+    return codes.astype(np.int32), list(vocabulary)
+
+
+# Encode the processing steps of every experiment (rows ordered by experiment_id, step_index)
+# Returns a dict of arrays: experiment_ids / starts / lengths per experiment,
+# process / token / temperature / duration per step, tags: boolean (step x tag) matrix
+def build_history_index(rows):
+    steps = pd.DataFrame.from_records(rows, columns=["experiment_id", "step_index", "process_type",
+                                                     "temperature_c", "duration_h", "tags"])
+    experiment_ids, starts, lengths = np.unique(steps["experiment_id"].to_numpy(dtype=np.int64),
+                                                return_index=True, return_counts=True)
+    process, processes = encode_labels(steps["process_type"])
+
+    # The tags strings repeat a lot: split each distinct one once
+    tags_text, texts = encode_labels(steps["tags"])
+    text_tags = [sorted(name.casefold() for name in split_tags(text)) for text in texts]
+    tag_names = sorted({name for names in text_tags for name in names})
+    text_matrix = np.zeros((len(texts), len(tag_names)), dtype=bool)
+    for code, names in enumerate(text_tags):
+        text_matrix[code, [tag_names.index(name) for name in names]] = True
+
+    # Token of a step for the similarity: process type and tags
+    token = process.astype(np.int64) * max(len(texts), 1) + tags_text
+    return {
+        "experiment_ids": experiment_ids,
+        "starts": starts,
+        "lengths": lengths,
+        "step_experiment": np.repeat(np.arange(len(experiment_ids)), lengths),
+        "step_index": steps["step_index"].to_numpy(dtype=np.int64),
+        "process": process,
+        "processes": processes,
+        "token": token,
+        "tags": text_matrix[tags_text],
+        "tag_names": tag_names,
+        "temperature": pd.to_numeric(steps["temperature_c"], errors="coerce").to_numpy(dtype=float, na_value=np.nan),
+        "duration": pd.to_numeric(steps["duration_h"], errors="coerce").to_numpy(dtype=float, na_value=np.nan),
+    }
+
+
+def load_history_index(conn):
+    return build_history_index(conn.execute(QUERY_HISTORY).fetchall())
+
+
+# Parse a numeric constraint "T=100..140", "h>=24" into (parameter, low, high)
+def parse_constraint(key, operator, value):
+    parameter = PATTERN_PARAMETERS.get(key, PATTERN_PARAMETERS.get(key.lower()))
+    if parameter is None:
+        raise ValueError(f"Unknown parameter '{key}', expected one of {sorted(set(PATTERN_PARAMETERS))}")
+    try:
+        if operator == "=" and ".." in value:
+            low, high = (float(bound) for bound in value.split("..", 1))
+        else:
+            number = float(value)
+            low, high = {"=": (number, number), ">=": (number, np.inf), ">": (np.nextafter(number, np.inf), np.inf),
+                         "<=": (-np.inf, number), "<": (-np.inf, np.nextafter(number, -np.inf))}[operator]
+    except ValueError:
+        raise ValueError(f"Invalid value '{value}' for {key}") from None
+    return parameter, low, high
+
+
+# Parse a pattern into its elements: {"name": process type or tag (None for "*"), "tags": [...], "ranges": {...}}
+# e.g. "EP -> baking(lowT, T=100..140, h>=24) -> HPR"
+def parse_pattern(text):
+    elements = []
+    for part in PATTERN_ARROW.split(text.strip()):
+        match = PATTERN_ELEMENT.match(part)
+        if not part or match is None:
+            raise ValueError(f"Invalid pattern element '{part}' in '{text}'")
+        name, arguments = match.groups()
+        element = {"name": None if name == "*" else name.casefold(), "tags": [], "ranges": {}}
+        for argument in (arguments or "").split(","):
+            if not argument.strip():
+                continue
+            constraint = PATTERN_CONSTRAINT.match(argument)
+            if constraint:
+                parameter, low, high = parse_constraint(*constraint.groups())
+                element["ranges"][parameter] = (low, high)
+            else:
+                element["tags"].append(argument.strip().casefold())
+        elements.append(element)
+    return elements
+
+
+# Steps matching a pattern element: process type or tag equal to the name, with all the tags, parameters in range
+def element_mask(index, element):
+    mask = np.ones(len(index["process"]), dtype=bool)
+    if element["name"] is not None:
+        name = element["name"]
+        by_process = index["process"] == (index["processes"].index(name) if name in index["processes"] else -1)
+        mask &= by_process | tag_mask(index, name)
+    for name in element["tags"]:
+        mask &= tag_mask(index, name)
+    for parameter, (low, high) in element["ranges"].items():
+        values = index[parameter]
+        mask &= (values >= low) & (values <= high)
+    return mask
+
+
+def tag_mask(index, name):
+    if name not in index["tag_names"]:
+        return np.zeros(len(index["process"]), dtype=bool)
+    return index["tags"][:, index["tag_names"].index(name)]
+
+
+# Experiments whose history contains the pattern elements in order (gaps allowed)
+# Greedy leftmost match, vectorized over the experiments: for each element, the first matching step after the
+# step matched by the previous element. Returns (experiment_ids, step_index of the matched steps per element)
+def match_pattern(index, pattern):
+    elements = parse_pattern(pattern) if isinstance(pattern, str) else pattern
+    alive = np.arange(len(index["experiment_ids"]))
+    position = index["starts"] - 1  # last matched step of each experiment
+    matched = []
+    for element in elements:
+        # Sentinel after the last step: never in the same experiment
+        candidates = np.append(np.flatnonzero(element_mask(index, element)), len(index["process"]))
+        next_step = candidates[np.searchsorted(candidates, position[alive], side="right")]
+        found = next_step < len(index["process"])
+        found[found] = index["step_experiment"][next_step[found]] == alive[found]
+        alive = alive[found]
+        position[alive] = next_step[found]
+        matched = [steps[found] for steps in matched] + [next_step[found]]
+    step_index = np.column_stack([index["step_index"][steps] for steps in matched]) if matched else None
+    return index["experiment_ids"][alive], step_index
+
+
+# Weighted edit distance between the history of every experiment and the reference sequence
+# (insert/delete 1, substitution 0 for the same token, SAME_PROCESS_COST for the same process type, 1 otherwise)
+# Dynamic programming over the reference steps, vectorized over all the experiments at once
+def history_distances(index, reference_id):
+    reference = np.searchsorted(index["experiment_ids"], reference_id)
+    if reference >= len(index["experiment_ids"]) or index["experiment_ids"][reference] != reference_id:
+        raise ValueError(f"Experiment {reference_id} has no processing steps")
+    start, length = index["starts"][reference], index["lengths"][reference]
+    ref_token = index["token"][start:start + length]
+    ref_process = index["process"][start:start + length]
+
+    # Steps padded into (experiment x position) matrices
+    n_experiments, width = len(index["experiment_ids"]), int(index["lengths"].max())
+    columns = np.arange(len(index["token"])) - np.repeat(index["starts"], index["lengths"])
+    token = np.full((n_experiments, width), -1, dtype=np.int64)
+    process = np.full((n_experiments, width), -1, dtype=np.int32)
+    token[index["step_experiment"], columns] = index["token"]
+    process[index["step_experiment"], columns] = index["process"]
+
+    previous = np.tile(np.arange(width + 1, dtype=float), (n_experiments, 1))
+    for i in range(length):
+        current = np.empty_like(previous)
+        current[:, 0] = i + 1
+        substitution = np.where(token == ref_token[i], 0.0, np.where(process == ref_process[i], SAME_PROCESS_COST, 1.0))
+        for j in range(1, width + 1):
+            current[:, j] = np.minimum(np.minimum(previous[:, j], current[:, j - 1]) + 1.0,
+                                       previous[:, j - 1] + substitution[:, j - 1])
+        previous = current
+    return index["experiment_ids"], previous[np.arange(n_experiments), index["lengths"]]
+
+
+# (experiment_ids, distances) of the limit experiments closest to the reference, nearest first
+def rank_by_similarity(index, reference_id, limit=None):
+    experiment_ids, distances = history_distances(index, reference_id)
+    order = np.argsort(distances, kind="stable")[:limit]
+    return experiment_ids[order], distances[order]
@@ -0,0 +1,273 @@
+# jobs.py
+# queue of the background imports (ingest_jobs table), filled from the drop folder and run by ingest_worker.py
+# - an experiment folder or ZIP copied into data/incoming is queued once it stopped changing for SETTLE_SECONDS
+#   (the Create page queues its ZIPs right away)
+# - the worker claims the oldest queued job, moves the item to its place (data/<folder>, uploads/<zip>) and imports it
+# - status, rows, duration and error of every job are kept for the status panel of the browser
+# - the worker holds a lease in ingest_worker (taken atomically, kept with a heartbeat): at most one worker runs
+#   on a database
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import subprocess
+
+from utils.db import connect
+from utils.archive import ARCHIVE_EXTENSION, UPLOAD_FOLDER
+
+# Watched folder: experiment folders (with their metadata.json) or experiment ZIPs
+DROP_FOLDER = os.path.join("data", "incoming")
+
+# An item is queued once none of its files changed for this long (still being copied otherwise)
+SETTLE_SECONDS = 5.0
+
+# Seconds between two scans of the drop folder when the queue is empty
+POLL_SECONDS = 2.0
+
+# The worker writes its heartbeat every HEARTBEAT_SECONDS, it is considered gone after WORKER_TIMEOUT_SECONDS
+HEARTBEAT_SECONDS = 5.0
+WORKER_TIMEOUT_SECONDS = 60.0
+
+# queued -> running -> done (imported), skipped (unchanged or already imported from elsewhere) or failed
+JOB_STATES = ("queued", "running", "done", "skipped", "failed")
+
+# Script of the worker and its log when started from the UI
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ingest_worker.py")
+WORKER_LOG = os.path.join("data", "ingest_worker.log")
+
+# Latest jobs, for the status panel
+QUERY_JOBS = '''
+    SELECT job_id, source_path, target_path, kind, status, bytes, rows, error, queued_at, started_at, finished_at
+    FROM ingest_jobs ORDER BY job_id DESC LIMIT ?
+'''
+
+QUERY_JOB_COUNTS = "SELECT status, COUNT(*) FROM ingest_jobs GROUP BY status"
+
+# Rows already committed by the running jobs (streamed data files only, see stream_measurement_file)
+QUERY_RUNNING_PROGRESS = '''
+    SELECT j.job_id, p.rows_done FROM ingest_jobs j
+    JOIN ingest_progress p ON p.folder_path = j.target_path
+    WHERE j.status = 'running'
+'''
+
+QUERY_WORKER = "SELECT pid, started_at, heartbeat_at FROM ingest_worker WHERE worker_id = 1"
+
+# Lease of the worker, only taken when nobody holds it
+QUERY_CLAIM_WORKER = '''
+    INSERT INTO ingest_worker (worker_id, pid, started_at, heartbeat_at)
+    SELECT 1, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM ingest_worker WHERE worker_id = 1)
+'''
+
+# Same item with the same content already waiting, running or failed (a failed item stays in the drop folder
+# until it is fixed: it is only queued again when it changes)
+QUERY_PENDING_JOB = '''
+    SELECT job_id FROM ingest_jobs
+    WHERE source_path = ? AND signature = ? AND status IN ('queued', 'running', 'failed')
+'''
+
+
+# ======================
+# Drop folder
+# ======================
+
+# ("folder" or "archive", bytes, latest mtime) of an item of the drop folder, None for anything else
+# (stray files, ZIPs still being written under another name)
+def drop_item(path):
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, "metadata.json")):
+            return None
+        size, mtime = 0, os.stat(path).st_mtime
+        for root, _, files in os.walk(path):
+            for file_name in files:
+                st = os.stat(os.path.join(root, file_name))
+                size += st.st_size
+                mtime = max(mtime, st.st_mtime)
+        return "folder", size, mtime
+    if path.lower().endswith(ARCHIVE_EXTENSION) and os.path.isfile(path):
+        st = os.stat(path)
+        return "archive", st.st_size, st.st_mtime
+    return None
+
+
+# Queue an item of the drop folder unless the same content is already queued, returns the job_id (None if pending)
+def enqueue_item(conn, path, item=None):
+    path = os.path.normpath(path)
+    kind, size, mtime = item or drop_item(path)
+    signature = json.dumps([size, mtime])
+    if conn.execute(QUERY_PENDING_JOB, (path, signature)).fetchone():
+        return None
+    cursor = conn.execute('''
+        INSERT INTO ingest_jobs (source_path, kind, signature, status, bytes, queued_at)
+        VALUES (?, ?, ?, 'queued', ?, ?)
+    ''', (path, kind, signature, size, time.time()))
+    conn.commit()
+    return cursor.lastrowid
+
+
+# Queue the items of the drop folder that stopped changing, returns the new job_ids
+def scan_drop_folder(conn, drop_folder=DROP_FOLDER, settle_seconds=SETTLE_SECONDS):
+    if not os.path.isdir(drop_folder):
+        return []
+    now = time.time()
+    job_ids = []
+    for entry in sorted(os.listdir(drop_folder)):
+        path = os.path.join(drop_folder, entry)
+        item = drop_item(path)
+        if item is None or now - item[2] < settle_seconds:
+            continue
+        job_id = enqueue_item(conn, path, item)
+        if job_id is not None:
+            job_ids.append(job_id)
+    return job_ids
+
+
+# Where a queued item is imported from: experiment folders next to the drop folder (picked up by
+# collect_database.py like the others), ZIPs with the ones of the Create page
+def job_target(source_path, kind, drop_folder=DROP_FOLDER, upload_folder=UPLOAD_FOLDER):
+    folder = os.path.dirname(os.path.normpath(drop_folder)) if kind == "folder" else upload_folder
+    return os.path.join(folder, os.path.basename(source_path))
+
+
+# ======================
+# Queue
+# ======================
+
+# Oldest queued job marked as running, (job_id, source_path, kind) or None
+def claim_job(conn):
+    while True:
+        row = conn.execute(
+            "SELECT job_id, source_path, kind FROM ingest_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        claimed = conn.execute('''
+            UPDATE ingest_jobs SET status = 'running', started_at = ?, finished_at = NULL, error = NULL
+            WHERE job_id = ? AND status = 'queued'
+        ''', (time.time(), row[0])).rowcount
+        conn.commit()
+        if claimed:
+            return row
+
+
+def set_job_target(conn, job_id, target_path):
+    conn.execute("UPDATE ingest_jobs SET target_path = ? WHERE job_id = ?", (target_path, job_id))
+    conn.commit()
+
+
+def finish_job(conn, job_id, status, rows=None, error=None):
+    conn.execute('''
+        UPDATE ingest_jobs SET status = ?, rows = ?, error = ?, finished_at = ? WHERE job_id = ?
+    ''', (status, rows, error, time.time(), job_id))
+    conn.commit()
+
+
+# Queue a failed job again (e.g. after fixing its metadata.json)
+def retry_job(conn, job_id):
+    conn.execute("UPDATE ingest_jobs SET status = 'queued', error = NULL WHERE job_id = ? AND status = 'failed'",
+                 (job_id,))
+    conn.commit()
+
+
+# Jobs left running by a worker that stopped (a streamed data file resumes from its last committed chunk)
+def requeue_interrupted_jobs(conn):
+    count = conn.execute("UPDATE ingest_jobs SET status = 'queued' WHERE status = 'running'").rowcount
+    conn.commit()
+    return count
+
+
+# {"worker": running_worker(), "counts": {status: jobs}, "jobs": latest rows of QUERY_JOBS,
+#  "progress": {job_id: rows committed}} for the status panel (empty on a database without the tables)
+def ingest_status(conn, limit=20):
+    try:
+        return {
+            "worker": running_worker(conn),
+            "counts": dict(conn.execute(QUERY_JOB_COUNTS)),
+            "jobs": conn.execute(QUERY_JOBS, (limit,)).fetchall(),
+            "progress": dict(conn.execute(QUERY_RUNNING_PROGRESS)),
+        }
+    except sqlite3.OperationalError:  # database built before the background imports
+        return {"worker": None, "counts": {}, "jobs": [], "progress": {}}
+
+
+# ======================
+# Worker heartbeat
+# ======================
+
+# Take the lease of the worker for pid unless a live worker holds it, returns the pid holding it afterwards
+# The check and the insert run in one write transaction (BEGIN IMMEDIATE): of two processes claiming
+# at the same time, the second one sees the row of the first
+def claim_worker(conn, pid, timeout=WORKER_TIMEOUT_SECONDS):
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if running_worker(conn, timeout) is None:  # stopped without cleaning up its row
+            conn.execute("DELETE FROM ingest_worker WHERE worker_id = 1")
+        now = time.time()
+        conn.execute(QUERY_CLAIM_WORKER, (pid, now, now))
+        holder = conn.execute(QUERY_WORKER).fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return holder
+
+
+def worker_heartbeat(conn, pid):
+    conn.execute("UPDATE ingest_worker SET heartbeat_at = ? WHERE worker_id = 1 AND pid = ?", (time.time(), pid))
+    conn.commit()
+
+
+def worker_stopped(conn, pid):
+    conn.execute("DELETE FROM ingest_worker WHERE worker_id = 1 AND pid = ?", (pid,))
+    conn.commit()
+
+
+# (pid, started_at, heartbeat_at) of the running worker, None if there is none
+# (databases without the table have no worker)
+def running_worker(conn, timeout=WORKER_TIMEOUT_SECONDS):
+    try:
+        row = conn.execute(QUERY_WORKER).fetchone()
+    except sqlite3.OperationalError:  # no ingest_worker table yet
+        return None
+    if row is None or time.time() - row[2] > timeout or not process_alive(row[0]):
+        return None
+    return row
+
+
+# Whether a worker that stopped without cleaning up its row is gone (checked on POSIX only,
+# elsewhere the heartbeat times out)
+def process_alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running under another user
+        return True
+    return True
+
+
+# Start ingest_worker.py in a process of its own (output appended to log_path) and take the lease for it,
+# returns the Popen, or None when another worker holds the lease (the new process is stopped)
+# (two sessions pressing "Start worker" together start a single worker)
+def start_worker_process(database_path=None, drop_folder=DROP_FOLDER, log_path=WORKER_LOG):
+    command = [sys.executable, "-u", WORKER_SCRIPT, "--drop", drop_folder]
+    if database_path:
+        command += ["--database", database_path]
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    conn = connect(database_path)
+    try:
+        holder = claim_worker(conn, process.pid)
+    except sqlite3.OperationalError:  # no ingest_worker table yet: the worker creates it and claims the lease itself
+        holder = process.pid
+    finally:
+        conn.close()
+    if holder != process.pid:
+        process.terminate()
+        process.wait()
+        return None
+    return process
@@ -1,11 +1,16 @@
 # new_experiment.py
-# streamlit interface to create and download a zip with a new experiment
+# streamlit interface to create and download a zip with a new experiment, or add it straight to the database
 import streamlit as st
 import io
 import json
 import zipfile
 from datetime import datetime
 
+from utils.db import DATABASE_PATH, connect
+from utils.archive import save_upload
+from utils.jobs import DROP_FOLDER, enqueue_item, running_worker, start_worker_process
+from utils.catalogs import load_processes, load_presets  # processes.json / presets.json, parsed once
+
 # --- Generic Helper Functions for List Management ---
 def move_item_up(list_name, index):
     items = st.session_state[list_name]
@@ -32,23 +37,9 @@ def insert_item_after(list_name, index):
 def append_item(list_name):
     st.session_state[list_name].append(get_default_step())  # <-- fresh copy here too
 
-# --- Load processes from JSON ---
-@st.cache_data
-def load_processes():
-    with open("utils/processes.json", "r", encoding="utf-8") as f:
-        return json.load(f)
-
-processes = load_processes()
-
-# --- Load presets of processes from JSON ---
-def load_presets():
-    with open("utils/presets.json", "r", encoding="utf-8") as f:
-        return json.load(f)
-
-PREDEFINED_CHAINS = load_presets()
-
 # --- Function to get a default step with first process type and first tag ---
 def get_default_step():
+    processes = load_processes()
     first_process = list(processes.keys())[0] if processes else "Else"
     tags = processes.get(first_process, {}).get("tags", [])
     first_tag = tags[0] if tags else None
@@ -64,6 +55,7 @@ def get_default_step():
 
 # --- Main App ---
 def new_experiment_page():
+    processes = load_processes()
     st.title("Add new Data Set")
     
     # --- Style to center the buttons ---
@@ -97,11 +89,11 @@ def new_experiment_page():
 
     if proc_enabled:
         # Add predefined process chain
-        preset_names = list(PREDEFINED_CHAINS.keys())
+        preset_names = list(load_presets().keys())
         selected_preset = st.selectbox("📦 Add Predefined Process Chain", ["None"] + preset_names)
         if selected_preset != "None":
             if st.button(f"➕ Insert '{selected_preset}' Chain"):
-                for step in PREDEFINED_CHAINS[selected_preset]:
+                for step in load_presets()[selected_preset]:
                     new_step = step.copy()
                     new_step["expanded"] = False
                     st.session_state.proc_steps.append(new_step)
@@ -225,8 +217,16 @@ def new_experiment_page():
 
         st.button("➕ Add Another Image", on_click=append_item, args=("image_files",))
 
-    # --- Generate and Download ZIP ---
-    if st.button("Generate and Download Data ZIP"):
+    # --- Generate and Download ZIP, or add it to the database ---
+    # (the ZIP is dropped in data/incoming and imported as it is by the background worker, see ingest_worker.py)
+    logged_in = st.session_state.get("logged_in", False)
+    col1, col2 = st.columns(2)
+    with col1:
+        generate = st.button("Generate and Download Data ZIP")
+    with col2:
+        ingest = st.button("Add to database", disabled=not logged_in,
+                           help=None if logged_in else "Log in on the Browse page to add experiments")
+    if generate or ingest:
         if not filename_base:
             st.error("Please enter a base filename.")
             return
@@ -265,13 +265,33 @@ def new_experiment_page():
                         zf.writestr(f"{filename_base}_image_{idx+1}.{ext}", img_file.getbuffer())
 
         zip_buffer.seek(0)
-        st.success("ZIP file generated successfully!")
-        st.download_button(
-            label="Download ZIP",
-            data=zip_buffer,
-            file_name=f"{filename_base}.zip",
-            mime="application/zip"
-        )
+        if generate:
+            st.success("ZIP file generated successfully!")
+            st.download_button(
+                label="Download ZIP",
+                data=zip_buffer,
+                file_name=f"{filename_base}.zip",
+                mime="application/zip"
+            )
+        if ingest:
+            # Queued for the background worker (ingest_worker.py): the page does not wait for the import
+            from collect_database import create_database  # the queue tables on a new database
+            archive_path = save_upload(zip_buffer, f"{filename_base}.zip", DROP_FOLDER)
+            conn = connect(DATABASE_PATH)
+            try:
+                create_database(conn)
+                job_id = enqueue_item(conn, archive_path)
+                worker = running_worker(conn)
+            finally:
+                conn.close()
+            if worker is None and start_worker_process(DATABASE_PATH) is not None:
+                st.info("Ingest worker started.")
+            if job_id is None:
+                st.warning(f"{archive_path} is already waiting to be imported.")
+            else:
+                st.success(f"{experiment_name} queued for import (job {job_id}), it will be kept in uploads/.")
+            from utils.utils import ingest_panel  # pandas, only when adding
+            ingest_panel()
 
         # --- Show preview ---
         st.json(metadata)
@@ -0,0 +1,164 @@
+# parser.py
+# reader of the measurement files (.txt): the delimiter is sniffed once per file, then the file is read
+# by the pandas C engine (or pyarrow) straight into float64 columns
+# (the regex separator r'\s+|,' used before forces the much slower python engine)
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Engine of pd.read_csv: "c" or "pyarrow" (needs pyarrow installed, single character delimiters, no chunks)
+PARSER_ENGINE = "c"
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_LINES = 20
+
+# Candidate delimiters, whitespace runs are the fallback
+DELIMITERS = ("\t", ",", ";")
+WHITESPACE = r"\s+"
+
+
+# Pick the delimiter appearing the same (non zero) number of times on every sampled line
+def sniff_delimiter(lines):
+    lines = [line for line in lines if line.strip()][:SNIFF_LINES]
+    for delimiter in DELIMITERS:
+        counts = {line.count(delimiter) for line in lines}
+        if len(counts) == 1 and 0 not in counts:
+            return delimiter
+    return WHITESPACE
+
+
+# Make repeated header names unique the way pandas does: LowerEdge, LowerEdge.1, ...
+def dedupe_names(names):
+    seen = {}
+    unique = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            candidate = f"{name}.{seen[name]}"
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f"{name}.{seen[name]}"
+            name = candidate
+        seen[name] = 0
+        unique.append(name)
+    return unique
+
+
+# First lines of a path or of a seekable (text or binary) file object, which is rewound afterwards
+def read_sample(source):
+    if hasattr(source, "read"):
+        sample = source.read(SNIFF_BYTES)
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            sample = f.read(SNIFF_BYTES)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8", errors="replace")
+    lines = sample.splitlines()
+    if len(sample) == SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # the last line may be cut
+    return lines
+
+
+# Delimiter and (unique) column names of a measurement file
+def sniff_header(source):
+    lines = read_sample(source)
+    delimiter = sniff_delimiter(lines)
+    header = next((line for line in lines if line.strip()), "")
+    names = header.split() if delimiter == WHITESPACE else [name.strip() for name in header.split(delimiter)]
+    return delimiter, dedupe_names(names)
+
+
+# Lines skipped by the C parser: empty or spaces only (tabs too with whitespace delimiters),
+# a line holding only delimiters is a row of NaN
+def blank_line_pattern(delimiter):
+    spaces = rb" \r\t\f\v" if delimiter == WHITESPACE else rb" \r"
+    return re.compile(rb"^[" + spaces + rb"]*$", re.MULTILINE)
+
+
+# Open a measurement file positioned on its data row number `row` (0 = first row after the header)
+# Counts the rows block by block (whole lines only), without parsing them; blank lines are not rows,
+# as for the parser that counted them in ingest_progress
+def open_at_row(path, row, delimiter=WHITESPACE, block_size=1 << 20):
+    blank = blank_line_pattern(delimiter)
+    f = open(path, "rb")
+    for line in f:  # the header is the first non blank line
+        if not blank.fullmatch(line.rstrip(b"\n")):
+            break
+    remaining = row
+    while remaining:
+        start = f.tell()
+        block = f.read(block_size)
+        if not block:
+            break
+        block += f.readline()
+        lines = block.split(b"\n")
+        if lines[-1] == b"":
+            lines.pop()
+        rows = len(lines) - sum(1 for line in lines if blank.fullmatch(line))
+        if rows < remaining:
+            remaining -= rows
+            continue
+        position = 0
+        for line in lines:
+            position += len(line) + 1
+            if not blank.fullmatch(line):
+                remaining -= 1
+                if not remaining:
+                    break
+        f.seek(start + position)
+    return f
+
+
+# float64 columns of a DataFrame read without dtype: non numeric cells become NaN
+def to_float_frame(df):
+    return pd.DataFrame({
+        name: column if column.dtype == np.float64 else pd.to_numeric(column, errors="coerce").astype(np.float64)
+        for name, column in df.items()
+    }, index=df.index, copy=False)
+
+
+# Chunks of a reader read without dtype, converted like the whole file
+def float_chunks(reader, handle=None):
+    try:
+        with reader:
+            for chunk in reader:
+                yield to_float_frame(chunk)
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+# Read a measurement file (path or seekable file object) into a DataFrame of float64 columns
+# chunksize returns an iterator of DataFrames instead (C engine only),
+# start_row skips the first data rows of a file given by path (used to resume a streamed import)
+# Non numeric cells are NaN whatever the path
+def read_measurement_file(source, chunksize=None, engine=None, start_row=0):
+    delimiter, names = sniff_header(source)
+    engine = engine or PARSER_ENGINE
+    if engine == "pyarrow" and (delimiter == WHITESPACE or chunksize):
+        engine = "c"
+
+    kwargs = dict(sep=delimiter, header=0, names=names, engine=engine)
+    if engine == "c":
+        kwargs["skipinitialspace"] = True
+    if start_row:
+        handle = open_at_row(source, start_row, delimiter)
+        kwargs["header"] = None
+        if chunksize is None:
+            with handle:
+                return to_float_frame(pd.read_csv(handle, **kwargs))
+        return float_chunks(pd.read_csv(handle, chunksize=chunksize, **kwargs), handle)
+    if chunksize:
+        # The chunks are parsed lazily: a non numeric cell would only raise while iterating,
+        # so every chunk is read without dtype and converted like the whole file below
+        return float_chunks(pd.read_csv(source, chunksize=chunksize, **kwargs))
+    try:
+        return pd.read_csv(source, dtype=np.float64, **kwargs)
+    except ValueError:
+        # Non numeric cells: read them as they are and turn them into NaN
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return to_float_frame(pd.read_csv(source, **kwargs))
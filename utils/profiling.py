@@ -0,0 +1,139 @@
+# profiling.py
+# lightweight instrumentation of the hot paths: timed spans (loaders, pivot, plot rendering, collector stages)
+# and counters (SQL statements, rows and bytes loaded, cache hits)
+# Nothing is recorded unless a Recorder is active in the current context: the rerun of the app with the
+# "Profile this rerun" toggle of the sidebar, or collect_database.py --profile-log. Without one every instrumented
+# call only pays a context variable lookup
+#
+#   with recording() as recorder:        # activate
+#       with span("pivot"): ...          # time a block
+#   @timed("plot_data")                  # time a function
+#   count(bytes_loaded=n)                # add to counters
+#   event("experiment", rows=n)          # structured record (logs of the ingest runs)
+
+import json
+import time
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("srf_profiling_recorder", default=None)
+
+
+# Spans, counters and events of one rerun / ingest run
+class Recorder:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}          # name -> [calls, total seconds, max seconds]
+        self.counters = Counter()
+        self.events = []
+
+    def add_span(self, name, seconds):
+        calls_total_max = self.spans.setdefault(name, [0, 0.0, 0.0])
+        calls_total_max[0] += 1
+        calls_total_max[1] += seconds
+        calls_total_max[2] = max(calls_total_max[2], seconds)
+
+    # sqlite3 trace callback: one call per statement executed
+    def statement(self, sql):
+        self.counters["queries"] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    # Spans by decreasing total time: [{"name", "calls", "seconds", "max_seconds"}]
+    def span_rows(self):
+        return [{"name": name, "calls": calls, "seconds": total, "max_seconds": longest}
+                for name, (calls, total, longest) in sorted(self.spans.items(), key=lambda item: -item[1][1])]
+
+    # Structured log: the events, then one record per span and the counters
+    def write_log(self, path, **fields):
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.events:
+                f.write(json.dumps(record) + "\n")
+            for record in self.span_rows():
+                f.write(json.dumps({"event": "span", **record}) + "\n")
+            f.write(json.dumps({"event": "run", "seconds": self.elapsed(), **self.counters, **fields}) + "\n")
+
+
+# The recorder of the current context, None when profiling is off
+def active():
+    return _current.get()
+
+
+# Activate a recorder for the code of the with block (and the functions it calls in this thread)
+@contextmanager
+def recording(recorder=None):
+    recorder = recorder or Recorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+# Timed block: with span("pivot"): ...
+class _Span:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.recorder.add_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    recorder = _current.get()
+    return _NO_SPAN if recorder is None else _Span(recorder, name)
+
+
+# Decorator timing every call of a function as a span (named after the function by default)
+def timed(name=None):
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _current.get()
+            if recorder is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.add_span(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(**counters):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.counters.update(counters)
+
+
+def event(name, **fields):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.events.append({"event": name, **fields})
+
+
+# Count the statements of a connection in the recorder (None removes the callback)
+def trace_connection(conn, recorder):
+    conn.set_trace_callback(recorder.statement if recorder is not None else None)
@@ -0,0 +1,274 @@
+# query.py
+# headless access to the SRF database (no streamlit): selection of experiments by metadata, tags, channel statistics
+# and processing history, and bulk export of their data to Parquet / Feather (Arrow IPC) / CSV
+# used by query_database.py and by the loaders of the streamlit interface (utils/utils.py)
+
+import os
+import time
+import importlib.util
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.db import read_connection
+from utils.storage import read_columns, read_eav, iter_column_blocks
+from utils.stats import search_experiments_by_stats, QUERY_BLOCK_COLUMNS, QUERY_EAV_COLUMNS
+from utils.tags import search_experiments_by_tags
+from utils.history import load_history_index, match_pattern
+
+QUERY_EXPERIMENT_COLUMNS = "PRAGMA table_info(experiments)"
+
+# Output formats by file extension, "parquet" and "feather" need pyarrow
+# (CSV is written by pyarrow when installed, about ten times faster than pandas)
+EXPORT_FORMATS = {".parquet": "parquet", ".feather": "feather", ".arrow": "feather", ".csv": "csv"}
+
+# Rows per Parquet row group: the chunks of small experiments are grouped together
+EXPORT_ROW_GROUP_ROWS = 262144
+
+# Experiments read ahead of the writer per export thread
+PREFETCH_PER_THREAD = 2
+
+# Metadata filter written as column=value or column=low..high
+WHERE_RANGE = ".."
+
+
+# Columns of the experiments table and whether they hold numbers: the only names accepted in a filter query
+def experiment_columns(conn):
+    rows = conn.execute(QUERY_EXPERIMENT_COLUMNS).fetchall()
+    return {name: declared_type.upper() in ("INTEGER", "REAL") for _, name, declared_type, *_ in rows}
+
+
+# Parameterized WHERE clause of a filter on one experiments column: equality on value or range on value_range
+def experiment_filter_query(columns, select, column, value=None, value_range=None):
+    if column not in columns:
+        raise ValueError(f"Unknown experiments column '{column}'")
+    query = f'SELECT {select} FROM experiments'
+    if value_range is not None:
+        return query + f' WHERE "{column}" BETWEEN ? AND ?', tuple(value_range)
+    if value is not None:
+        return query + f' WHERE "{column}" = ?', (value,)
+    return query, ()
+
+
+# "lab_name=FNAL" -> ("lab_name", "FNAL", None), "date=2025-01-01..2025-06-30" -> ("date", None, (low, high))
+def parse_where(text):
+    column, separator, value = text.partition("=")
+    if not separator or not column.strip():
+        raise ValueError(f"Invalid filter '{text}', expected column=value or column=low..high")
+    if WHERE_RANGE in value:
+        low, high = value.split(WHERE_RANGE, 1)
+        return column.strip(), None, (low.strip(), high.strip())
+    return column.strip(), value.strip(), None
+
+
+# IDs (sorted) of the experiments matching every given criterion, all the experiments if none is given
+# - where: filters on the experiments table, (column, value, value_range) or "column=value" strings
+# - tags/tag_mode: recipe of processing tags (see utils/tags.py)
+# - stats: conditions on the channel statistics (column_name, stat field, operator, value)
+# - history: processing history pattern (see utils/history.py)
+def select_experiments(conn, where=(), tags=None, tag_mode="any", stats=(), history=None):
+    selected = {row[0] for row in conn.execute("SELECT experiment_id FROM experiments")}
+    columns = experiment_columns(conn) if where else {}
+    for condition in where:
+        column, value, value_range = parse_where(condition) if isinstance(condition, str) else condition
+        query, params = experiment_filter_query(columns, "experiment_id", column, value, value_range)
+        selected &= {row[0] for row in conn.execute(query, params)}
+    if tags:
+        selected &= set(search_experiments_by_tags(conn, tags, tag_mode))
+    if stats:
+        selected &= set(search_experiments_by_stats(conn, stats))
+    if history:
+        experiment_ids, _ = match_pattern(load_history_index(conn), history)
+        selected &= {int(experiment_id) for experiment_id in experiment_ids}
+    return sorted(selected)
+
+
+# Metadata rows of the experiments, in the given order
+def read_experiments(conn, experiment_ids):
+    df = pd.read_sql("SELECT * FROM experiments", conn).set_index("experiment_id", drop=False)
+    return df.loc[[i for i in experiment_ids if i in df.index]].reset_index(drop=True)
+
+
+# Data of an experiment as one DataFrame: columnar blocks, or the legacy long table pivoted to wide format
+def read_experiment_data(conn, experiment_id, columns=None):
+    try:
+        df = read_columns(conn, experiment_id, columns)
+    except sqlite3.OperationalError:  # database built before the columnar layout
+        df = pd.DataFrame()
+    if df.empty:
+        df = read_eav(conn, experiment_id)
+        if columns is not None:
+            df = df[[column for column in columns if column in df.columns]]
+    return df
+
+
+# Data of an experiment in chunks of at most one stored block, in row order
+def iter_experiment_data(conn, experiment_id, columns=None):
+    found = False
+    try:
+        for df in iter_column_blocks(conn, experiment_id, columns):
+            found = True
+            yield df
+    except sqlite3.OperationalError:  # database built before the columnar layout
+        pass
+    if not found:
+        df = read_experiment_data(conn, experiment_id, columns)
+        if not df.empty:
+            yield df
+
+
+# Channels of the experiments (union, in order of first appearance), the columns of an export
+def experiment_channels(conn, experiment_ids, columns=None):
+    channels = {}
+    for experiment_id in experiment_ids:
+        try:
+            names = [name for _, name in conn.execute(QUERY_BLOCK_COLUMNS, (int(experiment_id),))]
+        except sqlite3.OperationalError:  # database built before the columnar layout
+            names = []
+        if not names:
+            names = [name for name, in conn.execute(QUERY_EAV_COLUMNS, (int(experiment_id),))]
+        channels.update(dict.fromkeys(names))
+    if columns is not None:
+        return [column for column in columns if column in channels]
+    return list(channels)
+
+
+def export_format(output_path, fmt=None):
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(output_path)[1].lower())
+    if fmt not in EXPORT_FORMATS.values():
+        raise ValueError(f"Unknown export format of '{output_path}', expected one of {sorted(set(EXPORT_FORMATS.values()))}")
+    return fmt
+
+
+# --- Export writers ---
+# Every chunk is written as rows experiment_id, row_index, <channels> (NaN/null for the channels an experiment lacks)
+# write(experiment_id, row_start, df) appends a chunk, close() finishes the file
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(f"The {fmt} export needs pyarrow (pip install pyarrow), or export to .csv") from None
+    return pyarrow
+
+
+class ArrowWriter:
+    def __init__(self, output_path, fmt, channels):
+        pa = _require_pyarrow(fmt)
+        self.pa = pa
+        self.channels = channels
+        self.schema = pa.schema([("experiment_id", pa.int64()), ("row_index", pa.int64())]
+                                + [(channel, pa.float64()) for channel in channels])
+        self.batches = []
+        self.buffered_rows = 0
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            # Dictionary encoding only pays for experiment_id, the float channels would be tried for nothing
+            self.writer = pq.ParquetWriter(output_path, self.schema, use_dictionary=["experiment_id"])
+            self.row_group_rows = EXPORT_ROW_GROUP_ROWS
+        elif fmt == "csv":
+            import pyarrow.csv as csv
+            self.writer = csv.CSVWriter(output_path, self.schema)
+            self.row_group_rows = 0  # one record batch per chunk
+        else:
+            import pyarrow.ipc as ipc
+            self.writer = ipc.new_file(output_path, self.schema)
+            self.row_group_rows = 0
+
+    def write(self, experiment_id, row_start, df):
+        pa, n_rows = self.pa, len(df)
+        arrays = [pa.array(np.full(n_rows, experiment_id, dtype=np.int64)),
+                  pa.array(np.arange(row_start, row_start + n_rows, dtype=np.int64))]
+        arrays += [pa.array(df[channel].to_numpy()) if channel in df.columns else pa.nulls(n_rows, pa.float64())
+                   for channel in self.channels]
+        self.batches.append(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.buffered_rows += n_rows
+        if self.buffered_rows >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        if len(self.batches) == 1:
+            self.writer.write_batch(self.batches[0])
+        elif self.batches:
+            self.writer.write_table(self.pa.Table.from_batches(self.batches).combine_chunks())
+        self.batches = []
+        self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class CsvWriter:
+    def __init__(self, output_path, channels):
+        self.channels = channels
+        self.file = open(output_path, "w", newline="")
+        self.header = True
+
+    def write(self, experiment_id, row_start, df):
+        df = df.reindex(columns=self.channels)
+        df.insert(0, "row_index", np.arange(row_start, row_start + len(df)))
+        df.insert(0, "experiment_id", experiment_id)
+        df.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+# Chunks of an experiment read on a pooled connection of an export thread
+def read_experiment_chunks(database_path, experiment_id, columns):
+    with read_connection(database_path) as conn:
+        return list(iter_experiment_data(conn, experiment_id, columns))
+
+
+# Chunks of the experiments in order: read on this thread one chunk at a time, or by `threads` threads
+# reading whole experiments ahead of the writer (at most PREFETCH_PER_THREAD per thread)
+def iter_export_chunks(database_path, experiment_ids, columns, threads):
+    if threads <= 1:
+        with read_connection(database_path) as conn:
+            for experiment_id in experiment_ids:
+                for df in iter_experiment_data(conn, experiment_id, columns):
+                    yield experiment_id, df
+        return
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for experiment_id in experiment_ids:
+            pending.append((experiment_id, pool.submit(read_experiment_chunks, database_path, experiment_id, columns)))
+            if len(pending) > threads * PREFETCH_PER_THREAD:
+                ready_id, future = pending.popleft()
+                for df in future.result():
+                    yield ready_id, df
+        for ready_id, future in pending:
+            for df in future.result():
+                yield ready_id, df
+
+
+# Write the data of the experiments to one Parquet / Feather / CSV file, chunk by chunk
+# (never more than the prefetched experiments in memory). Returns a summary of the export
+def export_experiments(database_path, experiment_ids, output_path, fmt=None, columns=None, threads=1):
+    start = time.perf_counter()
+    fmt = export_format(output_path, fmt)
+    with read_connection(database_path) as conn:
+        channels = experiment_channels(conn, experiment_ids, columns)
+    if fmt == "csv" and importlib.util.find_spec("pyarrow") is None:
+        writer = CsvWriter(output_path, channels)
+    else:
+        writer = ArrowWriter(output_path, fmt, channels)
+
+    rows = {}
+    try:
+        for experiment_id, df in iter_export_chunks(database_path, experiment_ids,
+                                                        None if columns is None else channels, threads):
+            row_start = rows.get(experiment_id, 0)
+            writer.write(experiment_id, row_start, df)
+            rows[experiment_id] = row_start + len(df)
+    finally:
+        writer.close()
+
+    return {"experiments": len(rows), "rows": sum(rows.values()), "channels": len(channels),
+            "format": fmt, "bytes": os.path.getsize(output_path), "seconds": time.perf_counter() - start}
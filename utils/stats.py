@@ -0,0 +1,217 @@
+# stats.py
+# per-experiment, per-channel summary statistics of the measurement data (table column_stats)
+# computed once at ingest, read by the browser filters and by the fleet-wide searches
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import FLOAT_DTYPE, column_to_float, QUERY_COLUMN_BLOCKS
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+QUANTILE_FIELDS = ("q05", "q25", "q50", "q75", "q95")
+
+# Statistics of a channel as stored in column_stats (NaN values are only counted in nan_count)
+STAT_FIELDS = ("n_values", "nan_count", "min_value", "max_value", "mean_value", "std_value") + QUANTILE_FIELDS
+
+SEARCH_OPERATORS = ("<", "<=", ">", ">=", "=")
+
+QUERY_COLUMN_STATS = f'''
+    SELECT column_name, {", ".join(STAT_FIELDS)} FROM column_stats
+    WHERE experiment_id = ? ORDER BY column_index
+'''
+
+QUERY_STATS_CHANNELS = "SELECT DISTINCT column_name FROM column_stats ORDER BY column_name"
+
+QUERY_BLOCK_COLUMNS = '''
+    SELECT column_index, column_name FROM data_blocks
+    WHERE experiment_id = ? AND block_index = 0 ORDER BY column_index
+'''
+
+# Long table: aggregates and order statistics of one channel, answered by idx_data_column_value
+QUERY_EAV_COLUMNS = "SELECT DISTINCT column_name FROM data WHERE experiment_id = ? ORDER BY column_name"
+QUERY_EAV_AGGREGATES = '''
+    SELECT COUNT(value), COUNT(*) - COUNT(value), MIN(value), MAX(value), AVG(value) FROM data
+    WHERE experiment_id = ? AND column_name = ?
+'''
+QUERY_EAV_SQUARES = '''
+    SELECT SUM((value - ?) * (value - ?)) FROM data
+    WHERE experiment_id = ? AND column_name = ?
+'''
+QUERY_EAV_ORDER_STATISTIC = '''
+    SELECT value FROM data
+    WHERE experiment_id = ? AND column_name = ? AND value IS NOT NULL
+    ORDER BY value LIMIT 1 OFFSET ?
+'''
+
+# Bits of the float64 keys resolved by each pass of order_statistics (4 passes)
+RADIX_BITS = 16
+
+
+# Statistics row of a channel from its finite values, the number of NaN and a quantile function
+def stats_row(column_index, column_name, n_values, nan_count, low, high, mean, m2, quantile):
+    if n_values == 0:
+        return (column_index, column_name, 0, nan_count) + (None,) * (len(STAT_FIELDS) - 2)
+    std = float(np.sqrt(m2 / (n_values - 1))) if n_values > 1 else None
+    return (column_index, column_name, n_values, nan_count, float(low), float(high), float(mean), std,
+            *(float(quantile(q)) for q in QUANTILES))
+
+
+# Linear interpolation between the order statistics around (n - 1) * q, as np.quantile
+def interpolated_quantile(order_statistic, n_values, q):
+    position = (n_values - 1) * q
+    below = int(np.floor(position))
+    low = order_statistic(below)
+    if position == below:
+        return low
+    return low + (order_statistic(below + 1) - low) * (position - below)
+
+
+# Statistics of every channel of a DataFrame in one vectorized pass per channel:
+# [(column_index, column_name, n_values, nan_count, min, max, mean, std, q05 ... q95)]
+def compute_column_stats(df):
+    stats = []
+    for column_index in range(df.shape[1]):
+        values = column_to_float(df.iloc[:, column_index])
+        finite = values[~np.isnan(values)]
+        n_values = len(finite)
+        mean = finite.mean() if n_values else None
+        m2 = np.square(finite - mean).sum() if n_values else None
+        quantiles = dict(zip(QUANTILES, np.quantile(finite, QUANTILES))) if n_values else {}
+        stats.append(stats_row(column_index, str(df.columns[column_index]), n_values, len(values) - n_values,
+                               finite.min() if n_values else None, finite.max() if n_values else None,
+                               mean, m2, quantiles.get))
+    return stats
+
+
+# Unsigned keys of float64 values sorting in the numeric order of the values
+def sortable_keys(values):
+    bits = np.ascontiguousarray(values, dtype=FLOAT_DTYPE).view(np.uint64)
+    return np.where(bits >> np.uint64(63), ~bits, bits | np.uint64(1 << 63))
+
+
+def keys_to_values(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    bits = np.where(keys >> np.uint64(63), keys & np.uint64((1 << 63) - 1), ~keys)
+    return bits.view(FLOAT_DTYPE)
+
+
+# Exact order statistics (0-based ranks among the finite values) of a channel too large to be held in memory:
+# radix selection on the float keys, each of the 4 passes over read_blocks() resolves RADIX_BITS bits
+def order_statistics(read_blocks, ranks):
+    state = {rank: (0, rank) for rank in ranks}  # rank -> (resolved key prefix, rank among the keys with that prefix)
+    digit_mask = np.uint64((1 << RADIX_BITS) - 1)
+    for shift in range(64 - RADIX_BITS, -1, -RADIX_BITS):
+        prefixes = sorted({prefix for prefix, _ in state.values()})
+        counts = {prefix: np.zeros(1 << RADIX_BITS, dtype=np.int64) for prefix in prefixes}
+        for values in read_blocks():
+            keys = sortable_keys(values[~np.isnan(values)])
+            digits = ((keys >> np.uint64(shift)) & digit_mask).astype(np.intp)
+            top = keys >> np.uint64(shift + RADIX_BITS) if shift + RADIX_BITS < 64 else None
+            for prefix in prefixes:
+                selected = digits if top is None else digits[top == np.uint64(prefix)]
+                counts[prefix] += np.bincount(selected, minlength=1 << RADIX_BITS)
+        for rank, (prefix, within) in state.items():
+            cumulative = np.cumsum(counts[prefix])
+            digit = int(np.searchsorted(cumulative, within, side="right"))
+            state[rank] = ((prefix << RADIX_BITS) | digit, within - (cumulative[digit - 1] if digit else 0))
+    return {rank: float(keys_to_values([prefix])[0]) for rank, (prefix, _) in state.items()}
+
+
+# Statistics of a channel read block by block (only one block in memory)
+def blocks_stats(column_index, column_name, read_blocks):
+    n_values, nan_count, low, high, mean, m2 = 0, 0, np.inf, -np.inf, 0.0, 0.0
+    for values in read_blocks():
+        finite = values[~np.isnan(values)]
+        nan_count += len(values) - len(finite)
+        if not len(finite):
+            continue
+        # Chan et al. update of the running mean and sum of squared deviations
+        block_mean = finite.mean()
+        delta = block_mean - mean
+        total = n_values + len(finite)
+        mean += delta * len(finite) / total
+        m2 += np.square(finite - block_mean).sum() + delta ** 2 * n_values * len(finite) / total
+        n_values = total
+        low, high = min(low, finite.min()), max(high, finite.max())
+
+    ranks = set()
+    for q in QUANTILES:
+        position = (n_values - 1) * q
+        ranks.update({int(np.floor(position)), int(np.ceil(position))})
+    values = order_statistics(read_blocks, sorted(ranks)) if n_values else {}
+    return stats_row(column_index, column_name, n_values, nan_count, low, high, mean, m2,
+                     lambda q: interpolated_quantile(values.get, n_values, q))
+
+
+# Statistics of a channel of the long table, computed by SQLite
+def eav_stats(conn, experiment_id, column_index, column_name):
+    key = (experiment_id, column_name)
+    n_values, nan_count, low, high, mean = conn.execute(QUERY_EAV_AGGREGATES, key).fetchone()
+    m2 = conn.execute(QUERY_EAV_SQUARES, (mean, mean, *key)).fetchone()[0] if n_values else None
+
+    def order_statistic(rank):
+        return conn.execute(QUERY_EAV_ORDER_STATISTIC, (*key, rank)).fetchone()[0]
+
+    return stats_row(column_index, column_name, n_values, nan_count, low, high, mean, m2,
+                     lambda q: interpolated_quantile(order_statistic, n_values, q))
+
+
+# Statistics of the data already stored for an experiment, whatever its size and layout
+# (streamed imports, experiments imported before the statistics existed)
+def stored_column_stats(conn, experiment_id):
+    experiment_id = int(experiment_id)
+    columns = conn.execute(QUERY_BLOCK_COLUMNS, (experiment_id,)).fetchall()
+    if not columns:
+        return [eav_stats(conn, experiment_id, column_index, column_name) for column_index, (column_name,)
+                in enumerate(conn.execute(QUERY_EAV_COLUMNS, (experiment_id,)).fetchall())]
+
+    stats = []
+    for column_index, column_name in columns:
+        def read_blocks():
+            for _, payload in conn.execute(QUERY_COLUMN_BLOCKS, (experiment_id, column_name)):
+                yield np.frombuffer(payload, dtype=FLOAT_DTYPE)
+        stats.append(blocks_stats(column_index, column_name, read_blocks))
+    return stats
+
+
+# Replace the statistics of an experiment
+def write_column_stats(conn, experiment_id, stats):
+    conn.execute("DELETE FROM column_stats WHERE experiment_id = ?", (experiment_id,))
+    conn.executemany(f'''
+        INSERT INTO column_stats (experiment_id, column_index, column_name, {", ".join(STAT_FIELDS)})
+        VALUES ({", ".join("?" * (len(STAT_FIELDS) + 3))})
+    ''', [(experiment_id, *row) for row in stats])
+
+
+# Statistics rows of an experiment as written by write_column_stats (empty if it has none)
+def column_stats_rows(conn, experiment_id):
+    return conn.execute(f'''
+        SELECT column_index, column_name, {", ".join(STAT_FIELDS)} FROM column_stats
+        WHERE experiment_id = ? ORDER BY column_index
+    ''', (int(experiment_id),)).fetchall()
+
+
+# Statistics stored at ingest, one row per channel indexed by column_name
+def read_column_stats(conn, experiment_id):
+    return pd.read_sql(QUERY_COLUMN_STATS, conn, params=(int(experiment_id),), index_col="column_name")
+
+
+# Fleet-wide search: conditions (column_name, stat field, operator, value) combined with AND,
+# e.g. [("QualityFactor", "max_value", ">", 1e10), ("Temp_Diode", "min_value", "<", 2.0)]
+def stats_search_query(conditions):
+    parts = []
+    params = []
+    for column_name, field, operator, value in conditions:
+        if field not in STAT_FIELDS:
+            raise ValueError(f"Unknown statistic '{field}', expected one of {STAT_FIELDS}")
+        if operator not in SEARCH_OPERATORS:
+            raise ValueError(f"Unknown operator '{operator}', expected one of {SEARCH_OPERATORS}")
+        parts.append(f"SELECT experiment_id FROM column_stats WHERE column_name = ? AND {field} {operator} ?")
+        params += [column_name, value]
+    return "\nINTERSECT\n".join(parts), params
+
+
+# IDs of the experiments matching every condition (answered from column_stats alone)
+def search_experiments_by_stats(conn, conditions):
+    query, params = stats_search_query(conditions)
+    return sorted(row[0] for row in conn.execute(query, params))
@@ -0,0 +1,328 @@
+# storage.py
+# storage layouts of the measurement data in the SRF database
+# - "eav": legacy long table data(experiment_id, row_index, column_name, value), one row per cell
+# - "columnar": view data_blocks, every channel packed as little-endian float64 blobs of BLOCK_ROWS rows
+#   The blocks are content-addressed: file_blocks holds the blocks of every distinct data file once, keyed by the
+#   sha256 of the file, experiment_files links each experiment to the content of its data file
+#   (copies of a data file in several experiment folders share their blocks)
+#   block_ranges holds the min/max of every channel in every block (zone maps): the range queries only read the
+#   blocks whose range overlaps the requested one
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from utils.profiling import span
+
+STORAGE_MODES = ("columnar", "eav")
+
+# Rows per stored block: keeps each blob well below the SQLite size limit (1 GB)
+BLOCK_ROWS = 65536
+
+FLOAT_DTYPE = np.dtype("<f8")
+
+# Blocks of the data file of every experiment, read by all the queries below
+CREATE_DATA_BLOCKS_VIEW = '''
+    CREATE VIEW IF NOT EXISTS data_blocks AS
+    SELECT f.experiment_id, b.block_index, b.column_index, b.column_name, b.row_start, b.n_rows, b.payload
+    FROM experiment_files f JOIN file_blocks b ON b.content_hash = f.content_hash
+'''
+
+QUERY_FIND_DATA_FILE = "SELECT experiment_id FROM experiment_files WHERE content_hash = ? LIMIT 1"
+
+
+# Convert a channel to a contiguous float64 array (non numeric values become NaN)
+def column_to_float(series):
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors="coerce")
+    return np.ascontiguousarray(series.to_numpy(dtype=FLOAT_DTYPE, na_value=np.nan))
+
+
+# Pack a DataFrame into column blocks: (block_index, column_index, column_name, row_start, n_rows, payload)
+# row_start/block_start allow appending to the blocks already stored for an experiment
+def encode_blocks(df, row_start=0, block_start=0):
+    arrays = [column_to_float(df.iloc[:, i]) for i in range(df.shape[1])]
+    blocks = []
+    for block_index, offset in enumerate(range(0, len(df), BLOCK_ROWS), start=block_start):
+        for column_index, (column_name, values) in enumerate(zip(df.columns, arrays)):
+            chunk = values[offset:offset + BLOCK_ROWS]
+            blocks.append((block_index, column_index, str(column_name), row_start + offset, len(chunk), chunk.tobytes()))
+    return blocks
+
+
+# (column_name, block_index, min, max) of encoded blocks, NaN ignored (None bounds for a block of NaN only)
+def block_ranges(blocks):
+    rows = []
+    for block_index, _, column_name, _, _, payload in blocks:
+        values = np.frombuffer(payload, dtype=FLOAT_DTYPE)
+        values = values[~np.isnan(values)]
+        low, high = (float(values.min()), float(values.max())) if len(values) else (None, None)
+        rows.append((column_name, block_index, low, high))
+    return rows
+
+
+# Store the blocks of a data file content and their zone maps (blocks already stored for the same content are kept)
+def insert_blocks(conn, content_hash, blocks):
+    conn.executemany('''
+        INSERT OR IGNORE INTO file_blocks (content_hash, block_index, column_index, column_name, row_start, n_rows, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(content_hash, *block) for block in blocks])
+    conn.executemany('''
+        INSERT OR IGNORE INTO block_ranges (content_hash, column_name, block_index, min_value, max_value)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(content_hash, *row) for row in block_ranges(blocks)])
+
+
+# Drop the blocks of a data file content left by an import that did not finish (no experiment refers to them
+# and no streamed import is running on them), before the content is written again: INSERT OR IGNORE would
+# otherwise keep the old blocks next to the new ones
+def drop_partial_blocks(conn, content_hash):
+    for table in ("file_blocks", "block_ranges"):
+        conn.execute(f'''
+            DELETE FROM {table} WHERE content_hash = ?
+              AND content_hash NOT IN (SELECT content_hash FROM experiment_files)
+              AND content_hash NOT IN (SELECT content_hash FROM ingest_progress)
+        ''', (content_hash,))
+
+
+# Write a DataFrame as column blocks of a data file content, returns the number of blocks written
+def write_columns(conn, content_hash, df, row_start=0, block_start=0):
+    blocks = encode_blocks(df, row_start, block_start)
+    insert_blocks(conn, content_hash, blocks)
+    return len({block[0] for block in blocks})
+
+
+# Point an experiment to the stored blocks of its data file
+def link_data_file(conn, experiment_id, content_hash):
+    conn.execute("INSERT OR REPLACE INTO experiment_files (experiment_id, content_hash) VALUES (?, ?)",
+                 (experiment_id, content_hash))
+
+
+# experiment_id of an experiment whose data file has this content (None if the content is not stored)
+def find_data_file(conn, content_hash):
+    row = conn.execute(QUERY_FIND_DATA_FILE, (content_hash,)).fetchone()
+    return row[0] if row else None
+
+
+# Drop the blocks no experiment refers to, except the ones of the streamed imports still running
+# Returns the number of blocks removed
+def prune_file_blocks(conn):
+    removed = conn.execute('''
+        DELETE FROM file_blocks WHERE content_hash NOT IN (
+            SELECT content_hash FROM experiment_files UNION SELECT content_hash FROM ingest_progress
+        )
+    ''').rowcount
+    conn.execute('''
+        DELETE FROM block_ranges WHERE content_hash NOT IN (
+            SELECT content_hash FROM experiment_files UNION SELECT content_hash FROM ingest_progress
+        )
+    ''')
+    return removed
+
+
+QUERY_DATA_BLOCKS = '''
+    SELECT column_index, column_name, payload FROM data_blocks
+    WHERE experiment_id = ? ORDER BY block_index, column_index
+'''
+
+QUERY_EAV = "SELECT * FROM data WHERE experiment_id = ?"
+
+# Same blocks tagged with their block_index, read one block at a time by the bulk export
+QUERY_BLOCKS_IN_ORDER = '''
+    SELECT block_index, column_name, payload FROM data_blocks
+    WHERE experiment_id = ? ORDER BY block_index, column_index
+'''
+
+# Blocks of a single channel, the filtered column of a range query
+QUERY_COLUMN_BLOCKS = '''
+    SELECT block_index, payload FROM data_blocks
+    WHERE experiment_id = ? AND column_name = ? ORDER BY block_index
+'''
+
+QUERY_BLOCK = '''
+    SELECT column_index, column_name, payload FROM data_blocks
+    WHERE experiment_id = ? AND block_index = ? ORDER BY column_index
+'''
+
+# One channel of one block
+QUERY_BLOCK_COLUMN = '''
+    SELECT payload FROM data_blocks
+    WHERE experiment_id = ? AND block_index = ? AND column_name = ?
+'''
+
+QUERY_BLOCK_INDEXES = "SELECT DISTINCT block_index FROM data_blocks WHERE experiment_id = ? ORDER BY block_index"
+
+# Zone maps: blocks of an experiment where a channel has values in [low, high]
+QUERY_BLOCKS_IN_RANGE = '''
+    SELECT r.block_index FROM experiment_files f
+    JOIN block_ranges r ON r.content_hash = f.content_hash
+    WHERE f.experiment_id = ? AND r.column_name = ? AND r.max_value >= ? AND r.min_value <= ?
+'''
+
+# Rows of the long table whose value of one channel is in [low, high]:
+# the inner range is read from idx_data_column_value, the matching rows from idx_data_experiment
+QUERY_EAV_RANGE = '''
+    SELECT row_index, column_name, value FROM data
+    WHERE experiment_id = ? AND row_index IN (
+        SELECT row_index FROM data
+        WHERE experiment_id = ? AND column_name = ? AND value BETWEEN ? AND ?
+    )
+'''
+
+
+# Read the column blocks of an experiment back into a DataFrame (empty if the experiment has none)
+# np.frombuffer wraps the blobs without copying: a single-block channel is not copied at all
+def read_columns(conn, experiment_id, columns=None):
+    query = QUERY_DATA_BLOCKS
+    params = [int(experiment_id)]
+    if columns is not None:
+        query = query.replace("ORDER BY", f"AND column_name IN ({', '.join('?' * len(columns))}) ORDER BY")
+        params += list(columns)
+
+    chunks = {}
+    names = {}
+    for column_index, column_name, payload in conn.execute(query, params):
+        chunks.setdefault(column_index, []).append(np.frombuffer(payload, dtype=FLOAT_DTYPE))
+        names[column_index] = column_name
+
+    data = {
+        names[i]: parts[0] if len(parts) == 1 else np.concatenate(parts)
+        for i, parts in sorted(chunks.items())
+    }
+    return pd.DataFrame(data, copy=False)
+
+
+# Column blocks of an experiment as one DataFrame per block (BLOCK_ROWS rows), in row order:
+# the bulk export reads any experiment with one block in memory
+def iter_column_blocks(conn, experiment_id, columns=None):
+    query = QUERY_BLOCKS_IN_ORDER
+    params = [int(experiment_id)]
+    if columns is not None:
+        query = query.replace("ORDER BY", f"AND column_name IN ({', '.join('?' * len(columns))}) ORDER BY")
+        params += list(columns)
+
+    block = {}
+    current = None
+    for block_index, column_name, payload in conn.execute(query, params):
+        if block_index != current and block:
+            yield pd.DataFrame(block, copy=False)
+            block = {}
+        current = block_index
+        block[column_name] = np.frombuffer(payload, dtype=FLOAT_DTYPE)
+    if block:
+        yield pd.DataFrame(block, copy=False)
+
+
+# Read the legacy long table and pivot it back to wide format
+def read_eav(conn, experiment_id):
+    df = pd.read_sql(QUERY_EAV, conn, params=(int(experiment_id),))
+    with span("pivot"):
+        df_pivoted = df.pivot(index='row_index', columns='column_name', values='value')
+    df_pivoted.reset_index(drop=True, inplace=True)
+    return df_pivoted
+
+
+# Blocks of an experiment that may hold rows with every channel of ranges {column: (low, high)} in its range,
+# from the zone maps (every block of the experiment without ranges or on a database built before the zone maps)
+def candidate_blocks(conn, experiment_id, ranges):
+    experiment_id = int(experiment_id)
+    candidates = None
+    try:
+        for column, (low, high) in ranges.items():
+            blocks = {row[0] for row in conn.execute(QUERY_BLOCKS_IN_RANGE, (experiment_id, column, low, high))}
+            candidates = blocks if candidates is None else candidates & blocks
+    except sqlite3.OperationalError:  # no block_ranges table
+        candidates = None
+    if candidates is None:
+        return [row[0] for row in conn.execute(QUERY_BLOCK_INDEXES, (experiment_id,))]
+    return sorted(candidates)
+
+
+# Rows of the columnar data where every channel of ranges {column: (low, high)} is in its range (late
+# materialization): only the candidate blocks of the zone maps are read, the filtered channels first,
+# the other channels (or the ones of columns) only for the blocks holding a match
+def read_columns_in_ranges(conn, experiment_id, ranges, columns=None):
+    experiment_id = int(experiment_id)
+    hits = {}
+    for block_index in candidate_blocks(conn, experiment_id, ranges):
+        mask = None
+        for column, (low, high) in ranges.items():
+            row = conn.execute(QUERY_BLOCK_COLUMN, (experiment_id, block_index, column)).fetchone()
+            if row is None:
+                mask = None
+                break
+            values = np.frombuffer(row[0], dtype=FLOAT_DTYPE)
+            inside = (values >= low) & (values <= high)
+            mask = inside if mask is None else mask & inside
+            if not mask.any():
+                break
+        if mask is not None and mask.any():
+            hits[block_index] = np.flatnonzero(mask)
+
+    query = QUERY_BLOCK
+    if columns is not None:
+        query = query.replace("ORDER BY", f"AND column_name IN ({', '.join('?' * len(columns))}) ORDER BY")
+    names = {}
+    parts = {}
+    for block_index, positions in hits.items():
+        for column_index, column_name, payload in conn.execute(query, (experiment_id, block_index, *(columns or ()))):
+            names[column_index] = column_name
+            parts.setdefault(column_index, []).append(np.frombuffer(payload, dtype=FLOAT_DTYPE)[positions])
+    if not hits:
+        # No match: an empty frame with the channels of the experiment
+        names = dict(conn.execute('''
+            SELECT column_index, column_name FROM data_blocks WHERE experiment_id = ? AND block_index = 0
+        ''', (experiment_id,)))
+        return pd.DataFrame({names[i]: np.empty(0, dtype=FLOAT_DTYPE) for i in sorted(names)
+                             if columns is None or names[i] in columns})
+    return pd.DataFrame({names[i]: np.concatenate(parts[i]) for i in sorted(parts)}, copy=False)
+
+
+# Rows of the columnar data whose column is in [low, high]
+def read_columns_in_range(conn, experiment_id, column, low, high):
+    return read_columns_in_ranges(conn, experiment_id, {column: (low, high)})
+
+
+# Rows of the legacy long table where every channel of ranges is in its range, pivoted to wide format
+# (the row indexes of each range come from idx_data_column_value, their intersection is read from idx_data_experiment)
+def read_eav_in_ranges(conn, experiment_id, ranges, columns=None):
+    experiment_id = int(experiment_id)
+    matches = " INTERSECT ".join(
+        ["SELECT row_index FROM data WHERE experiment_id = ? AND column_name = ? AND value BETWEEN ? AND ?"] * len(ranges))
+    query = f"SELECT row_index, column_name, value FROM data WHERE experiment_id = ? AND row_index IN ({matches})"
+    params = [experiment_id]
+    for column, (low, high) in ranges.items():
+        params += [experiment_id, column, low, high]
+    if columns is not None:
+        query += f" AND column_name IN ({', '.join('?' * len(columns))})"
+        params += list(columns)
+    df = pd.read_sql(query, conn, params=params)
+    df_pivoted = df.pivot(index='row_index', columns='column_name', values='value')
+    df_pivoted.reset_index(drop=True, inplace=True)
+    df_pivoted.columns.name = None
+    return df_pivoted
+
+
+# Rows of the legacy long table whose column is in [low, high], pivoted to wide format
+def read_eav_in_range(conn, experiment_id, column, low, high):
+    experiment_id = int(experiment_id)
+    df = pd.read_sql(QUERY_EAV_RANGE, conn, params=(experiment_id, experiment_id, column, low, high))
+    df_pivoted = df.pivot(index='row_index', columns='column_name', values='value')
+    df_pivoted.reset_index(drop=True, inplace=True)
+    df_pivoted.columns.name = None
+    return df_pivoted
+
+
+# Rows of an experiment where every channel of ranges {column: (low, high)} is in its range, whatever the layout
+# e.g. {"Temp_Diode": (8.0, 10.0)} for the transition, {"Time": (t0, t1)} for a time window
+def read_rows_in_ranges(conn, experiment_id, ranges, columns=None):
+    columnar = conn.execute("SELECT 1 FROM data_blocks WHERE experiment_id = ? LIMIT 1", (int(experiment_id),)).fetchone()
+    if columnar:
+        return read_columns_in_ranges(conn, experiment_id, ranges, columns)
+    return read_eav_in_ranges(conn, experiment_id, ranges, columns)
+
+
+# Rows of an experiment whose column is in [low, high], whatever the storage layout
+def read_rows_in_range(conn, experiment_id, column, low, high):
+    return read_rows_in_ranges(conn, experiment_id, {column: (low, high)})
@@ -0,0 +1,112 @@
+# tags.py
+# normalized tag model of the processing steps ("recipes"):
+# tags(tag_id, name) with case-insensitive unique names, step_tags(step_id, tag_id, experiment_id, step_index)
+# every recipe query (any of, all of, ordered sequence) is a single SQL statement answered from the indexes
+
+RECIPE_MODES = ("any", "all", "sequence")
+RECIPE_LABELS = {"any": "Any of", "all": "All of", "sequence": "In this order"}
+
+TAG_SEPARATOR = ","
+
+# Tags in use by at least one processing step
+QUERY_ALL_TAGS = '''
+    SELECT name FROM tags
+    WHERE tag_id IN (SELECT tag_id FROM step_tags)
+    ORDER BY name
+'''
+
+QUERY_STEP_TAGS = "SELECT step_index, tags FROM processing_steps WHERE experiment_id = ?"
+
+
+# Tag names of a processing step: "tags" (or "tag", as written by the Create page) is a string of
+# comma separated tags or a list of them
+def split_tags(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(TAG_SEPARATOR)
+    names = []
+    for name in (str(item).strip() for item in value):
+        if name and name.casefold() not in {n.casefold() for n in names}:
+            names.append(name)
+    return names
+
+
+# Value stored in processing_steps.tags for the metadata of a step
+def step_tags_text(step):
+    names = split_tags(step.get('tags', step.get('tag')))
+    return f"{TAG_SEPARATOR} ".join(names) if names else None
+
+
+# Fill tags/step_tags from processing_steps.tags for the steps of an experiment
+def index_step_tags(conn, experiment_id):
+    rows = [(step_index, name) for step_index, text in conn.execute(QUERY_STEP_TAGS, (experiment_id,))
+            for name in split_tags(text)]
+    conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for _, name in rows])
+    conn.executemany('''
+        INSERT OR IGNORE INTO step_tags (step_id, tag_id, experiment_id, step_index)
+        SELECT p.step_id, t.tag_id, p.experiment_id, p.step_index
+        FROM processing_steps p, tags t
+        WHERE p.experiment_id = ? AND p.step_index = ? AND t.name = ?
+    ''', [(experiment_id, step_index, name) for step_index, name in rows])
+
+
+# Tag names without case-insensitive duplicates, in the given order
+def unique_tags(tags):
+    return split_tags(list(tags))
+
+
+# Single statement returning the experiment_id of the experiments whose steps have
+# - "any": at least one of the tags
+# - "all": every tag (on any steps)
+# - "sequence": every tag on steps in this order (not necessarily consecutive), e.g. ["EP", "lowT"]
+def recipe_query(tags, mode="any"):
+    tags = list(tags) if mode == "sequence" else unique_tags(tags)
+    if not tags:
+        raise ValueError("A recipe query needs at least one tag")
+    placeholders = ", ".join("?" * len(tags))
+
+    if mode == "any":
+        return f'''
+            SELECT DISTINCT s.experiment_id FROM step_tags s
+            WHERE s.tag_id IN (SELECT tag_id FROM tags WHERE name IN ({placeholders}))
+            ORDER BY s.experiment_id
+        ''', tags
+    if mode == "all":
+        return f'''
+            SELECT s.experiment_id FROM step_tags s
+            WHERE s.tag_id IN (SELECT tag_id FROM tags WHERE name IN ({placeholders}))
+            GROUP BY s.experiment_id HAVING COUNT(DISTINCT s.tag_id) = ?
+            ORDER BY s.experiment_id
+        ''', tags + [len(tags)]
+    if mode == "sequence":
+        # Greedy subsequence match: the first step with the first tag, then the first later step with the next tag...
+        # c{i} holds the step matched for the i-th tag, each one is a seek in idx_step_tags_tag
+        chain = ['''
+            c1 AS (
+                SELECT experiment_id, MIN(step_index) AS step_index FROM step_tags
+                WHERE tag_id = (SELECT tag_id FROM tags WHERE name = ?)
+                GROUP BY experiment_id
+            )''']
+        for i in range(2, len(tags) + 1):
+            chain.append(f'''
+            c{i} AS (
+                SELECT c{i - 1}.experiment_id, (
+                    SELECT MIN(s.step_index) FROM step_tags s
+                    WHERE s.tag_id = (SELECT tag_id FROM tags WHERE name = ?)
+                        AND s.experiment_id = c{i - 1}.experiment_id AND s.step_index > c{i - 1}.step_index
+                ) AS step_index
+                FROM c{i - 1} WHERE c{i - 1}.step_index IS NOT NULL
+            )''')
+        return f'''
+            WITH{",".join(chain)}
+            SELECT experiment_id FROM c{len(tags)} WHERE step_index IS NOT NULL
+            ORDER BY experiment_id
+        ''', tags
+    raise ValueError(f"Unknown recipe mode '{mode}', expected one of {RECIPE_MODES}")
+
+
+# experiment_id of the experiments matching a recipe
+def search_experiments_by_tags(conn, tags, mode="any"):
+    query, params = recipe_query(tags, mode)
+    return [row[0] for row in conn.execute(query, params)]
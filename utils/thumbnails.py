@@ -0,0 +1,132 @@
+# thumbnails.py
+# thumbnail cache of the images attached to the experiments (plots table)
+# - thumbnails(content_hash, size): one WebP image per source file content and fixed size, shared by identical files
+# - made on first request (or for all the images at once with collect_database.py --thumbnails, after the data
+#   is committed), evicted least recently used above a byte budget
+# The gallery shows the thumbnails, the full resolution file is only read on demand
+
+import io
+import time
+import zipfile
+
+from utils.archive import open_stored_file
+
+# Longest side in pixels: grid of the gallery, preview of the selected image
+THUMBNAIL_SIZES = (256, 768)
+GRID_SIZE, PREVIEW_SIZE = THUMBNAIL_SIZES
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_METHOD = 1  # WebP encoder effort (0-6): several times faster than the default 4, somewhat larger files
+
+# Total size of the stored thumbnails, the least recently used ones are dropped above it
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 2**20
+
+# Images of an experiment with the thumbnail of one size (NULL payload when not made yet or evicted)
+QUERY_PLOT_THUMBNAILS = '''
+    SELECT p.plot_id, p.file_path, p.caption, p.content_hash, t.payload FROM plots p
+    LEFT JOIN thumbnails t ON t.content_hash = p.content_hash AND t.size = ?
+    WHERE p.experiment_id = ?
+    ORDER BY p.plot_id
+'''
+
+
+# One image file per content without all its thumbnails
+QUERY_MISSING_THUMBNAILS = '''
+    SELECT MIN(p.file_path), p.content_hash FROM plots p
+    WHERE p.content_hash IS NOT NULL
+      AND (SELECT COUNT(*) FROM thumbnails t WHERE t.content_hash = p.content_hash) < ?
+    GROUP BY p.content_hash
+'''
+
+
+# Encoded thumbnails of an image file (or archive member), {size: (width, height, payload)}
+# The sizes are made from the largest down, each one resampled from the previous one
+def make_thumbnails(file_path, sizes=THUMBNAIL_SIZES):
+    from PIL import Image  # only the processes making thumbnails pay for Pillow
+    thumbnails = {}
+    with open_stored_file(file_path) as f, Image.open(f) as image:
+        image.draft("RGB", (max(sizes), max(sizes)))  # JPEG: decode at a reduced scale
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        if image.mode == "RGBA" and image.getchannel("A").getextrema()[0] == 255:
+            image = image.convert("RGB")  # opaque plots (matplotlib) encode faster without alpha
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, method=THUMBNAIL_METHOD)
+            thumbnails[size] = (image.width, image.height, buffer.getvalue())
+    return thumbnails
+
+
+# Thumbnail rows (content_hash, size, width, height, payload) of the images of a folder, [(file_path, content_hash)]
+# Unreadable images are skipped: the gallery falls back to the file
+def folder_thumbnails(images):
+    rows = []
+    for file_path, content_hash in images:
+        try:
+            thumbnails = make_thumbnails(file_path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"No thumbnail for {file_path}: {e}")
+            continue
+        rows += [(content_hash, size, *thumbnail) for size, thumbnail in thumbnails.items()]
+    return rows
+
+
+# Store thumbnails (already stored contents are kept), then apply the byte budget
+def write_thumbnails(conn, rows, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    now = time.time()
+    conn.executemany('''
+        INSERT OR IGNORE INTO thumbnails (content_hash, size, width, height, bytes, last_used, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(content_hash, size, width, height, len(payload), now, payload)
+          for content_hash, size, width, height, payload in rows])
+    evict_thumbnails(conn, max_bytes)
+
+
+# Mark thumbnails as used by the gallery, [(content_hash, size)]
+def touch_thumbnails(conn, keys):
+    conn.executemany("UPDATE thumbnails SET last_used = ? WHERE content_hash = ? AND size = ?",
+                     [(time.time(), content_hash, size) for content_hash, size in keys])
+
+
+# Drop the thumbnails of contents no image refers to any more, then the least recently used ones above max_bytes
+# Returns the number of thumbnails removed
+def evict_thumbnails(conn, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    removed = conn.execute(
+        "DELETE FROM thumbnails WHERE content_hash NOT IN (SELECT content_hash FROM plots WHERE content_hash IS NOT NULL)"
+    ).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM thumbnails").fetchone()[0]
+    if total <= max_bytes:
+        return removed
+    evicted = []
+    for content_hash, size, n_bytes in conn.execute(
+            "SELECT content_hash, size, bytes FROM thumbnails ORDER BY last_used, content_hash, size"):
+        if total <= max_bytes:
+            break
+        evicted.append((content_hash, size))
+        total -= n_bytes
+    conn.executemany("DELETE FROM thumbnails WHERE content_hash = ? AND size = ?", evicted)
+    return removed + len(evicted)
+
+
+# (plot_id, file_path, caption, payload) of the images of an experiment at one thumbnail size
+# Missing thumbnails are made from the files and stored (first request, or evicted); payload is None if the
+# file cannot be read. The caller commits.
+def experiment_thumbnails(conn, experiment_id, size=GRID_SIZE):
+    rows = conn.execute(QUERY_PLOT_THUMBNAILS, (size, int(experiment_id))).fetchall()
+    missing = {(file_path, content_hash) for _, file_path, _, content_hash, payload in rows
+               if payload is None and content_hash is not None}
+    if missing:
+        write_thumbnails(conn, folder_thumbnails(sorted(missing)))
+        rows = conn.execute(QUERY_PLOT_THUMBNAILS, (size, int(experiment_id))).fetchall()
+    touch_thumbnails(conn, {(content_hash, size) for _, _, _, content_hash, payload in rows if payload is not None})
+    return [(plot_id, file_path, caption, payload) for plot_id, file_path, caption, _, payload in rows]
+
+
+# Make the thumbnails of every image missing them, one image at a time, committing after each
+# (collect_database.py --thumbnails: warms the cache after the data is committed). Returns the images done
+def build_missing_thumbnails(conn, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    images = conn.execute(QUERY_MISSING_THUMBNAILS, (len(THUMBNAIL_SIZES),)).fetchall()
+    for image in images:
+        write_thumbnails(conn, folder_thumbnails([image]), max_bytes)
+        conn.commit()
+    return len(images)
@@ -3,17 +3,168 @@
 
 import streamlit as st
 import sqlite3
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+from utils.db import DATABASE_PATH, connect, read_connection
+from utils.storage import (read_rows_in_range, read_rows_in_ranges,
+                           QUERY_DATA_BLOCKS, QUERY_EAV, QUERY_COLUMN_BLOCKS, QUERY_BLOCK, QUERY_EAV_RANGE,
+                           QUERY_BLOCK_COLUMN, QUERY_BLOCKS_IN_RANGE)
+from utils.stats import (STAT_FIELDS, SEARCH_OPERATORS, compute_column_stats, read_column_stats, stats_search_query,
+                         search_experiments_by_stats, QUERY_COLUMN_STATS, QUERY_STATS_CHANNELS)
+from utils.tags import RECIPE_MODES, RECIPE_LABELS, recipe_query, search_experiments_by_tags, QUERY_ALL_TAGS
+from utils.history import PATTERN_EXAMPLE, QUERY_HISTORY, load_history_index, match_pattern, rank_by_similarity
+from utils.query import read_experiment_data, experiment_columns, experiment_filter_query as filter_query
+from utils.archive import stored_file_exists, open_stored_file
+from utils.thumbnails import GRID_SIZE, PREVIEW_SIZE, QUERY_PLOT_THUMBNAILS, experiment_thumbnails
+from utils.downsample import downsample, DOWNSAMPLE_METHODS, DOWNSAMPLE_LABELS, DEFAULT_POINTS
+from utils.compare import (RESAMPLE_METHODS, RESAMPLE_LABELS, GRID_SPANS, X_ALIGNMENTS, DEFAULT_GRID_POINTS,
+                           QUERY_FLEET_CHANNEL_BLOCKS, QUERY_FLEET_CHANNEL_EAV,
+                           compare_experiments, band_statistics, reference_difference)
+from utils.derived import (DERIVED_LABELS, QUERY_SOURCE_HASH, QUERY_DERIVED, QUERY_DERIVED_COLUMNS,
+                           available_quantities, derived_quantity)
+from utils.jobs import (DROP_FOLDER, QUERY_JOBS, QUERY_JOB_COUNTS, QUERY_RUNNING_PROGRESS, QUERY_WORKER, JOB_STATES,
+                        ingest_status, retry_job, start_worker_process)
+from utils.profiling import active, span, timed, count
 
 # Define simple user credentials
 USER_CREDENTIALS = {
     "lasa": "2025"
 }
 
+# Thumbnails per row of the image gallery
+GALLERY_COLUMNS = 3
+
+# Background imports: seconds between two refreshes of the status panel and jobs listed
+INGEST_REFRESH_SECONDS = 2
+INGEST_JOBS_SHOWN = 20
+
+# SQL issued by the browser pages
+QUERY_EXPERIMENTS = "SELECT * FROM experiments"
+QUERY_PLOTS = "SELECT * FROM plots WHERE experiment_id = ?"
+QUERY_PROCESSING_STEPS = "SELECT * FROM processing_steps WHERE experiment_id = ? ORDER BY step_index ASC"
+
+# Every query of the UI with example parameters and whether a full scan is expected,
+# checked by utils/explain_queries.py (python -m utils.explain_queries)
+UI_QUERIES = {
+    "experiments": (QUERY_EXPERIMENTS, (), True),               # lists the whole (small) table
+    "data_blocks": (QUERY_DATA_BLOCKS, (1,), False),
+    "data_eav": (QUERY_EAV, (1,), False),
+    "plots": (QUERY_PLOTS, (1,), False),
+    "plot_thumbnails": (QUERY_PLOT_THUMBNAILS, (GRID_SIZE, 1), False),
+    "processing_steps": (QUERY_PROCESSING_STEPS, (1,), False),
+    "all_tags": (QUERY_ALL_TAGS, (), True),                      # lists the whole (small) tags table
+    "recipe_any": (*recipe_query(["EP", "lowT"], "any"), False),
+    "recipe_all": (*recipe_query(["EP", "lowT"], "all"), False),
+    "recipe_sequence": (*recipe_query(["EP", "lowT", "midT"], "sequence"), False),
+    "column_stats": (QUERY_COLUMN_STATS, (1,), False),
+    "column_blocks": (QUERY_COLUMN_BLOCKS, (1, "Temp_Diode"), False),
+    "block": (QUERY_BLOCK, (1, 0), False),
+    "block_column": (QUERY_BLOCK_COLUMN, (1, 0, "Temp_Diode"), False),
+    "blocks_in_range": (QUERY_BLOCKS_IN_RANGE, (1, "Temp_Diode", 8.0, 10.0), False),
+    "data_eav_range": (QUERY_EAV_RANGE, (1, 1, "Temp_Diode", 1.8, 2.2), False),
+    "fleet_channel_blocks": (QUERY_FLEET_CHANNEL_BLOCKS.format(experiments="?, ?"), (1, 2, "Temp_Diode", "QualityFactor"), False),
+    "fleet_channel_eav": (QUERY_FLEET_CHANNEL_EAV.format(experiments="?, ?"), (1, 2, "Temp_Diode", "QualityFactor"), False),
+    "source_hash": (QUERY_SOURCE_HASH, (1, 1), False),
+    "derived": (QUERY_DERIVED, ("0" * 64,), False),
+    "derived_columns": (QUERY_DERIVED_COLUMNS, ("0" * 64,), False),
+    "ingest_jobs": (QUERY_JOBS, (INGEST_JOBS_SHOWN,), True),     # small table, newest first by rowid
+    "ingest_job_counts": (QUERY_JOB_COUNTS, (), True),           # scan of idx_ingest_jobs_status
+    "ingest_running": (QUERY_RUNNING_PROGRESS, (), False),
+    "ingest_worker": (QUERY_WORKER, (), False),
+    "history": (QUERY_HISTORY, (), True),                        # encodes every history once per generation
+    "stats_channels": (QUERY_STATS_CHANNELS, (), True),          # scan of idx_column_stats_name
+    "stats_search": (*stats_search_query([("QualityFactor", "max_value", ">", 1e10), ("Temp_Diode", "min_value", "<", 2.0)]), False),
+    "experiments_filter": ('SELECT experiment_id FROM experiments WHERE "lab_name" = ?', ("FNAL",), True),  # small table
+}
+
+# A new tuned connection (the caller closes it), the loaders borrow pooled ones through read_connection()
 def get_db_connection():
-    return sqlite3.connect(os.path.join("data", "srf_database.db"))
+    return connect(DATABASE_PATH)
+
+# Generation counter bumped by collect_database.py at every change of the database
+# (databases without the counter fall back to the file modification time)
+def get_db_generation():
+    with read_connection() as conn:
+        try:
+            return conn.execute("SELECT generation FROM db_generation").fetchone()[0]
+        except sqlite3.OperationalError:
+            return os.path.getmtime(DATABASE_PATH)
+
+# --- Loader cache ---
+# Shared by all the sessions of the streamlit server, bounded both in entries and in bytes (LRU eviction).
+# Entries are keyed by the database generation: the whole cache is dropped when the collector changes the database.
+# Cached objects are shared, callers must not modify them in place.
+LOADER_CACHE_MAX_ENTRIES = 64
+LOADER_CACHE_MAX_BYTES = 512 * 2**20
+
+_loader_cache = OrderedDict()
+_loader_cache_state = {"generation": None, "bytes": 0}
+_loader_cache_lock = threading.Lock()
+
+def _cache_entry_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())  # deep: counts the bytes of the thumbnails
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):  # e.g. the resampled arrays of a comparison
+        return sys.getsizeof(value) + sum(_cache_entry_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+def clear_loader_cache():
+    with _loader_cache_lock:
+        _loader_cache.clear()
+        _loader_cache_state["bytes"] = 0
+
+def cached_loader(func):
+    # (value, size of the new entry or None on a cache hit)
+    def lookup(args):
+        generation = get_db_generation()
+        key = (func.__name__, *args)
+        with _loader_cache_lock:
+            if _loader_cache_state["generation"] != generation:
+                _loader_cache.clear()
+                _loader_cache_state.update(generation=generation, bytes=0)
+            if key in _loader_cache:
+                _loader_cache.move_to_end(key)
+                return _loader_cache[key][0], None
+
+        value = func(*args)
+        size = _cache_entry_size(value)
+        with _loader_cache_lock:
+            if _loader_cache_state["generation"] == generation and key not in _loader_cache:
+                _loader_cache[key] = (value, size)
+                _loader_cache_state["bytes"] += size
+                while _loader_cache and (len(_loader_cache) > LOADER_CACHE_MAX_ENTRIES
+                                         or _loader_cache_state["bytes"] > LOADER_CACHE_MAX_BYTES):
+                    _, (_, evicted_size) = _loader_cache.popitem(last=False)
+                    _loader_cache_state["bytes"] -= evicted_size
+        return value, size
+
+    # Timed as a span of the profiler with the cache hits/misses and the rows and bytes loaded (when profiling)
+    @functools.wraps(func)
+    def wrapper(*args):
+        recorder = active()
+        if recorder is None:
+            return lookup(args)[0]
+        start = time.perf_counter()
+        value, size = lookup(args)
+        recorder.add_span(func.__name__, time.perf_counter() - start)
+        if size is None:
+            recorder.counters["cache_hits"] += 1
+        else:
+            recorder.counters.update(cache_misses=1, rows_loaded=len(value) if hasattr(value, "__len__") else 1,
+                                     bytes_loaded=size)
+        return value
+
+    wrapper.uncached = func
+    return wrapper
 
 # Function to handle user login
 def login():
@@ -40,62 +191,418 @@ def login():
     return False
 
 # Load experiments metadata from the database
+@cached_loader
 def load_experiments():
-    conn = get_db_connection()
-    query = "SELECT * FROM experiments"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    with read_connection() as conn:
+        return pd.read_sql(QUERY_EXPERIMENTS, conn)
 
 # Load data for a specific experiment
+# Columnar blocks are read straight into a DataFrame, the legacy long table is pivoted to wide format
+@cached_loader
 def load_data_for_experiment(experiment_id):
-    conn = get_db_connection()
-    query = f"SELECT * FROM data WHERE experiment_id = {experiment_id}"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    
-    # Pivot to restore wide format
-    df_pivoted = df.pivot(index='row_index', columns='column_name', values='value')
-    df_pivoted.reset_index(drop=True, inplace=True)
-    return df_pivoted
+    with read_connection() as conn:
+        return read_experiment_data(conn, experiment_id)
 
 # Load plots for a specific experiment
+@cached_loader
 def load_plots_for_experiment(experiment_id):
+    with read_connection() as conn:
+        return pd.read_sql(QUERY_PLOTS, conn, params=(int(experiment_id),))
+
+# Thumbnails of the plots of an experiment at one of the sizes of utils/thumbnails.py
+# (made and stored on first request when missing), payload None when the file cannot be read
+# Written through a connection of its own (missing thumbnails, last use): the pooled ones only read
+@cached_loader
+def load_plot_thumbnails(experiment_id, size=GRID_SIZE):
     conn = get_db_connection()
-    query = f"SELECT * FROM plots WHERE experiment_id = {experiment_id}"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    try:
+        rows = experiment_thumbnails(conn, experiment_id, size)
+        conn.commit()
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=["plot_id", "file_path", "caption", "payload"])
 
 # Load processing steps for a specific experiment, ordered by step index
+@cached_loader
 def load_processing_steps_for_experiment(experiment_id):
-    conn = get_db_connection()
-    query = f"SELECT * FROM processing_steps WHERE experiment_id = {experiment_id} ORDER BY step_index ASC"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    with read_connection() as conn:
+        return pd.read_sql(QUERY_PROCESSING_STEPS, conn, params=(int(experiment_id),))
 
-# Get experiment IDs where processing steps contain a specific tag
-def get_experiments_by_processing_tag(tag):
-    conn = get_db_connection()
-    query = """
-        SELECT DISTINCT experiment_id
-        FROM processing_steps
-        WHERE tags LIKE ?
-    """
-    df = pd.read_sql(query, conn, params=(f"%{tag}%",))
-    conn.close()
-    return df['experiment_id'].tolist()
-
-# Get all distinct processing tags from the processing_steps table
+# Get experiment IDs whose processing steps match a recipe: any/all of the tags or the tags in this order
+@cached_loader
+def get_experiments_by_processing_tags(tags, mode="any"):
+    with read_connection() as conn:
+        return search_experiments_by_tags(conn, tags, mode)
+
+# Get all the processing tags in use (exact, case-insensitive names from the tags table)
+@cached_loader
 def get_all_processing_tags():
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(QUERY_ALL_TAGS)]
+
+# Columns of the experiments table and whether they hold numbers: the only names accepted in a filter query
+@cached_loader
+def get_experiment_columns():
+    with read_connection() as conn:
+        return experiment_columns(conn)
+
+# Parameterized WHERE clause of a filter on one experiments column: equality on value or range on value_range
+def experiment_filter_query(select, column, value=None, value_range=None):
+    return filter_query(get_experiment_columns(), select, column, value, value_range)
+
+# Distinct values of an experiments column
+@cached_loader
+def get_experiment_column_values(column):
+    query, params = experiment_filter_query(f'DISTINCT "{column}"', column)
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(query + f' ORDER BY "{column}"', params)]
+
+# (min, max) of a numeric experiments column
+@cached_loader
+def get_experiment_column_range(column):
+    query, params = experiment_filter_query(f'MIN("{column}"), MAX("{column}")', column)
+    with read_connection() as conn:
+        return conn.execute(query, params).fetchone()
+
+# IDs of the experiments matching a filter
+@cached_loader
+def get_filtered_experiment_ids(column, value=None, value_range=None):
+    query, params = experiment_filter_query("experiment_id", column, value, value_range)
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(query, params)]
+
+# Per-channel count/min/max of an experiment, stored at ingest (computed from the data on older databases)
+@cached_loader
+def load_column_stats(experiment_id):
+    with read_connection() as conn:
+        try:
+            return read_column_stats(conn, experiment_id)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):  # database built before column_stats
+            pass
+    df = load_data_for_experiment(experiment_id)
+    stats = compute_column_stats(df)
+    return pd.DataFrame([row[2:] for row in stats], columns=list(STAT_FIELDS),
+                        index=pd.Index([row[1] for row in stats], name="column_name"))
+
+# Channels having statistics in at least one experiment
+@cached_loader
+def get_stats_channels():
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(QUERY_STATS_CHANNELS)]
+
+# Experiments whose channel statistics match every condition (column_name, stat, operator, value)
+@cached_loader
+def get_experiments_by_stats(conditions):
+    with read_connection() as conn:
+        return search_experiments_by_stats(conn, conditions)
+
+# Rows of an experiment whose column is in [low, high], the other rows never leave the database
+@cached_loader
+def load_data_in_range(experiment_id, column, low, high):
+    with read_connection() as conn:
+        return read_rows_in_range(conn, experiment_id, column, low, high)
+
+# Rows of an experiment where every channel is in its range, ranges is a tuple of (column, low, high)
+# (only the blocks whose zone maps overlap all the ranges are read)
+@cached_loader
+def load_data_in_ranges(experiment_id, ranges):
+    with read_connection() as conn:
+        return read_rows_in_ranges(conn, experiment_id, {column: (low, high) for column, low, high in ranges})
+
+# Channels x_column/y_column of several experiments resampled onto a common grid (see utils/compare.py),
+# read with a single query
+@cached_loader
+def load_comparison(experiment_ids, x_column, y_column, n_points=DEFAULT_GRID_POINTS, method="interp",
+                    span="common", align="none", log_x=False):
+    with read_connection() as conn:
+        return compare_experiments(conn, experiment_ids, x_column, y_column, n_points, method, span, align, log_x)
+
+# Derived quantity of an experiment (see utils/derived.py), {"data": DataFrame, "params": dict} or None:
+# read back when its inputs did not change, otherwise computed from the stored channels and stored
+# (a connection of its own: the pooled ones only read)
+@cached_loader
+def load_derived_quantity(experiment_id, name):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT tags FROM processing_steps")
-    rows = cursor.fetchall()
-    conn.close()
-    # Filter out None or empty tags and sort
-    return sorted(tag[0] for tag in rows if tag[0])
+    try:
+        result = derived_quantity(conn, experiment_id, name)
+        conn.commit()
+    finally:
+        conn.close()
+    return result
+
+# Encoded processing histories of all the experiments (see utils/history.py)
+@cached_loader
+def get_history_index():
+    with read_connection() as conn:
+        return load_history_index(conn)
+
+# Experiments whose processing history matches a pattern, e.g. "EP -> baking(lowT, T=100..140, h>=24) -> HPR"
+# DataFrame experiment_id + step_index of the matched steps
+@cached_loader
+def get_experiments_by_history(pattern):
+    experiment_ids, steps = match_pattern(get_history_index(), pattern)
+    df = pd.DataFrame({"experiment_id": experiment_ids})
+    df["matched_steps"] = [" → ".join(str(step) for step in row) for row in steps]
+    return df
+
+# Experiments ordered by the edit distance of their processing history to the one of the reference
+@cached_loader
+def get_experiments_by_history_similarity(reference_id):
+    experiment_ids, distances = rank_by_similarity(get_history_index(), reference_id)
+    return pd.DataFrame({"experiment_id": experiment_ids, "history_distance": distances})
+
+# Filter (pattern) or rank (similarity) the experiments by their processing history
+def history_search(df):
+    mode = st.radio("Search", ["Pattern", "Similar to"], horizontal=True, key="history_mode")
+    if mode == "Pattern":
+        pattern = st.text_input("History pattern (later steps may come in between)", placeholder=PATTERN_EXAMPLE,
+                                help="Steps separated by '->': a process type or tag, '*' for any step, "
+                                     "optionally with tags and ranges in brackets, e.g. baking(lowT, T=100..140, h>=24)")
+        if not pattern.strip():
+            st.info("No pattern entered.")
+            return df
+        try:
+            matched = get_experiments_by_history(pattern.strip())
+        except ValueError as error:
+            st.error(str(error))
+            return df
+        return df.merge(matched, on="experiment_id")
+
+    with_steps = df[df['experiment_id'].isin(get_history_index()["experiment_ids"])]
+    if with_steps.empty:
+        st.info("No experiments with processing steps.")
+        return df
+    reference = st.selectbox("Reference experiment", with_steps['experiment_name'], key="history_reference")
+    reference_id = int(with_steps[with_steps['experiment_name'] == reference]['experiment_id'].iloc[0])
+    ranked = get_experiments_by_history_similarity(reference_id)
+    return df.merge(ranked, on="experiment_id").sort_values("history_distance", kind="stable")
+
+# Conditions on the per-channel statistics of the experiments, e.g. max QualityFactor > 1e10 and min Temp_Diode < 2
+def stats_conditions():
+    channels = get_stats_channels()
+    n_conditions = st.number_input("Number of conditions", min_value=1, max_value=10, value=1, key="n_stats_conditions")
+    conditions = []
+    for i in range(int(n_conditions)):
+        cols = st.columns(4)
+        column_name = cols[0].selectbox("Channel", channels, key=f"stats_channel_{i}")
+        field = cols[1].selectbox("Statistic", STAT_FIELDS, index=STAT_FIELDS.index("max_value"), key=f"stats_field_{i}")
+        operator = cols[2].selectbox("Operator", SEARCH_OPERATORS, index=SEARCH_OPERATORS.index(">"), key=f"stats_operator_{i}")
+        value = cols[3].number_input("Value", value=0.0, format="%g", key=f"stats_value_{i}")
+        conditions.append((column_name, field, operator, float(value)))
+    return tuple(conditions)
+
+# Gallery of the plots of an experiment: a grid of thumbnails, the selected plot as a preview
+# and its full resolution file only on demand
+@timed()
+def plot_gallery(experiment_id):
+    thumbnails_df = load_plot_thumbnails(experiment_id, GRID_SIZE)
+    columns = st.columns(GALLERY_COLUMNS)
+    for i, row in enumerate(thumbnails_df.itertuples()):
+        with columns[i % GALLERY_COLUMNS]:
+            if row.payload is not None:
+                count(image_bytes=len(row.payload))
+                st.image(row.payload, caption=row.caption or os.path.basename(row.file_path), use_container_width=True)
+            else:
+                st.warning(f"Image file not found: {row.file_path}")
+
+    labels = {row.plot_id: row.caption or os.path.basename(row.file_path) for row in thumbnails_df.itertuples()}
+    plot_id = st.selectbox("Open plot", [None] + list(labels), format_func=lambda i: "-" if i is None else labels[i])
+    if plot_id is None:
+        return
+    previews_df = load_plot_thumbnails(experiment_id, PREVIEW_SIZE)
+    preview = previews_df[previews_df["plot_id"] == plot_id].iloc[0]
+    if st.checkbox("Full resolution", key=f"full_resolution_{plot_id}"):
+        if stored_file_exists(preview["file_path"]):  # plain file or member of an ingested ZIP
+            with span("image_read"), open_stored_file(preview["file_path"]) as f:
+                payload = f.read()
+            count(image_bytes=len(payload))
+            st.image(payload, caption=labels[plot_id], use_container_width=True)
+        else:
+            st.warning(f"Image file not found: {preview['file_path']}")
+    elif preview["payload"] is not None:
+        count(image_bytes=len(preview["payload"]))
+        st.image(preview["payload"], caption=labels[plot_id], use_container_width=True)
+
+# Overlay of the compared experiments on a common grid: one batched load per pair of channels,
+# the curves, the band of the fleet (median, 25-75% and 5-95%) and the differences to a reference experiment
+def comparison_overlay(entries):
+    import matplotlib.pyplot as plt  # imported on the first plot, not at the start of the app
+    cols = st.columns(4)
+    method = cols[0].selectbox("Resampling", RESAMPLE_METHODS, format_func=RESAMPLE_LABELS.get, key="compare_method")
+    grid_span = cols[1].selectbox("Grid range", GRID_SPANS, key="compare_span",
+                                  help="common: x range of all the experiments, union: from the lowest to the highest x")
+    align = cols[2].selectbox("x origin", X_ALIGNMENTS, key="compare_align",
+                              help="start: x minus its first value, e.g. the time since the start of the cool-down")
+    n_points = cols[3].number_input("Grid points", min_value=50, max_value=20000, value=DEFAULT_GRID_POINTS, step=50,
+                                    key="compare_points")
+    show = st.pills("Show", ["Curves", "Band", "Difference"], selection_mode="multi", default=["Curves"],
+                    key="compare_show")
+
+    # Experiments compared on the same pair of channels share one grid
+    names = {}
+    groups = {}
+    for entry in entries:
+        names[entry["experiment_id"]] = entry["experiment_name"]
+        ids = groups.setdefault((entry["x_col"], entry["y_col"]), [])
+        if entry["experiment_id"] not in ids:
+            ids.append(entry["experiment_id"])
+    log_scale = any(entry["log_scale"] for entry in entries)
+    comparisons = [load_comparison(tuple(ids), x_col, y_col, int(n_points), method, grid_span, align)
+                   for (x_col, y_col), ids in groups.items()]
+    comparisons = [comparison for comparison in comparisons if comparison["grid"] is not None]
+    if not comparisons:
+        st.info("The compared experiments have no data in a common x range, try the grid range 'union'.")
+        return
+
+    fig, ax = plt.subplots()
+    n_curves = sum(len(comparison["experiment_ids"]) for comparison in comparisons)
+    for comparison in comparisons:
+        grid, values = comparison["grid"], comparison["values"]
+        channels = f"{comparison['y_column']} vs {comparison['x_column']}"
+        if "Curves" in show:
+            for experiment_id, row in zip(comparison["experiment_ids"], values):
+                ax.plot(grid, row, linewidth=1, label=f"{names[experiment_id]}: {channels}" if n_curves <= 10 else None)
+        if "Band" in show and len(values) > 1:
+            band = band_statistics(values)
+            ax.fill_between(grid, band["q5"], band["q95"], alpha=0.15, label=f"5-95%: {channels}")
+            ax.fill_between(grid, band["q25"], band["q75"], alpha=0.3, label=f"25-75%: {channels}")
+            ax.plot(grid, band["q50"], color="black", linewidth=2, label=f"median: {channels}")
+    if log_scale:
+        ax.set_yscale('log')
+    if ax.get_legend_handles_labels()[1]:
+        ax.legend(fontsize="small")
+    st.pyplot(fig)
+    plt.close(fig)
+    left_out = len(names) - n_curves
+    st.caption(f"{n_curves} experiments on a grid of {int(n_points)} points"
+               + (f", {left_out} without these channels left out" if left_out > 0 else ""))
+
+    if "Difference" in show:
+        reference_id = st.selectbox("Reference experiment", list(names), format_func=names.get, key="compare_reference")
+        mode = st.radio("Difference", ["relative", "ratio", "difference"], horizontal=True, key="compare_mode")
+        fig, ax = plt.subplots()
+        for comparison in comparisons:
+            if reference_id not in comparison["experiment_ids"]:
+                continue
+            differences = reference_difference(comparison, reference_id, mode)
+            for experiment_id, row in zip(comparison["experiment_ids"], differences):
+                if experiment_id != reference_id:
+                    ax.plot(comparison["grid"], row, linewidth=1,
+                            label=f"{names[experiment_id]}: {comparison['y_column']}" if n_curves <= 10 else None)
+        ax.set_ylabel(f"{mode} to {names[reference_id]}")
+        if ax.get_legend_handles_labels()[1]:
+            ax.legend(fontsize="small")
+        st.pyplot(fig)
+        plt.close(fig)
+
+# Derived quantities of an experiment against temperature (fits as a line) and their parameters
+def derived_panel(experiment_id, channels):
+    names = available_quantities(channels)
+    if not names:
+        st.info("No derived quantity can be computed from the channels of this experiment.")
+        return
+    name = st.selectbox("Derived quantity", names, format_func=DERIVED_LABELS.get, key="derived_name")
+    result = load_derived_quantity(experiment_id, name)
+    if result is None:
+        st.info("No data available for this quantity.")
+        return
+
+    import matplotlib.pyplot as plt  # imported on the first plot, not at the start of the app
+    df = result["data"]
+    x_column = df.columns[0]
+    with span("derived.render"):
+        fig, ax = plt.subplots()
+        for column in df.columns[1:]:
+            points = downsample(df, x_column, column)
+            if "_fit" in column:
+                points = points.sort_values(x_column)
+                ax.plot(points[x_column], points[column], color="tab:orange", label=column)
+            else:
+                ax.scatter(points[x_column], points[column], s=8, label=column)
+        ax.set_xlabel(x_column)
+        ax.legend()
+        st.pyplot(fig)
+        plt.close(fig)
+    if result["params"]:
+        st.dataframe(pd.DataFrame({"parameter": list(result["params"]), "value": list(result["params"].values())}),
+                     hide_index=True)
+
+# Sidebar panel of the profiler: where the time of this rerun went (a span includes the spans nested in it)
+# and the counters (SQL statements, loader cache hits/misses, rows and bytes loaded, image bytes sent)
+def profiling_panel(recorder):
+    total_ms = recorder.elapsed() * 1000
+    st.sidebar.write("### Profile of this rerun")
+    st.sidebar.caption(f"{total_ms:,.0f} ms in total")
+    spans = pd.DataFrame(recorder.span_rows(), columns=["name", "calls", "seconds", "max_seconds"])
+    spans["ms"] = spans.pop("seconds") * 1000
+    spans["max ms"] = spans.pop("max_seconds") * 1000
+    spans["% of rerun"] = spans["ms"] / total_ms * 100
+    st.sidebar.dataframe(spans, hide_index=True, column_config={
+        column: st.column_config.NumberColumn(format="%.1f") for column in ("ms", "max ms", "% of rerun")})
+    counters = pd.DataFrame(sorted(recorder.counters.items()), columns=["counter", "value"])
+    st.sidebar.dataframe(counters, hide_index=True)
+
+# Status of the background imports (ingest_worker.py): worker, queue, progress of the running job,
+# throughput and errors of the latest jobs; only this panel is refreshed every INGEST_REFRESH_SECONDS
+def ingest_panel():
+    st.write("### Background imports")
+    st.caption(f"Experiment folders and ZIPs copied into `{DROP_FOLDER}` are imported in the background")
+    refresh = st.toggle("Auto refresh", value=True, key="ingest_refresh")
+    st.fragment(ingest_status_panel, run_every=INGEST_REFRESH_SECONDS if refresh else None)()
+
+def ingest_status_panel():
+    with read_connection() as conn:
+        status = ingest_status(conn, INGEST_JOBS_SHOWN)
+
+    worker = status["worker"]
+    if worker is None:
+        col_left, col_right = st.columns([3, 1])
+        col_left.warning("No ingest worker is running: dropped experiments wait in the queue.")
+        if col_right.button("Start worker", key="ingest_start"):
+            if start_worker_process(DATABASE_PATH) is None:
+                st.toast("Another session already started the ingest worker")
+            else:
+                st.toast("Ingest worker started")
+    else:
+        pid, started_at, heartbeat_at = worker
+        st.success(f"Worker running (pid {pid}) for {time.time() - started_at:,.0f} s")
+
+    counts = status["counts"]
+    for column, state in zip(st.columns(len(JOB_STATES)), JOB_STATES):
+        column.metric(state.capitalize(), counts.get(state, 0))
+
+    if not status["jobs"]:
+        st.info("No background import yet.")
+        return
+    now = time.time()
+    rows = []
+    for job_id, source_path, target_path, kind, state, size, n_rows, error, queued_at, started_at, finished_at in status["jobs"]:
+        if state == "running":
+            n_rows = status["progress"].get(job_id)
+        seconds = ((finished_at or now) - started_at) if started_at else None
+        rows.append({
+            "job": job_id, "item": os.path.basename(source_path), "kind": kind, "status": state,
+            "MB": size / 2**20 if size is not None else None, "rows": n_rows, "seconds": seconds,
+            "rows/s": n_rows / seconds if n_rows and seconds else None,
+            "MB/s": size / 2**20 / seconds if size and seconds and state != "running" else None,
+            "waited s": (started_at or now) - queued_at, "error": error,
+        })
+    jobs_df = pd.DataFrame(rows)
+    done = jobs_df[jobs_df["status"] == "done"]
+    if not done.empty and done["seconds"].sum() > 0:
+        st.caption(f"Latest imports: {done['rows'].sum():,.0f} rows in {done['seconds'].sum():,.1f} s "
+                   f"({done['rows'].sum() / done['seconds'].sum():,.0f} rows/s)")
+    st.dataframe(jobs_df, hide_index=True, column_config={
+        column: st.column_config.NumberColumn(format="%.1f") for column in ("MB", "seconds", "rows/s", "MB/s", "waited s")})
+
+    failed = jobs_df.loc[jobs_df["status"] == "failed", "job"].tolist()
+    if failed and st.button(f"Retry the {len(failed)} failed jobs", key="ingest_retry"):
+        conn = get_db_connection()
+        try:
+            for job_id in failed:
+                retry_job(conn, job_id)
+        finally:
+            conn.close()
 
 # Display the experiments metadata dataframe
 def display_experiments(df):
@@ -103,61 +610,72 @@ def display_experiments(df):
     st.dataframe(df)
 
 # Filter experiments by a selected column and value/range
+# The values, the bounds and the matches are queried from the database (parameterized WHERE clauses)
 def filter_experiments(df):
     st.write("### Filter Experiments")
-    column_name = st.selectbox("Select column to filter", df.columns, index=df.columns.get_loc("experiment_name"))
+    columns = [column for column in df.columns if column in get_experiment_columns()]
+    column_name = st.selectbox("Select column to filter", columns, index=columns.index("experiment_name"))
+    numeric = get_experiment_columns()[column_name]
 
-    if df[column_name].dtype == 'object':
-        unique_values = df[column_name].unique()
+    if not numeric:
+        unique_values = get_experiment_column_values(column_name)
         selected_value = st.selectbox(f"Select {column_name} value", unique_values)
-        filtered_df = df[df[column_name] == selected_value]
+        matched_ids = get_filtered_experiment_ids(column_name, selected_value)
     else:
-        min_value = float(df[column_name].min())
-        max_value = float(df[column_name].max())
-        if min_value == max_value:
+        min_value, max_value = get_experiment_column_range(column_name)
+        if min_value is None:
+            st.info(f"No values in '{column_name}'.")
+            selected_range = (0, 0)
+        elif min_value == max_value:
             st.info(f"Only one unique value ({min_value}) in '{column_name}'.")
-            filtered_df = df[df[column_name] == min_value]
+            selected_range = (min_value, max_value)
         else:
-            selected_range = st.slider(f"Select range for {column_name}", min_value, max_value, (min_value, max_value))
-            filtered_df = df[(df[column_name] >= selected_range[0]) & (df[column_name] <= selected_range[1])]
+            selected_range = st.slider(f"Select range for {column_name}", float(min_value), float(max_value), (float(min_value), float(max_value)))
+        matched_ids = get_filtered_experiment_ids(column_name, None, tuple(selected_range))
 
+    # Keep the experiments already selected (e.g. by the recipe filter)
+    filtered_df = df[df['experiment_id'].isin(matched_ids)]
     st.write("### Filtered Experiments")
     st.dataframe(filtered_df)
     return filtered_df
 
-# Filter experiment data by selected column and value/range with flexible input
-def filter_data(df):
+# Filter experiment data by selected columns and value/range with flexible input
+# The bounds come from the column statistics and only the rows matching every range are read from the database
+def filter_data(experiment_id, stats_df):
     st.write("### Filter Data")
-    column_name = st.selectbox("Select column to filter", df.columns)
+    columns = stats_df.index[stats_df["n_values"] > 0].tolist()
+    column_names = st.multiselect("Select columns to filter", columns, default=columns[:1])
 
-    if df[column_name].dtype == 'object':
-        unique_values = df[column_name].unique()
-        selected_value = st.selectbox(f"Select {column_name} value", unique_values)
-        filtered_df = df[df[column_name] == selected_value]
-    else:
-        min_value = float(df[column_name].min())
-        max_value = float(df[column_name].max())
-        st.write(f"Value range: {min_value:.2f} to {max_value:.2f}")
-
-        col_left, col_right = st.columns([1, 3])
-        with col_left:
-            method = st.radio("Input Method", ["Slider", "Manual Input"], index=0)
-
-        with col_right:
-            if method == "Slider":
-                selected_range = st.slider(
-                    f"Select range for {column_name}",
-                    min_value, max_value,
-                    (min_value, max_value),
-                    key=f"slider_{column_name}"
-                )
-            else:
-                min_col, max_col = col_right.columns(2)
-                min_input = min_col.number_input(f"Min {column_name}", value=min_value, step=0.1, key=f"min_input_{column_name}")
-                max_input = max_col.number_input(f"Max {column_name}", value=max_value, step=0.1, key=f"max_input_{column_name}")
-                selected_range = (min_input, max_input)
+    method = st.radio("Input Method", ["Slider", "Manual Input"], index=0, horizontal=True)
 
-        filtered_df = df[(df[column_name] >= selected_range[0]) & (df[column_name] <= selected_range[1])]
+    ranges = []
+    restricted = False
+    for column_name in column_names:
+        min_value = float(stats_df.at[column_name, "min_value"])
+        max_value = float(stats_df.at[column_name, "max_value"])
+        if method == "Slider":
+            selected_range = st.slider(
+                f"Select range for {column_name} ({min_value:.2f} to {max_value:.2f})",
+                min_value, max_value,
+                (min_value, max_value),
+                key=f"slider_{column_name}"
+            )
+        else:
+            min_col, max_col = st.columns(2)
+            min_input = min_col.number_input(f"Min {column_name}", value=min_value, step=0.1, key=f"min_input_{column_name}")
+            max_input = max_col.number_input(f"Max {column_name}", value=max_value, step=0.1, key=f"max_input_{column_name}")
+            selected_range = (min_input, max_input)
+        ranges.append((column_name, float(selected_range[0]), float(selected_range[1])))
+        restricted = restricted or selected_range[0] > min_value or selected_range[1] < max_value
+
+    if restricted:
+        filtered_df = load_data_in_ranges(experiment_id, tuple(ranges))
+    else:
+        filtered_df = load_data_for_experiment(experiment_id)
+        for column_name in column_names:
+            if len(filtered_df) > stats_df.at[column_name, "n_values"]:  # rows with a NaN in a filtered column
+                filtered_df = filtered_df[filtered_df[column_name].notna()]
+    st.caption(f"{len(filtered_df):,} matching rows")
 
     if st.checkbox("Show the filtered data"):
         st.write("### Filtered Data")
@@ -165,21 +683,39 @@ def filter_data(df):
         st.dataframe(filtered_df[selected_columns])
     return filtered_df
 
+# Resolution of the traces of the live plot (the comparison overlay resamples on a grid of its own)
+def plot_resolution(container):
+    method = container.selectbox("Plot resolution", DOWNSAMPLE_METHODS, format_func=DOWNSAMPLE_LABELS.get, key="plot_method")
+    n_points = DEFAULT_POINTS
+    if method != "full":
+        n_points = container.number_input("Points per trace", min_value=100, max_value=100000, value=DEFAULT_POINTS, step=100, key="plot_points")
+    return method, int(n_points)
+
 # Plot selected columns from the dataframe with optional log scale on y-axis
+@timed()
 def plot_data(df):
     st.write("### Plot Data")
     cols = st.columns(2)
     x_column = cols[0].selectbox("Select x-axis column", df.columns, key="x_col")
     y_column = cols[0].selectbox("Select y-axis column", df.columns, key="y_col")
     use_log_scale = cols[0].checkbox("Use log scale for y-axis", value=False, key="log_scale")
+    method, n_points = plot_resolution(cols[0])
+
+    # Only the reduced trace is drawn and handed to the comparison overlay
+    with span("downsample"):
+        plot_df = downsample(df, x_column, y_column, method, n_points)
+    with span("plot_data.render"):
+        import matplotlib.pyplot as plt  # imported on the first plot, not at the start of the app
+        fig, ax = plt.subplots()
+        ax.scatter(plot_df[x_column], plot_df[y_column])
+        ax.set_xlabel(x_column)
+        ax.set_ylabel(y_column)
+        if use_log_scale:
+            ax.set_yscale('log')
+        cols[1].pyplot(fig)
+        plt.close(fig)
+    if len(plot_df) < len(df):
+        cols[1].caption(f"{len(plot_df):,} of {len(df):,} points shown ({DOWNSAMPLE_LABELS[method]})")
 
-    fig, ax = plt.subplots()
-    ax.scatter(df[x_column], df[y_column])
-    ax.set_xlabel(x_column)
-    ax.set_ylabel(y_column)
-    if use_log_scale:
-        ax.set_yscale('log')
-    cols[1].pyplot(fig)
-    
     # Return selected data for potential comparison overlay
-    return x_column, y_column, use_log_scale, df[[x_column, y_column]]
+    return x_column, y_column, use_log_scale, plot_df